@@ -0,0 +1,181 @@
+import argparse
+import os
+import threading
+import time
+from typing import Any, Dict, List
+from unittest.mock import MagicMock
+
+import numpy as np
+import streamlit
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import app_test as app_test_module
+from streamlit.testing.v1.element_tree import InitialValue
+
+from benchmarks.fake_openai_server import FakeOpenAiServer, FakeServerConfig
+from enums.global_enum import PageEnum
+
+
+DEFAULT_SESSION_COUNTS = "1,2,4,8,16"
+DEFAULT_INTERACTIONS = 6
+SCRIPT_TIMEOUT_SECONDS = 60
+MAX_POLL_RUNS = 60
+PAGE_NAMES = ("CHAT_GPT", "IMAGE_GENERATION", "SPEECH_GENERATION")
+JOB_INFO_MESSAGES = ("Waiting in queue...", "Generating...")
+SELECTBOX_CHOICES = {"ChatGpt_ModelSelectBox": "GPT35_TURBO"}
+
+
+class SharedRuntime:
+    """
+    AppTest installs a fresh mock Runtime before each run and clears it afterwards, which breaks runs on other threads.
+    The load test installs one shared mock instead and gives AppTest this stand-in to swap in and out.
+    """
+
+    _instance = None
+
+    @staticmethod
+    def install() -> None:
+        runtime = MagicMock(spec=Runtime)
+        runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+        runtime.cache_storage_manager = MemoryCacheStorageManager()
+        Runtime._instance = runtime
+        app_test_module.Runtime = SharedRuntime  # type: ignore
+        # Background jobs ask for a rerun to poll their result. The simulated session reruns by itself instead.
+        streamlit.rerun = lambda: None  # type: ignore
+
+
+class SimulatedSession:
+    def __init__(self, session_index: int) -> None:
+        self.page_name = PAGE_NAMES[session_index % len(PAGE_NAMES)]
+        self.run_seconds: List[float] = []
+        self.interaction_seconds: List[float] = []
+        self.errors: List[str] = []
+        self.app = AppTest.from_file("server.py", default_timeout=SCRIPT_TIMEOUT_SECONDS)
+
+    def start(self) -> None:
+        self.app.run()
+        self.app.sidebar.text_input[0].input("sk-load-test")
+        self.__run()
+        self.app.sidebar.selectbox[0].select_index(list(PageEnum).index(PageEnum[self.page_name]))
+        self.__run()
+
+    def interact(self, interaction_index: int) -> None:
+        start_time = time.perf_counter()
+        self.app.text_area[0].input(f"load test {interaction_index}")
+        self.__pin_selectboxes()
+        for selectbox in self.app.selectbox:
+            if selectbox.key in SELECTBOX_CHOICES:
+                selectbox.select_index(selectbox.options.index(SELECTBOX_CHOICES[selectbox.key]))
+        next(button for button in self.app.button if button.label == "Submit").click()
+        self.__run()
+        for _ in range(MAX_POLL_RUNS):
+            if not any(info.value in JOB_INFO_MESSAGES for info in self.app.info):
+                break
+            self.__run()
+        self.interaction_seconds.append(time.perf_counter() - start_time)
+        self.errors.extend(str(exception.value) for exception in self.app.exception)
+
+    def __run(self) -> None:
+        self.__pin_selectboxes()
+        start_time = time.perf_counter()
+        self.app.run()
+        self.run_seconds.append(time.perf_counter() - start_time)
+
+    def __pin_selectboxes(self) -> None:
+        # AppTest looks up an untouched selectbox's value by str(value), which misses options shown through format_func.
+        for selectbox in self.app.selectbox:
+            if not isinstance(selectbox._value, InitialValue) or selectbox.value is None:
+                continue
+            value = selectbox.value
+            for option in (getattr(value, "name", None), str(getattr(value, "value", None)), str(value)):
+                if option in selectbox.options:
+                    selectbox.select_index(selectbox.options.index(option))
+                    break
+            else:
+                if selectbox.proto.default < len(selectbox.options):
+                    selectbox.select_index(selectbox.proto.default)
+
+
+class AppLoadTest:
+    @staticmethod
+    def get_rss_mb() -> float:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+    @classmethod
+    def run_round(cls, session_count: int, interaction_count: int) -> Dict[str, Any]:
+        rss_before = cls.get_rss_mb()
+        sessions = [SimulatedSession(session_index=index) for index in range(session_count)]
+
+        def drive(session: SimulatedSession) -> None:
+            try:
+                session.start()
+                for interaction_index in range(interaction_count):
+                    session.interact(interaction_index=interaction_index)
+            except Exception as e:
+                session.errors.append(repr(e))
+
+        threads = [threading.Thread(target=drive, args=(session,)) for session in sessions]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed_seconds = time.perf_counter() - start_time
+        rss_after = cls.get_rss_mb()
+
+        run_seconds = [seconds for session in sessions for seconds in session.run_seconds]
+        interaction_seconds = [seconds for session in sessions for seconds in session.interaction_seconds]
+        return {
+            "sessions": session_count,
+            "reruns": len(run_seconds),
+            "rerun_p50_ms": float(np.percentile(run_seconds, 50)) * 1000,
+            "rerun_p95_ms": float(np.percentile(run_seconds, 95)) * 1000,
+            "interaction_p95_ms": float(np.percentile(interaction_seconds, 95)) * 1000 if interaction_seconds else None,
+            "reruns_per_second": len(run_seconds) / elapsed_seconds,
+            "interactions_per_second": len(interaction_seconds) / elapsed_seconds,
+            "rss_growth_mb_per_session": (rss_after - rss_before) / session_count,
+            "errors": sum(len(session.errors) for session in sessions),
+        }
+
+    @staticmethod
+    def print_table(results: List[Dict[str, Any]]) -> None:
+        columns = list(results[0].keys())
+        print(" | ".join(f"{column:>25}" for column in columns))
+        for result in results:
+            cells = []
+            for column in columns:
+                value = result[column]
+                if isinstance(value, float):
+                    cells.append(f"{value:>25.2f}")
+                else:
+                    cells.append(f"{'-' if value is None else value:>25}")
+            print(" | ".join(cells))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive concurrent simulated sessions of server.py against a fake OpenAI server.")
+    parser.add_argument("--sessions", default=DEFAULT_SESSION_COUNTS, help="comma separated numbers of concurrent sessions")
+    parser.add_argument("--interactions", type=int, default=DEFAULT_INTERACTIONS, help="submits per session")
+    for name, field in FakeServerConfig.model_fields.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=field.annotation, default=field.default)
+    args = parser.parse_args()
+
+    config = FakeServerConfig(**{name: getattr(args, name) for name in FakeServerConfig.model_fields})
+    server_process, base_url = FakeOpenAiServer.start_process(config=config)
+    # EnvEnum reads the environment when it is first imported by the app script.
+    os.environ["OPENAI_BASE_URL"] = base_url
+    SharedRuntime.install()
+
+    results = []
+    try:
+        AppLoadTest.run_round(session_count=1, interaction_count=1)  # warm up imports and connections
+        for session_count in [int(value) for value in args.sessions.split(",")]:
+            results.append(AppLoadTest.run_round(session_count=session_count, interaction_count=args.interactions))
+    finally:
+        server_process.terminate()
+    AppLoadTest.print_table(results=results)
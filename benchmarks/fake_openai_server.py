@@ -0,0 +1,211 @@
+import base64
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import multiprocessing
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+from pydantic import BaseModel
+
+
+class FakeServerConfig(BaseModel):
+    latency_seconds: float = 0.05
+    chunk_count: int = 50
+    chunk_chars: int = 4
+    chunk_interval_seconds: float = 0.01
+    image_pixels: int = 1024
+    speech_bytes: int = 64 * 1024
+    transcript_chars: int = 1000
+    embedding_dimensions: int = 1536
+
+
+INVALID_API_KEY_PREFIX = "invalid"
+
+
+class FakeOpenAiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes. With Nagle on, delayed ACKs add about 40 ms to every small response.
+    disable_nagle_algorithm = True
+    server: "FakeOpenAiServer"
+
+    def do_GET(self) -> None:
+        if self.path.startswith("/images/"):
+            self.__send_bytes(body=self.server.image_bytes, content_type="image/png")
+        elif self.__is_unauthorized():
+            self.__send_unauthorized()
+        elif self.path.endswith("/models"):
+            self.__send_json(body={"object": "list", "data": [{"id": "gpt-3.5-turbo", "object": "model", "created": 0, "owned_by": "fake"}]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        config = self.server.config
+        time.sleep(config.latency_seconds)
+        if self.__is_unauthorized():
+            self.__send_unauthorized()
+        elif self.path.endswith("/chat/completions"):
+            self.__chat_completions(request=json.loads(body))
+        elif self.path.endswith("/images/generations"):
+            self.__images_generations(request=json.loads(body))
+        elif self.path.endswith("/audio/speech"):
+            self.__send_bytes(body=bytes(config.speech_bytes), content_type="audio/mpeg")
+        elif self.path.endswith("/audio/transcriptions"):
+            self.__send_json(body={"text": "a" * config.transcript_chars})
+        elif self.path.endswith("/embeddings"):
+            self.__embeddings(request=json.loads(body))
+        else:
+            self.send_error(404)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def __chat_completions(self, request: Dict[str, Any]) -> None:
+        config = self.server.config
+        chunk_text = "x" * config.chunk_chars
+        if not request.get("stream"):
+            self.__send_json(
+                body={
+                    "id": "fake",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": request["model"],
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": chunk_text * config.chunk_count}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": config.chunk_count, "total_tokens": config.chunk_count},
+                }
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for _ in range(config.chunk_count):
+            chunk = {
+                "id": "fake",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": request["model"],
+                "choices": [{"index": 0, "delta": {"content": chunk_text}, "finish_reason": None}],
+            }
+            self.__write_chunk(data=f"data: {json.dumps(chunk)}\n\n".encode())
+            time.sleep(config.chunk_interval_seconds)
+        self.__write_chunk(data=b"data: [DONE]\n\n")
+        self.__write_chunk(data=b"")
+
+    def __images_generations(self, request: Dict[str, Any]) -> None:
+        if request.get("response_format") == "b64_json":
+            image_data = {"b64_json": self.server.image_b64}
+        else:
+            host, port = self.server.server_address[:2]
+            image_data = {"url": f"http://{host}:{port}/images/fake.png"}
+        self.__send_json(body={"created": 0, "data": [image_data] * request.get("n", 1)})
+
+    def __embeddings(self, request: Dict[str, Any]) -> None:
+        inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        embedding = [0.0] * self.server.config.embedding_dimensions
+        self.__send_json(
+            body={
+                "object": "list",
+                "model": request["model"],
+                "data": [{"object": "embedding", "index": index, "embedding": embedding} for index in range(len(inputs))],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }
+        )
+
+    def __is_unauthorized(self) -> bool:
+        return self.headers.get("Authorization", "").startswith(f"Bearer {INVALID_API_KEY_PREFIX}")
+
+    def __send_unauthorized(self) -> None:
+        body = json.dumps({"error": {"message": "Incorrect API key provided.", "type": "invalid_request_error", "code": "invalid_api_key"}}).encode()
+        self.send_response(401)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def __send_json(self, body: Dict[str, Any]) -> None:
+        self.__send_bytes(body=json.dumps(body).encode(), content_type="application/json")
+
+    def __send_bytes(self, body: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeOpenAiServer(ThreadingHTTPServer):
+    """
+    Stand-in for the OpenAI endpoints used by the handlers. Point a client at it with OpenAI(base_url=server.base_url).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config: FakeServerConfig = FakeServerConfig(), host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), FakeOpenAiRequestHandler)
+        self.config = config
+        noise = np.random.default_rng(seed=0).integers(0, 256, size=(config.image_pixels, config.image_pixels, 3), dtype=np.uint8)
+        self.image_bytes = cv2.imencode(".png", noise)[1].tobytes()
+        self.image_b64 = base64.b64encode(self.image_bytes).decode()
+        self.__thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAiServer":
+        self.__thread = threading.Thread(target=self.serve_forever, name="FakeOpenAiServer", daemon=True)
+        self.__thread.start()
+        return self
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        # Clients closing idle keep-alive connections is expected during benchmarks.
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    @staticmethod
+    def start_process(config: FakeServerConfig = FakeServerConfig()) -> Tuple[multiprocessing.Process, str]:
+        """
+        Serves from a child process so the server's CPU time and memory are not counted against the process under test.
+        """
+        port_queue: Any = multiprocessing.Queue()
+        process = multiprocessing.Process(target=serve_in_process, args=(config, port_queue), daemon=True)
+        process.start()
+        return process, f"http://127.0.0.1:{port_queue.get(timeout=30)}/v1"
+
+
+def serve_in_process(config: FakeServerConfig, port_queue: Any) -> None:
+    server = FakeOpenAiServer(config=config)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI API for benchmarks and load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    for name, field in FakeServerConfig.model_fields.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=field.annotation, default=field.default)
+    args = parser.parse_args()
+
+    config = FakeServerConfig(**{name: getattr(args, name) for name in FakeServerConfig.model_fields})
+    server = FakeOpenAiServer(config=config, host=args.host, port=args.port)
+    print(f"Serving fake OpenAI API at {server.base_url}")
+    server.serve_forever()
@@ -0,0 +1,169 @@
+import argparse
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import json
+import resource
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from openai import OpenAI
+
+from benchmarks.fake_openai_server import FakeOpenAiServer, FakeServerConfig
+from enums.chatgpt_enum import AiModelEnum
+from enums.speech_recognition_enum import LanguageEnum
+from handlers.chatgpt_handler import ChatGptHandler
+from handlers.image_generation_handler import ImageGenerationHandler
+from handlers.image_handler import ImageHandler
+from handlers.speech_generation_handler import SpeechGenerationHandler
+from handlers.speech_recognition_handler import SpeechRecognitionHandler
+
+
+DEFAULT_CONCURRENCIES = "1,4,16"
+DEFAULT_REQUESTS = 64
+SPEECH_FILE_BYTES = 256 * 1024
+
+
+class Scenario:
+    """
+    Runs one handler call. Returns the time to first token for streamed scenarios.
+    Every request gets its own prompt, so single flight does not merge concurrent requests into one upstream call.
+    """
+
+    @staticmethod
+    def chat(client: OpenAI, index: int) -> Optional[float]:
+        ChatGptHandler.query_answer(client=client, prompt=f"benchmark {index}", model_type=AiModelEnum.GPT35_TURBO)
+        return None
+
+    @staticmethod
+    def chat_stream(client: OpenAI, index: int) -> Optional[float]:
+        start_time = time.perf_counter()
+        first_token_times: List[float] = []
+
+        def display_func(answer: str) -> None:
+            if answer and not first_token_times:
+                first_token_times.append(time.perf_counter())
+
+        ChatGptHandler.query_answer_and_display_streamly(
+            client=client,
+            prompt=f"benchmark {index}",
+            display_func=display_func,
+            model_type=AiModelEnum.GPT35_TURBO,
+        )
+        return first_token_times[0] - start_time if first_token_times else None
+
+    @staticmethod
+    def image_url(client: OpenAI, index: int) -> Optional[float]:
+        image_url = ImageGenerationHandler.generate_image(client=client, prompt=f"benchmark {index}")
+        ImageHandler.download_as_array_rgb(image_url=image_url)
+        return None
+
+    @staticmethod
+    def image_b64(client: OpenAI, index: int) -> Optional[float]:
+        response = client.images.generate(prompt=f"benchmark {index}", model="dall-e-3", response_format="b64_json", n=1)
+        ImageHandler.bytes_to_array_rgb(image_bytes=base64.b64decode(response.data[0].b64_json or ""))
+        return None
+
+    @staticmethod
+    def speech(client: OpenAI, index: int) -> Optional[float]:
+        SpeechGenerationHandler.generate_speech(client=client, prompt=f"benchmark {index}")
+        return None
+
+    @staticmethod
+    def transcription(client: OpenAI, index: int) -> Optional[float]:
+        SpeechRecognitionHandler.recognize_speech(
+            client=client,
+            speech_file=("benchmark.wav", bytes(SPEECH_FILE_BYTES)),
+            language_type=LanguageEnum.ENGLISH,
+        )
+        return None
+
+
+SCENARIOS: Dict[str, Callable[[OpenAI, int], Optional[float]]] = {
+    "chat": Scenario.chat,
+    "chat_stream": Scenario.chat_stream,
+    "image_url": Scenario.image_url,
+    "image_b64": Scenario.image_b64,
+    "speech": Scenario.speech,
+    "transcription": Scenario.transcription,
+}
+
+
+class HandlerBenchmark:
+    @staticmethod
+    def run_scenario(client: OpenAI, scenario: str, concurrency: int, request_count: int) -> Dict[str, Any]:
+        func = SCENARIOS[scenario]
+        latencies: List[float] = []
+        first_token_latencies: List[float] = []
+
+        def run_once(index: int) -> None:
+            start_time = time.perf_counter()
+            first_token_latency = func(client, index)
+            latencies.append(time.perf_counter() - start_time)
+            if first_token_latency is not None:
+                first_token_latencies.append(first_token_latency)
+
+        max_rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        cpu_time_before = time.process_time()
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(run_once, range(request_count)))
+        elapsed_seconds = time.perf_counter() - start_time
+        cpu_seconds = time.process_time() - cpu_time_before
+        max_rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        return {
+            "scenario": scenario,
+            "concurrency": concurrency,
+            "requests": request_count,
+            "throughput_rps": request_count / elapsed_seconds,
+            "latency_p50_ms": float(np.percentile(latencies, 50)) * 1000,
+            "latency_p95_ms": float(np.percentile(latencies, 95)) * 1000,
+            "ttft_p50_ms": float(np.percentile(first_token_latencies, 50)) * 1000 if first_token_latencies else None,
+            "cpu_ms_per_request": cpu_seconds / request_count * 1000,
+            "max_rss_mb": max_rss_after / 1024,
+            "max_rss_growth_mb": (max_rss_after - max_rss_before) / 1024,
+        }
+
+    @staticmethod
+    def print_table(results: List[Dict[str, Any]]) -> None:
+        columns = list(results[0].keys())
+        print(" | ".join(f"{column:>18}" for column in columns))
+        for result in results:
+            cells = []
+            for column in columns:
+                value = result[column]
+                if isinstance(value, float):
+                    cells.append(f"{value:>18.2f}")
+                else:
+                    cells.append(f"{'-' if value is None else value:>18}")
+            print(" | ".join(cells))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the handlers against a local fake OpenAI server.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCIES, help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="requests per scenario and concurrency level")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write the results to this file")
+    for name, field in FakeServerConfig.model_fields.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=field.annotation, default=field.default)
+    args = parser.parse_args()
+
+    config = FakeServerConfig(**{name: getattr(args, name) for name in FakeServerConfig.model_fields})
+    server_process, base_url = FakeOpenAiServer.start_process(config=config)
+
+    client = OpenAI(api_key="benchmark", base_url=base_url)
+    results = []
+    try:
+        for scenario in args.scenarios.split(","):
+            SCENARIOS[scenario](client, -1)  # warm up connections and imports
+            for concurrency in [int(value) for value in args.concurrency.split(",")]:
+                results.append(HandlerBenchmark.run_scenario(client=client, scenario=scenario, concurrency=concurrency, request_count=args.requests))
+    finally:
+        server_process.terminate()
+
+    HandlerBenchmark.print_table(results=results)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
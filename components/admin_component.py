@@ -0,0 +1,124 @@
+import json
+import tracemalloc
+
+from openai import OpenAI
+import streamlit as st
+
+from handlers.memory_profiler_handler import MemoryProfilerHandler, SNAPSHOT_INTERVAL_SECONDS
+from handlers.metrics_handler import MetricsHandler
+from handlers.model_router_handler import ModelRouterHandler
+
+
+class AdminComponent:
+    @classmethod
+    def display_component(cls, client: OpenAI) -> None:
+        metrics = MetricsHandler.to_dict()
+
+        st.markdown("#### Handler Latency")
+        cls.__display_histograms(metrics=metrics, name="handler_latency_seconds", unit_scale=1000, unit="ms")
+
+        st.markdown("#### Time To First Token")
+        cls.__display_histograms(metrics=metrics, name="handler_time_to_first_token_seconds", unit_scale=1000, unit="ms")
+
+        st.markdown("#### Tokens Per Second")
+        cls.__display_histograms(metrics=metrics, name="handler_tokens_per_second", unit_scale=1, unit="tokens/s")
+
+        st.markdown("#### Model Routing")
+        cls.__display_histograms(metrics=metrics, name="model_router_latency_seconds", unit_scale=1000, unit="ms")
+        cls.__display_model_routing_decisions()
+
+        st.markdown("#### Page Run Time")
+        cls.__display_histograms(metrics=metrics, name="page_run_seconds", unit_scale=1000, unit="ms")
+
+        st.markdown("#### Counters")
+        st.dataframe(
+            data=[
+                {"name": counter["name"], **counter["labels"], "value": counter["value"]}
+                for counter in sorted(metrics["counters"], key=lambda counter: counter["name"])
+            ],
+            use_container_width=True,
+        )
+
+        st.markdown("#### Session State Memory")
+        session_sizes = [gauge["value"] for gauge in metrics["gauges"] if gauge["name"] == "session_state_bytes"]
+        left_col, center_col, right_col = st.columns(3)
+        left_col.metric(label="Sessions", value=len(session_sizes))
+        center_col.metric(label="Total", value=f"{sum(session_sizes) / 1024 / 1024:,.1f} MB")
+        right_col.metric(label="Largest", value=f"{max(session_sizes, default=0) / 1024 / 1024:,.1f} MB")
+
+        cls.__display_memory_profiling()
+
+        st.markdown("#### Export")
+        left_col, right_col = st.columns(2)
+        left_col.download_button(label="Prometheus Text", data=MetricsHandler.to_prometheus_text(), file_name="metrics.txt", mime="text/plain")
+        right_col.download_button(label="JSON", data=json.dumps(metrics, indent=2), file_name="metrics.json", mime="application/json")
+
+    @staticmethod
+    def __display_model_routing_decisions() -> None:
+        decisions = ModelRouterHandler.get_recent_decisions()
+        if not decisions:
+            return
+        st.dataframe(
+            data=[
+                {
+                    "model": decision["model"],
+                    "reason": decision["reason"],
+                    "estimated_tokens": decision["estimated_tokens"],
+                    "load_level": decision["load_level"],
+                    "latency (ms)": decision["latency_seconds"] * 1000,
+                    "is_error": decision["is_error"],
+                }
+                for decision in reversed(decisions)
+            ],
+            use_container_width=True,
+        )
+
+    @staticmethod
+    def __display_memory_profiling() -> None:
+        st.markdown("#### Memory Profiling")
+        if not MemoryProfilerHandler.is_tracing():
+            st.caption("tracemalloc is off. Session memory is attributed per key while it is on.")
+            st.button(label="Start Tracing", on_click=MemoryProfilerHandler.start)
+            return
+
+        traced_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        left_col, center_col, right_col = st.columns(3)
+        left_col.metric(label="Traced", value=f"{traced_bytes / 1024 / 1024:,.1f} MB")
+        center_col.metric(label="Traced Peak", value=f"{peak_bytes / 1024 / 1024:,.1f} MB")
+        right_col.button(label="Stop Tracing", on_click=MemoryProfilerHandler.stop)
+
+        st.markdown("##### Sessions")
+        st.dataframe(data=MemoryProfilerHandler.get_sessions(), use_container_width=True)
+        st.markdown("##### Bytes By Session State Key")
+        st.dataframe(data=MemoryProfilerHandler.get_bytes_by_key(), use_container_width=True)
+        st.markdown("##### Largest Session State Values")
+        st.dataframe(data=MemoryProfilerHandler.get_largest_values(), use_container_width=True)
+        st.markdown("##### Page Visits")
+        st.dataframe(data=MemoryProfilerHandler.get_visits(), use_container_width=True)
+
+        st.markdown("##### Growth Since Previous Snapshot")
+        MemoryProfilerHandler.take_snapshot_if_due()
+        st.button(label="Take Snapshot", on_click=MemoryProfilerHandler.take_snapshot)
+        growth = MemoryProfilerHandler.get_last_growth()
+        if not growth:
+            st.caption(f"Two snapshots are needed to compare. This page also takes one when it is shown and the last is over {SNAPSHOT_INTERVAL_SECONDS} s old.")
+            return
+        st.dataframe(data=growth, use_container_width=True)
+
+    @staticmethod
+    def __display_histograms(metrics: dict, name: str, unit_scale: float, unit: str) -> None:
+        rows = [
+            {
+                **histogram["labels"],
+                "count": histogram["count"],
+                f"avg ({unit})": histogram["sum"] / max(histogram["count"], 1) * unit_scale,
+                f"p50 ({unit})": histogram["p50"] * unit_scale,
+                f"p95 ({unit})": histogram["p95"] * unit_scale,
+            }
+            for histogram in metrics["histograms"]
+            if histogram["name"] == name
+        ]
+        if not rows:
+            st.caption("No data yet.")
+            return
+        st.dataframe(data=rows, use_container_width=True)
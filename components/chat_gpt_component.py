@@ -1,21 +1,60 @@
-from typing import Optional
+import time
+from typing import Any, Dict, Optional, Tuple
 
 from openai import OpenAI, AuthenticationError
 from pydantic import BaseModel, ValidationError, Field
 import streamlit as st
+from streamlit.delta_generator import DeltaGenerator
 
 from enums.chatgpt_enum import AiModelEnum, SenderEnum
+from enums.job_enum import JobStatusEnum
+from enums.scheduler_enum import LoadLevelEnum, SchedulerLaneEnum
+from exceptions.exceptions import OverloadedException
+from handlers.admission_handler import AdmissionHandler
 from handlers.enum_handler import EnumHandler
 from handlers.chatgpt_handler import ChatGptHandler
-from s_states.chat_gpt_s_states import SubmitSState, ErrorMessageSState, AiModelTypeSState, StoredHistorySState
+from handlers.chat_history_handler import ChatHistoryHandler
+from handlers.document_handler import DocumentHandler, DOCUMENT_INDEX_NAME, MAX_CONCURRENT_EMBEDDING_REQUESTS
+from handlers.embedding_handler import EmbeddingHandler
+from handlers.job_handler import JobHandler, POLL_INTERVAL_SECONDS
+from handlers.model_router_handler import ModelRouterHandler
+from handlers.owner_handler import OwnerHandler
+from handlers.query_params_handler import QueryParamsHandler
+from handlers.scheduler_handler import SchedulerHandler
+from handlers.vector_index_handler import VectorIndexHandler
+from handlers.tracing_handler import TracingHandler
+from s_states.chat_gpt_s_states import (
+    RECENT_MESSAGE_COUNT,
+    SubmitSState,
+    ErrorMessageSState,
+    AiModelTypeSState,
+    ConversationIdSState,
+    HistoryLimitSState,
+    SearchResultSState,
+    DocumentModeSState,
+    DocumentJobIdSState,
+    DocumentStatusSState,
+    StoredHistorySState,
+)
+from components.streaming_markdown_component import StreamingMarkdownComponent
 from components.sub_compornent_result import SubComponentResult
 
 
+SEARCH_INDEX_NAME = "chat_answers"
+SEARCH_RESULT_COUNT = 5
+SEARCH_SNIPPET_CHARS = 300
+CHAT_SCHEDULER_COST = 1.0
+DOCUMENT_SCHEDULER_COST = 4.0
+INDEX_SCHEDULER_COST = 1.0
+
+
 class FormSchema(BaseModel):
     ai_model_type: AiModelEnum
     prompt: str = Field(min_length=1)
+    is_document_mode: bool = False
 
 
+@TracingHandler.traced_class
 class OnSubmitHandler:
     @staticmethod
     def lock_submit_button():
@@ -25,6 +64,14 @@ class OnSubmitHandler:
     def unlock_submit_button():
         SubmitSState.reset()
 
+    @staticmethod
+    def get_form_dict() -> Dict[str, Any]:
+        return {
+            "ai_model_type": st.session_state.get("ChatGpt_ModelSelectBox"),
+            "prompt": st.session_state.get("ChatGpt_PromptTextArea"),
+            "is_document_mode": bool(st.session_state.get("ChatGpt_DocumentModeCheckBox")),
+        }
+
     @staticmethod
     def set_error_message(error_message: str) -> None:
         ErrorMessageSState.set(value=error_message)
@@ -39,27 +86,207 @@ class OnSubmitHandler:
             st.write(prompt)
 
     @staticmethod
-    def query_answer_and_display_streamly(client: OpenAI, form_schema: FormSchema) -> Optional[str]:
+    def query_answer_and_display_streamly(client: OpenAI, form_schema: FormSchema) -> Tuple[Optional[str], AiModelEnum]:
+        """
+        Returns the answer and the model that actually answered, which differs from the selected one for AUTO or under load.
+        """
         if not form_schema.ai_model_type.value:
-            return None
+            return None, form_schema.ai_model_type
 
-        with st.chat_message(name=form_schema.ai_model_type.value):
-            answer_area = st.empty()
-            answer = ChatGptHandler.query_answer_and_display_streamly(
-                client=client,
-                prompt=form_schema.prompt,
-                display_func=answer_area.write,
-                chat_history=StoredHistorySState.get_for_query(),
-                model_type=form_schema.ai_model_type,
-            )
-        return answer
+        load_level = AdmissionHandler.admit(client=client, lane=SchedulerLaneEnum.INTERACTIVE)
+        queue_area = st.empty()
+        with SchedulerHandler.slot(
+            client=client,
+            lane=SchedulerLaneEnum.INTERACTIVE,
+            cost=CHAT_SCHEDULER_COST,
+            display_func=lambda queue_position: queue_area.info(f"Waiting in queue... (position {queue_position})"),
+        ):
+            queue_area.empty()
+            return OnSubmitHandler.query_grounded_answer_and_display_streamly(client=client, form_schema=form_schema, load_level=load_level)
+
+    @staticmethod
+    def query_grounded_answer_and_display_streamly(client: OpenAI, form_schema: FormSchema, load_level: LoadLevelEnum) -> Tuple[str, AiModelEnum]:
+        chat_history = StoredHistorySState.get_for_query()
+        # Only the closest chunks are sent, so the prompt size does not grow with the document collection.
+        document_chunks = (
+            DocumentHandler.retrieve_chunks(client=client, owner_id=OwnerHandler.get_owner_id(client=client), query=form_schema.prompt)
+            if form_schema.is_document_mode
+            else []
+        )
+        if document_chunks:
+            chat_history = [DocumentHandler.make_context_message(chunks=document_chunks)] + chat_history
+
+        # The router already takes the load into account, so only a model picked by hand is degraded.
+        with ModelRouterHandler.route(
+            prompt=form_schema.prompt,
+            chat_history=chat_history,
+            model_type=form_schema.ai_model_type,
+            load_level=load_level,
+        ) as routed_model_type:
+            model_type = routed_model_type
+            if form_schema.ai_model_type != AiModelEnum.AUTO:
+                model_type = AdmissionHandler.degrade_chat_model(model_type=routed_model_type, load_level=load_level)
+                notice = AdmissionHandler.make_notice(changes=(("model", routed_model_type.name, model_type.name),))
+                if notice:
+                    st.toast(notice)
+
+            with st.chat_message(name=model_type.value):
+                answer_renderer = StreamingMarkdownComponent()
+                answer = ChatGptHandler.query_answer_and_display_streamly(
+                    client=client,
+                    prompt=form_schema.prompt,
+                    display_func=answer_renderer.write,
+                    chat_history=chat_history,
+                    model_type=model_type,
+                )
+                answer_renderer.flush(answer=answer)
+                captions = [f"Routed to {model_type.name}"] if form_schema.ai_model_type == AiModelEnum.AUTO else []
+                if document_chunks:
+                    captions.append("Sources: " + ", ".join(f"{chunk['name']} #{chunk['chunk'] + 1} ({chunk['score']:.2f})" for chunk in document_chunks))
+                for caption in captions:
+                    st.caption(caption)
+        return answer, model_type
+
+    @staticmethod
+    def submit_document_job(client: OpenAI) -> None:
+        uploaded_documents = st.session_state.get("ChatGpt_UploadedDocuments")
+        if not uploaded_documents:
+            DocumentStatusSState.set(value="Please choose documents to add.")
+            return
+        try:
+            AdmissionHandler.admit(client=client, lane=SchedulerLaneEnum.BATCH)
+        except OverloadedException:
+            DocumentStatusSState.set(value="The server is busy. Please try again in a minute.")
+            return
+        # Every embedding request in flight counts against the scheduler's caps.
+        max_workers = SchedulerHandler.get_parallelism(client=client, lane=SchedulerLaneEnum.BATCH, parallelism=MAX_CONCURRENT_EMBEDDING_REQUESTS)
+        job_id = JobHandler.submit(
+            func=DocumentHandler.ingest_documents,
+            is_progress_reported=True,
+            cost=DOCUMENT_SCHEDULER_COST,
+            parallelism=max_workers,
+            client=client,
+            owner_id=OwnerHandler.get_owner_id(client=client),
+            documents=[(uploaded_document.name, uploaded_document) for uploaded_document in uploaded_documents],
+            max_workers=max_workers,
+        )
+        DocumentJobIdSState.set(value=job_id)
+        DocumentStatusSState.reset()
+
+    @staticmethod
+    def open_conversation(client: OpenAI, conversation_id: Optional[str]) -> None:
+        owner_id = OwnerHandler.get_owner_id(client=client)
+        if conversation_id and not ChatHistoryHandler.get_conversation(owner_id=owner_id, conversation_id=conversation_id):
+            OnSubmitHandler.set_error_message(error_message="The conversation could not be opened.")
+            conversation_id = None
+        ConversationIdSState.set(value=conversation_id)
+        HistoryLimitSState.reset()
+        if not conversation_id:
+            StoredHistorySState.reset()
+            QueryParamsHandler.update(conversation=None)
+            return
+        StoredHistorySState.set(
+            value=ChatHistoryHandler.get_recent_messages(owner_id=owner_id, conversation_id=conversation_id, count=HistoryLimitSState.get())
+        )
+        QueryParamsHandler.update(conversation=conversation_id)
 
     @staticmethod
-    def update_s_states(form_schema: FormSchema, answer: Optional[str]):
+    def restore_conversation(client: OpenAI) -> None:
+        if ConversationIdSState.get():
+            return
+        conversation_id = QueryParamsHandler.get(name="conversation")
+        if conversation_id:
+            OnSubmitHandler.open_conversation(client=client, conversation_id=conversation_id)
+
+    @staticmethod
+    def select_conversation(client: OpenAI) -> None:
+        OnSubmitHandler.open_conversation(client=client, conversation_id=st.session_state.get("ChatGpt_ConversationSelectBox"))
+
+    @staticmethod
+    def start_new_conversation(client: OpenAI) -> None:
+        st.session_state.pop("ChatGpt_ConversationSelectBox", None)
+        OnSubmitHandler.open_conversation(client=client, conversation_id=None)
+
+    @staticmethod
+    def load_earlier_messages(client: OpenAI) -> None:
+        earlier_chats = ChatHistoryHandler.get_recent_messages(
+            owner_id=OwnerHandler.get_owner_id(client=client),
+            conversation_id=ConversationIdSState.get(),
+            count=RECENT_MESSAGE_COUNT,
+            before_turn=StoredHistorySState.get_first_turn(),
+        )
+        HistoryLimitSState.set(value=HistoryLimitSState.get() + len(earlier_chats))
+        StoredHistorySState.prepend(chats=earlier_chats)
+
+    @staticmethod
+    def store_message(client: OpenAI, sender_type: SenderEnum, sender_name: str, content: str) -> int:
+        conversation_id = ConversationIdSState.get()
+        if not conversation_id:
+            conversation_id = ChatHistoryHandler.create_conversation(owner_id=OwnerHandler.get_owner_id(client=client), title=content)
+            ConversationIdSState.set(value=conversation_id)
+            QueryParamsHandler.update(conversation=conversation_id)
+        turn = ChatHistoryHandler.append_message(conversation_id=conversation_id, sender_type=sender_type, sender_name=sender_name, content=content)
+        StoredHistorySState.add(sender_type=sender_type, sender_name=sender_name, content=content, turn=turn)
+        return turn
+
+    @staticmethod
+    def index_answer(client: OpenAI, owner_id: str, conversation_id: str, turn: int, prompt: str, answer: str) -> None:
+        vector = EmbeddingHandler.embed_text(client=client, text=f"{prompt}\n\n{answer}")
+        VectorIndexHandler.get_index(name=SEARCH_INDEX_NAME, owner_id=owner_id).add(
+            vectors=vector,
+            metadata=[
+                {
+                    "conversation_id": conversation_id,
+                    "turn": turn,
+                    "prompt": prompt[:SEARCH_SNIPPET_CHARS],
+                    "answer": answer[:SEARCH_SNIPPET_CHARS],
+                }
+            ],
+        )
+
+    @staticmethod
+    def search_answers(client: OpenAI) -> None:
+        query = (st.session_state.get("ChatGpt_SearchTextInput") or "").strip()
+        if not query:
+            SearchResultSState.reset()
+            return
+        start_time = time.perf_counter()
+        try:
+            query_vector = EmbeddingHandler.embed_text(client=client, text=query)
+        except AuthenticationError:
+            OnSubmitHandler.set_error_message(error_message="Specified OpenAI APIKey isn't valid.")
+            return
+        embedded_time = time.perf_counter()
+        results = VectorIndexHandler.get_index(name=SEARCH_INDEX_NAME, owner_id=OwnerHandler.get_owner_id(client=client)).search(
+            query_vector=query_vector, top_k=SEARCH_RESULT_COUNT
+        )
+        SearchResultSState.set(
+            value={
+                "query": query,
+                "results": [{"score": score, **metadata} for score, metadata in results],
+                "embedding_ms": (embedded_time - start_time) * 1000,
+                "search_ms": (time.perf_counter() - embedded_time) * 1000,
+            }
+        )
+
+    @staticmethod
+    def update_s_states(client: OpenAI, form_schema: FormSchema, answer: Optional[str], answered_model_type: AiModelEnum):
         AiModelTypeSState.set(value=form_schema.ai_model_type)
-        StoredHistorySState.add(sender_type=SenderEnum.USER, sender_name=SenderEnum.USER.name, content=form_schema.prompt)
-        if form_schema.ai_model_type.value and answer:
-            StoredHistorySState.add(sender_type=SenderEnum.ASSISTANT, sender_name=form_schema.ai_model_type.value, content=answer)
+        DocumentModeSState.set(value=form_schema.is_document_mode)
+        OnSubmitHandler.store_message(client=client, sender_type=SenderEnum.USER, sender_name=SenderEnum.USER.name, content=form_schema.prompt)
+        if answered_model_type.value and answer:
+            turn = OnSubmitHandler.store_message(client=client, sender_type=SenderEnum.ASSISTANT, sender_name=answered_model_type.value, content=answer)
+            # Indexing for search runs in the background so the answer is not held up by the embedding request.
+            JobHandler.spawn(
+                func=OnSubmitHandler.index_answer,
+                cost=INDEX_SCHEDULER_COST,
+                client=client,
+                owner_id=OwnerHandler.get_owner_id(client=client),
+                conversation_id=ConversationIdSState.get(),
+                turn=turn,
+                prompt=form_schema.prompt,
+                answer=answer,
+            )
 
 
 class ChatGptComponent:
@@ -69,21 +296,157 @@ class ChatGptComponent:
         if res.call_return:
             st.rerun()
 
-    @staticmethod
-    def __sub_component(client: OpenAI) -> SubComponentResult:
+    @classmethod
+    def __sub_component(cls, client: OpenAI) -> SubComponentResult:
+        OnSubmitHandler.restore_conversation(client=client)
+        cls.__display_conversation_selector(client=client)
+        cls.__display_search(client=client)
+        is_document_job_pending = cls.__display_documents(client=client)
+
         history_container = st.container()
         with history_container:
             st.markdown("#### Chat History")
+            if StoredHistorySState.get_first_turn() > 0:
+                st.button(label="Load earlier messages", on_click=OnSubmitHandler.load_earlier_messages, args=(client,), key="ChatGpt_LoadEarlierButton")
             for chat in StoredHistorySState.get():
                 with st.chat_message(name=chat["role_name"]):
                     st.write(chat["content"])
 
-        form_dict = {}
+        form_area = st.empty()
+        if SubmitSState.get():
+            OnSubmitHandler.unlock_submit_button()
+            with form_area, st.spinner("Generating..."):
+                cls.__on_submit(client=client, history_container=history_container)
+
+        with form_area.container():
+            cls.__display_form()
+        return SubComponentResult(call_rerun=is_document_job_pending)
+
+    @staticmethod
+    def __display_conversation_selector(client: OpenAI) -> None:
+        owner_id = OwnerHandler.get_owner_id(client=client)
+        conversation_titles = {
+            conversation["id"]: f"{conversation['title']} ({time.strftime('%Y/%m/%d %H:%M', time.localtime(conversation['updated_at']))})"
+            for conversation in ChatHistoryHandler.list_conversations(owner_id=owner_id)
+        }
+        conversation_id = ConversationIdSState.get()
+        if conversation_id and conversation_id not in conversation_titles:
+            conversation = ChatHistoryHandler.get_conversation(owner_id=owner_id, conversation_id=conversation_id)
+            conversation_titles[conversation_id] = conversation["title"] if conversation else conversation_id
+
+        left_col, right_col = st.columns([5, 1])
+        left_col.selectbox(
+            label="Conversation",
+            options=list(conversation_titles),
+            format_func=lambda x: conversation_titles[x],
+            index=list(conversation_titles).index(conversation_id) if conversation_id in conversation_titles else None,
+            placeholder="Open a past conversation...",
+            on_change=OnSubmitHandler.select_conversation,
+            args=(client,),
+            key="ChatGpt_ConversationSelectBox",
+        )
+        right_col.button(
+            label="New",
+            on_click=OnSubmitHandler.start_new_conversation,
+            args=(client,),
+            use_container_width=True,
+            key="ChatGpt_NewConversationButton",
+        )
+
+    @staticmethod
+    def __display_search(client: OpenAI) -> None:
+        with st.expander("Search past answers", expanded=bool(SearchResultSState.get()["query"])):
+            st.text_input(
+                label="Search",
+                placeholder="Search answers by meaning...",
+                on_change=OnSubmitHandler.search_answers,
+                args=(client,),
+                key="ChatGpt_SearchTextInput",
+            )
+            search_result = SearchResultSState.get()
+            if not search_result["query"]:
+                return
+            st.caption(
+                f"{len(search_result['results'])} results: embedding {search_result['embedding_ms']:.0f} ms, search {search_result['search_ms']:.1f} ms"
+            )
+            for index, result in enumerate(search_result["results"]):
+                left_col, right_col = st.columns([5, 1])
+                left_col.markdown(f"**{result['prompt']}**  \n{result['answer']}")
+                right_col.button(
+                    label="Open",
+                    on_click=OnSubmitHandler.open_conversation,
+                    kwargs={"client": client, "conversation_id": result["conversation_id"]},
+                    use_container_width=True,
+                    key=f"ChatGpt_SearchOpenButton_{index}",
+                )
+
+    @classmethod
+    def __display_documents(cls, client: OpenAI) -> bool:
+        with st.expander("Documents", expanded=bool(DocumentJobIdSState.get())):
+            is_job_pending = cls.__poll_document_job()
+            st.file_uploader(
+                label="Documents",
+                type=["txt", "md", "pdf"],
+                accept_multiple_files=True,
+                key="ChatGpt_UploadedDocuments",
+            )
+            st.button(
+                label="Add documents",
+                disabled=is_job_pending,
+                on_click=OnSubmitHandler.submit_document_job,
+                args=(client,),
+                key="ChatGpt_AddDocumentsButton",
+            )
+            document_status = DocumentStatusSState.get()
+            if document_status:
+                st.write(document_status)
+            st.caption(f"{len(VectorIndexHandler.get_index(name=DOCUMENT_INDEX_NAME, owner_id=OwnerHandler.get_owner_id(client=client))):,} chunks indexed")
+        return is_job_pending
+
+    @staticmethod
+    def __poll_document_job() -> bool:
+        job_id = DocumentJobIdSState.get()
+        if not job_id:
+            return False
+
+        job_status = JobHandler.wait(job_id=job_id, timeout_seconds=POLL_INTERVAL_SECONDS)
+        if job_status == JobStatusEnum.PENDING:
+            st.info("Waiting in queue...")
+            queue_position = JobHandler.get_queue_position(job_id=job_id)
+            if queue_position:
+                st.caption(f"Position in queue: {queue_position}")
+            return True
+        if job_status == JobStatusEnum.RUNNING:
+            st.info("Embedding documents...")
+            progress = JobHandler.get_progress(job_id=job_id)
+            if progress:
+                st.write(progress)
+            return True
+
+        DocumentJobIdSState.reset()
+        if job_status == JobStatusEnum.NOT_FOUND:
+            DocumentStatusSState.set(value="The document job was lost. Please add the documents again.")
+            return False
+        try:
+            _, summary = JobHandler.pop_result(job_id=job_id)
+        except AuthenticationError:
+            DocumentStatusSState.set(value="Specified OpenAI APIKey isn't valid.")
+            return False
+        except ImportError:
+            DocumentStatusSState.set(value="Reading PDF files requires the pypdf package.")
+            return False
+        DocumentStatusSState.set(
+            value=f"Added {summary['document_count']} documents ({summary['chunk_count']:,} chunks), skipped {summary['skipped_count']} already added."
+        )
+        return False
+
+    @staticmethod
+    def __display_form() -> None:
         form = st.form(key="ChatGpt_Form", clear_on_submit=True)
         with form:
             st.markdown("#### Form")
-            
-            form_dict["ai_model_type"] = st.selectbox(
+
+            st.selectbox(
                 label="Model",
                 options=EnumHandler.get_enum_members(enum=AiModelEnum),
                 format_func=lambda x: x.name,
@@ -92,14 +455,20 @@ class ChatGptComponent:
                 key="ChatGpt_ModelSelectBox",
             )
 
-            form_dict["prompt"] = st.text_area(
+            st.text_area(
                 label="Prompt",
                 disabled=SubmitSState.get(),
                 placeholder="Please input prompt...",
                 key="ChatGpt_PromptTextArea",
             )
 
-            is_submited = st.form_submit_button(
+            st.checkbox(
+                label="Answer from documents",
+                value=DocumentModeSState.get(),
+                key="ChatGpt_DocumentModeCheckBox",
+            )
+
+            st.form_submit_button(
                 label="Submit",
                 disabled=SubmitSState.get(),
                 on_click=OnSubmitHandler.lock_submit_button,
@@ -110,25 +479,25 @@ class ChatGptComponent:
             if error_message:
                 st.warning(error_message)
 
-        if is_submited:
-            try:
-                form_schema = FormSchema(**form_dict)
-            except ValidationError:
-                OnSubmitHandler.set_error_message(error_message="Please fill out the form completely.")
-                OnSubmitHandler.unlock_submit_button()
-                return SubComponentResult(call_rerun=True)
-
-            with history_container:
-                OnSubmitHandler.display_prompt(prompt=form_schema.prompt)
-                try:
-                    generated_answer = OnSubmitHandler.query_answer_and_display_streamly(client=client, form_schema=form_schema)
-                except AuthenticationError:
-                    OnSubmitHandler.set_error_message(error_message="Specified OpenAI APIKey isn't valid.")
-                    OnSubmitHandler.unlock_submit_button()
-                    return SubComponentResult(call_rerun=True)
-            OnSubmitHandler.update_s_states(form_schema=form_schema, answer=generated_answer)
-            OnSubmitHandler.reset_error_message()
-            OnSubmitHandler.unlock_submit_button()
-            return SubComponentResult(call_rerun=True)
+    @staticmethod
+    @TracingHandler.traced_root
+    def __on_submit(client: OpenAI, history_container: DeltaGenerator) -> None:
+        try:
+            with TracingHandler.span(name="validate_form"):
+                form_schema = FormSchema(**OnSubmitHandler.get_form_dict())
+        except ValidationError:
+            OnSubmitHandler.set_error_message(error_message="Please fill out the form completely.")
+            return
 
-        return SubComponentResult()
+        with history_container:
+            OnSubmitHandler.display_prompt(prompt=form_schema.prompt)
+            try:
+                generated_answer, answered_model_type = OnSubmitHandler.query_answer_and_display_streamly(client=client, form_schema=form_schema)
+            except AuthenticationError:
+                OnSubmitHandler.set_error_message(error_message="Specified OpenAI APIKey isn't valid.")
+                return
+            except OverloadedException:
+                OnSubmitHandler.set_error_message(error_message="The server is busy. Please try again in a minute.")
+                return
+        OnSubmitHandler.update_s_states(client=client, form_schema=form_schema, answer=generated_answer, answered_model_type=answered_model_type)
+        OnSubmitHandler.reset_error_message()
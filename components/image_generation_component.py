@@ -1,26 +1,49 @@
-from typing import Union
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 from openai import OpenAI, AuthenticationError
 from pydantic import BaseModel, ValidationError, Field
 import streamlit as st
 
-from enums.image_generation_enum import AiModelEnum, SizeEnum, QualityEnum
+from enums.global_enum import PageEnum
+from enums.image_generation_enum import AiModelEnum, SizeEnum, QualityEnum, DraftSizeEnum
+from enums.job_enum import JobStatusEnum
+from enums.scheduler_enum import SchedulerLaneEnum
+from exceptions.exceptions import OverloadedException
+from handlers.admission_handler import AdmissionHandler
 from handlers.enum_handler import EnumHandler
 from handlers.image_handler import ImageHandler
 from handlers.image_generation_handler import ImageGenerationHandler
+from handlers.job_handler import JobHandler, POLL_INTERVAL_SECONDS
+from handlers.tracing_handler import TracingHandler
 from s_states.image_generation_s_states import (
     SubmitSState,
     ErrorMessageSState,
+    JobIdSState,
     AiModelTypeSState,
     SizeTypeSState,
     QualityTypeSState,
     StoredPromptSState,
     StoredImageSState,
+    StoredImageUrlSState,
+    DraftModeSState,
+    DraftSizeTypeSState,
+    StoredDraftsSState,
 )
+from s_states.global_s_states import PageSState
+from s_states.image_recognition_s_states import HandedOffImageSState
 from components.sub_compornent_result import SubComponentResult
 
 
+# Generated image URLs expire after an hour. They are only reused while they are surely still valid.
+IMAGE_URL_TTL_SECONDS = 50 * 60
+DESCRIBE_PROMPT = "Describe this image."
+SCHEDULER_COST = 4.0
+DRAFT_SCHEDULER_COST = 1.0
+DRAFT_IMAGE_COUNT = 4
+
+
 class FormSchema(BaseModel):
     ai_model_type: AiModelEnum
     size_type: SizeEnum
@@ -28,6 +51,12 @@ class FormSchema(BaseModel):
     prompt: str = Field(min_length=1)
 
 
+class DraftFormSchema(BaseModel):
+    draft_size_type: DraftSizeEnum
+    prompt: str = Field(min_length=1)
+
+
+@TracingHandler.traced_class
 class OnSubmitHandler:
     @staticmethod
     def lock_submit_button():
@@ -37,6 +66,26 @@ class OnSubmitHandler:
     def unlock_submit_button():
         SubmitSState.reset()
 
+    @staticmethod
+    def get_form_dict() -> Dict[str, Any]:
+        return {
+            "ai_model_type": st.session_state.get("ImageGeneration_ModelSelectBox"),
+            "size_type": st.session_state.get("ImageGeneration_SizeSelectBox"),
+            "quality_type": st.session_state.get("ImageGeneration_QualitySelectBox"),
+            "prompt": st.session_state.get("ImageGeneration_PromptTextArea"),
+        }
+
+    @staticmethod
+    def get_draft_form_dict() -> Dict[str, Any]:
+        return {
+            "draft_size_type": st.session_state.get("ImageGeneration_DraftSizeSelectBox"),
+            "prompt": st.session_state.get("ImageGeneration_PromptTextArea"),
+        }
+
+    @staticmethod
+    def is_draft_mode() -> bool:
+        return bool(st.session_state.get("ImageGeneration_DraftModeCheckBox"))
+
     @staticmethod
     def set_error_message(error_message: str = "Please fill out the form completely.") -> None:
         ErrorMessageSState.set(value=error_message)
@@ -57,19 +106,116 @@ class OnSubmitHandler:
         return image_url
 
     @staticmethod
-    def download_image(image_url: str) -> np.ndarray:
-        return ImageHandler.download_as_array_rgb(image_url=image_url)
+    def download_image(image_url: str) -> bytes:
+        return ImageHandler.download_as_bytes(image_url=image_url)
+
+    @staticmethod
+    def generate_and_download_image(client: OpenAI, form_schema: FormSchema) -> Tuple[str, bytes]:
+        image_url = OnSubmitHandler.generate_image(client=client, form_schema=form_schema)
+        return image_url, OnSubmitHandler.download_image(image_url=image_url)
+
+    @staticmethod
+    def submit_job(client: OpenAI, form_schema: FormSchema) -> None:
+        load_level = AdmissionHandler.admit(client=client, lane=SchedulerLaneEnum.BATCH)
+        size_type, quality_type = AdmissionHandler.degrade_image_options(
+            size_type=form_schema.size_type,
+            quality_type=form_schema.quality_type,
+            load_level=load_level,
+        )
+        notice = AdmissionHandler.make_notice(
+            changes=(
+                ("size", form_schema.size_type.name, size_type.name),
+                ("quality", form_schema.quality_type.name, quality_type.name),
+            )
+        )
+        if notice:
+            st.toast(notice)
+
+        # The payload keeps the requested options, so the form still shows what the user chose.
+        job_id = JobHandler.submit(
+            func=OnSubmitHandler.generate_and_download_image,
+            payload=form_schema,
+            cost=SCHEDULER_COST,
+            client=client,
+            form_schema=form_schema.model_copy(update={"size_type": size_type, "quality_type": quality_type}),
+        )
+        JobIdSState.set(value=job_id)
+
+    @staticmethod
+    def generate_draft_images(client: OpenAI, form_schema: DraftFormSchema) -> List[bytes]:
+        return ImageGenerationHandler.generate_draft_images(
+            client=client,
+            prompt=form_schema.prompt,
+            size_type=form_schema.draft_size_type,
+            image_count=DRAFT_IMAGE_COUNT,
+        )
+
+    @staticmethod
+    def submit_draft_job(client: OpenAI, form_schema: DraftFormSchema) -> None:
+        # Drafts are already the cheapest option, so they are only ever admitted or shed, never degraded.
+        AdmissionHandler.admit(client=client, lane=SchedulerLaneEnum.BATCH)
+        job_id = JobHandler.submit(
+            func=OnSubmitHandler.generate_draft_images,
+            payload=form_schema,
+            cost=DRAFT_SCHEDULER_COST,
+            client=client,
+            form_schema=form_schema,
+        )
+        JobIdSState.set(value=job_id)
+
+    @staticmethod
+    @TracingHandler.traced_root
+    def render_draft(client: OpenAI, prompt: str) -> None:
+        """
+        Renders the prompt of a chosen draft set with DALL-E 3 at the selected size and HD quality.
+        """
+        form_schema = FormSchema(
+            ai_model_type=AiModelEnum.DALLE_3,
+            size_type=SizeTypeSState.get(),
+            quality_type=QualityEnum.HD,
+            prompt=prompt,
+        )
+        try:
+            OnSubmitHandler.submit_job(client=client, form_schema=form_schema)
+        except OverloadedException:
+            OnSubmitHandler.set_error_message(error_message="The server is busy. Please try again in a minute.")
+
+    @staticmethod
+    def update_draft_s_states(form_schema: DraftFormSchema, draft_images: List[bytes]) -> None:
+        DraftSizeTypeSState.set(value=form_schema.draft_size_type)
+        StoredDraftsSState.add(prompt=form_schema.prompt, images=draft_images)
 
     @staticmethod
     def update_s_states(
         form_schema: FormSchema,
-        generated_image: Union[np.ndarray, str],
+        generated_image: Union[np.ndarray, bytes],
+        image_url: Optional[str] = None,
     ) -> None:
         AiModelTypeSState.set(value=form_schema.ai_model_type)
         SizeTypeSState.set(value=form_schema.size_type)
         QualityTypeSState.set(value=form_schema.quality_type)
         StoredPromptSState.set(value=form_schema.prompt)
         StoredImageSState.set(value=generated_image)
+        StoredImageUrlSState.set(value={"url": image_url, "expires_at": time.time() + IMAGE_URL_TTL_SECONDS} if image_url else None)
+
+    @staticmethod
+    def describe_image() -> None:
+        """
+        Hands the stored encoded bytes and URL to the Image Recognition page, which describes them without downloading or decoding the image again.
+        """
+        image_bytes = StoredImageSState.get()
+        if not isinstance(image_bytes, bytes):
+            return
+        stored_image_url = StoredImageUrlSState.get()
+        is_url_valid = stored_image_url and stored_image_url["expires_at"] > time.time()
+        HandedOffImageSState.set(
+            value={
+                "prompt": DESCRIBE_PROMPT,
+                "image_bytes": image_bytes,
+                "image_url": stored_image_url["url"] if is_url_valid else None,
+            }
+        )
+        PageSState.set(value=PageEnum.IMAGE_RECOGNITION)
 
 
 class ImageGenerationComponent:
@@ -79,15 +225,42 @@ class ImageGenerationComponent:
         if res.call_return:
             st.rerun()
 
+    @classmethod
+    def __sub_component(cls, client: OpenAI) -> SubComponentResult:
+        form_area = st.empty()
+        if SubmitSState.get():
+            OnSubmitHandler.unlock_submit_button()
+            cls.__on_submit(client=client)
+        is_job_pending = cls.__poll_job()
+
+        with form_area.container():
+            cls.__display_form(is_job_pending=is_job_pending)
+
+        cls.__display_drafts(client=client, is_job_pending=is_job_pending)
+
+        st.markdown("#### Result")
+        stored_image = StoredImageSState.get()
+        st.image(
+            image=stored_image,
+            caption=StoredPromptSState.get(),
+            use_column_width=True,
+        )
+        st.button(
+            label="Describe this image",
+            disabled=not isinstance(stored_image, bytes) or is_job_pending,
+            on_click=OnSubmitHandler.describe_image,
+            key="ImageGeneration_DescribeButton",
+        )
+        return SubComponentResult(call_rerun=is_job_pending)
+
     @staticmethod
-    def __sub_component(client: OpenAI) -> SubComponentResult:
-        form_dict = {}
+    def __display_form(is_job_pending: bool) -> None:
         form = st.form(key="ImageGeneration_Form", clear_on_submit=True)
         with form:
             st.markdown("#### Form")
             left_col, center_col, right_col = st.columns(3)
 
-            form_dict["ai_model_type"] = left_col.selectbox(
+            left_col.selectbox(
                 label="Model",
                 options=EnumHandler.get_enum_members(enum=AiModelEnum),
                 format_func=lambda x: x.name,
@@ -96,7 +269,7 @@ class ImageGenerationComponent:
                 key="ImageGeneration_ModelSelectBox",
             )
 
-            form_dict["size_type"] = center_col.selectbox(
+            center_col.selectbox(
                 label="Size",
                 options=EnumHandler.get_enum_members(enum=SizeEnum),
                 format_func=lambda x: x.name,
@@ -105,7 +278,7 @@ class ImageGenerationComponent:
                 key="ImageGeneration_SizeSelectBox",
             )
 
-            form_dict["quality_type"] = right_col.selectbox(
+            right_col.selectbox(
                 label="Quality",
                 options=EnumHandler.get_enum_members(enum=QualityEnum),
                 format_func=lambda x: x.name,
@@ -114,16 +287,32 @@ class ImageGenerationComponent:
                 key="ImageGeneration_QualitySelectBox",
             )
 
-            form_dict["prompt"] = st.text_area(
+            draft_left_col, draft_right_col = st.columns(2)
+            draft_left_col.checkbox(
+                label=f"Draft mode ({DRAFT_IMAGE_COUNT} quick DALL-E 2 images)",
+                value=DraftModeSState.get(),
+                key="ImageGeneration_DraftModeCheckBox",
+            )
+
+            draft_right_col.selectbox(
+                label="Draft size",
+                options=EnumHandler.get_enum_members(enum=DraftSizeEnum),
+                format_func=lambda x: x.name,
+                index=EnumHandler.enum_member_to_index(member=DraftSizeTypeSState.get()),
+                placeholder="Select draft size...",
+                key="ImageGeneration_DraftSizeSelectBox",
+            )
+
+            st.text_area(
                 label="Prompt",
                 disabled=SubmitSState.get(),
                 placeholder="Please input prompt...",
                 key="ImageGeneration_PromptTextArea",
             )
 
-            is_submited = st.form_submit_button(
+            st.form_submit_button(
                 label="Submit",
-                disabled=SubmitSState.get(),
+                disabled=SubmitSState.get() or is_job_pending,
                 on_click=OnSubmitHandler.lock_submit_button,
                 type="primary",
             )
@@ -132,34 +321,77 @@ class ImageGenerationComponent:
             if error_message:
                 st.warning(error_message)
 
-        if is_submited:
-            try:
-                form_schema = FormSchema(**form_dict)
-            except ValidationError:
-                OnSubmitHandler.set_error_message(error_message="Please fill out the form completely.")
-                OnSubmitHandler.unlock_submit_button()
-                return SubComponentResult(call_rerun=True)
-
-            with form:
-                with st.status("Generating..."):
-                    st.write("Querying...")
-                    try:
-                        generated_image_url = OnSubmitHandler.generate_image(client=client, form_schema=form_schema)
-                    except AuthenticationError:
-                        OnSubmitHandler.set_error_message(error_message="Specified OpenAI APIKey isn't valid.")
-                        OnSubmitHandler.unlock_submit_button()
-                        return SubComponentResult(call_rerun=True)
-                    st.write(f"[Downloading...]({generated_image_url})")
-                    generated_image_rgb = OnSubmitHandler.download_image(image_url=generated_image_url)
-            OnSubmitHandler.update_s_states(form_schema=form_schema, generated_image=generated_image_rgb)
-            OnSubmitHandler.reset_error_message()
-            OnSubmitHandler.unlock_submit_button()
-            return SubComponentResult(call_rerun=True)
+    @staticmethod
+    def __display_drafts(client: OpenAI, is_job_pending: bool) -> None:
+        stored_drafts = StoredDraftsSState.get()
+        if not stored_drafts:
+            return
 
-        st.markdown("#### Result")
-        st.image(
-            image=StoredImageSState.get(),
-            caption=StoredPromptSState.get(),
-            use_column_width=True,
-        )
-        return SubComponentResult()
+        st.markdown("#### Drafts")
+        for index, draft_set in enumerate(stored_drafts):
+            for col, draft_image in zip(st.columns(len(draft_set["images"])), draft_set["images"]):
+                col.image(image=draft_image, use_column_width=True)
+            left_col, right_col = st.columns([3, 1])
+            left_col.caption(draft_set["prompt"])
+            right_col.button(
+                label="Render at full size",
+                disabled=is_job_pending,
+                on_click=OnSubmitHandler.render_draft,
+                kwargs={"client": client, "prompt": draft_set["prompt"]},
+                key=f"ImageGeneration_RenderDraftButton_{index}",
+            )
+
+    @staticmethod
+    @TracingHandler.traced_root
+    def __on_submit(client: OpenAI) -> None:
+        is_draft_mode = OnSubmitHandler.is_draft_mode()
+        DraftModeSState.set(value=is_draft_mode)
+        try:
+            with TracingHandler.span(name="validate_form"):
+                form_schema = DraftFormSchema(**OnSubmitHandler.get_draft_form_dict()) if is_draft_mode else FormSchema(**OnSubmitHandler.get_form_dict())
+        except ValidationError:
+            OnSubmitHandler.set_error_message(error_message="Please fill out the form completely.")
+            return
+
+        try:
+            if isinstance(form_schema, DraftFormSchema):
+                OnSubmitHandler.submit_draft_job(client=client, form_schema=form_schema)
+            else:
+                OnSubmitHandler.submit_job(client=client, form_schema=form_schema)
+        except OverloadedException:
+            OnSubmitHandler.set_error_message(error_message="The server is busy. Please try again in a minute.")
+
+    @staticmethod
+    def __poll_job() -> bool:
+        job_id = JobIdSState.get()
+        if not job_id:
+            return False
+
+        job_status = JobHandler.wait(job_id=job_id, timeout_seconds=POLL_INTERVAL_SECONDS)
+        if job_status == JobStatusEnum.PENDING:
+            st.info("Waiting in queue...")
+            queue_position = JobHandler.get_queue_position(job_id=job_id)
+            if queue_position:
+                st.caption(f"Position in queue: {queue_position}")
+            return True
+        if job_status == JobStatusEnum.RUNNING:
+            st.info("Generating...")
+            return True
+
+        JobIdSState.reset()
+        if job_status == JobStatusEnum.NOT_FOUND:
+            OnSubmitHandler.set_error_message(error_message="The generation job was lost. Please submit again.")
+            return False
+        try:
+            form_schema, result = JobHandler.pop_result(job_id=job_id)
+        except AuthenticationError:
+            OnSubmitHandler.set_error_message(error_message="Specified OpenAI APIKey isn't valid.")
+            return False
+        if isinstance(form_schema, DraftFormSchema):
+            OnSubmitHandler.update_draft_s_states(form_schema=form_schema, draft_images=result)
+            OnSubmitHandler.reset_error_message()
+            return False
+        image_url, generated_image_bytes = result
+        OnSubmitHandler.update_s_states(form_schema=form_schema, generated_image=generated_image_bytes, image_url=image_url)
+        OnSubmitHandler.reset_error_message()
+        return False
@@ -1,36 +1,52 @@
-from typing import Optional
+from typing import Any, Dict, Optional
 
-import numpy as np
 from openai import OpenAI, AuthenticationError
 from pydantic import BaseModel, ValidationError, Field
 import streamlit as st
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 
 from enums.image_recognition_enum import ExtensionEnum
+from enums.scheduler_enum import SchedulerLaneEnum
+from exceptions.exceptions import OverloadedException
+from handlers.admission_handler import AdmissionHandler
 from handlers.image_handler import ImageHandler
 from handlers.enum_handler import EnumHandler
 from handlers.image_recognition_handler import ImageRecognitionHandler
-from s_states.image_recognition_s_states import SubmitSState, ErrorMessageSState, StoredPromptSState, StoredImageSState, StoredAnswerSState
+from handlers.scheduler_handler import SchedulerHandler
+from handlers.tracing_handler import TracingHandler
+from s_states.image_recognition_s_states import (
+    SubmitSState,
+    ErrorMessageSState,
+    StoredPromptSState,
+    StoredImageSState,
+    HandedOffImageSState,
+    StoredAnswerSState,
+)
+from components.streaming_markdown_component import StreamingMarkdownComponent
 from components.sub_compornent_result import SubComponentResult
 
 
+SCHEDULER_COST = 2.0
+
+
 class FormSchema(BaseModel):
     prompt: str = Field(min_length=1)
     image_bytes: bytes
+    image_url: Optional[str] = None
 
     @classmethod
     def construct_using_form_dict(cls, prompt: str, uploaded_image: UploadedFile):
         return cls(prompt=prompt, image_bytes=uploaded_image.getvalue())
 
     @property
-    def image_b64(self) -> str:
+    def image_b64(self) -> Optional[str]:
+        # A handed-off image that still has its URL is sent by reference, so it is never base64-encoded.
+        if self.image_url:
+            return None
         return ImageHandler.bytes_to_b64(image_bytes=self.image_bytes)
 
-    @property
-    def image_array_rgb(self) -> np.ndarray:
-        return ImageHandler.bytes_to_array_rgb(image_bytes=self.image_bytes)
-
 
+@TracingHandler.traced_class
 class OnSubmitHandler:
     @staticmethod
     def lock_submit_button():
@@ -40,6 +56,13 @@ class OnSubmitHandler:
     def unlock_submit_button():
         SubmitSState.reset()
 
+    @staticmethod
+    def get_form_dict() -> Dict[str, Any]:
+        return {
+            "prompt": st.session_state.get("ImageRecognition_PromptInput"),
+            "uploaded_image": st.session_state.get("ImageRecognition_UploadedImage"),
+        }
+
     @staticmethod
     def set_error_message(error_message: str) -> None:
         ErrorMessageSState.set(value=error_message)
@@ -48,29 +71,53 @@ class OnSubmitHandler:
     def reset_error_message() -> None:
         ErrorMessageSState.reset()
 
+    @staticmethod
+    def pop_handed_off_image() -> Optional[Dict[str, Any]]:
+        handed_off_image = HandedOffImageSState.get()
+        HandedOffImageSState.reset()
+        return handed_off_image
+
     @staticmethod
     def display_uploaded_image(form_schema: FormSchema) -> None:
+        # The encoded bytes are shown as they are, so the browser decodes them instead of the server.
         st.image(
-            image=form_schema.image_array_rgb,
+            image=form_schema.image_bytes,
             caption=form_schema.prompt,
             use_column_width=True,
         )
 
     @staticmethod
     def query_answer_and_display_streamly(client: OpenAI, form_schema: FormSchema) -> Optional[str]:
-        answer_area = st.empty()
-        answer = ImageRecognitionHandler.query_answer_and_display_streamly(
+        load_level = AdmissionHandler.admit(client=client, lane=SchedulerLaneEnum.INTERACTIVE)
+        detail = AdmissionHandler.get_vision_detail(load_level=load_level)
+        notice = AdmissionHandler.make_notice(changes=(("detail", "auto", detail),))
+        if notice:
+            st.toast(notice)
+
+        queue_area = st.empty()
+        with SchedulerHandler.slot(
             client=client,
-            image_b64=form_schema.image_b64,
-            prompt=form_schema.prompt,
-            display_func=answer_area.write,
-        )
+            lane=SchedulerLaneEnum.INTERACTIVE,
+            cost=SCHEDULER_COST,
+            display_func=lambda queue_position: queue_area.info(f"Waiting in queue... (position {queue_position})"),
+        ):
+            queue_area.empty()
+            answer_renderer = StreamingMarkdownComponent()
+            answer = ImageRecognitionHandler.query_answer_and_display_streamly(
+                client=client,
+                image_b64=form_schema.image_b64,
+                prompt=form_schema.prompt,
+                display_func=answer_renderer.write,
+                image_url=form_schema.image_url,
+                detail=detail,
+            )
+        answer_renderer.flush(answer=answer)
         return answer
 
     @staticmethod
     def update_s_states(form_schema: FormSchema, answer: Optional[str]):
         StoredPromptSState.set(value=form_schema.prompt)
-        StoredImageSState.set(value=form_schema.image_array_rgb)
+        StoredImageSState.set(value=form_schema.image_bytes)
         if answer:
             StoredAnswerSState.set(value=answer)
 
@@ -82,27 +129,58 @@ class ImageRecognitionComponent:
         if res.call_return:
             st.rerun()
 
+    @classmethod
+    def __sub_component(cls, client: OpenAI) -> SubComponentResult:
+        form_area = st.empty()
+        result_container = st.container()
+        is_answered = False
+        handed_off_image = OnSubmitHandler.pop_handed_off_image()
+        if SubmitSState.get() or handed_off_image:
+            OnSubmitHandler.unlock_submit_button()
+            with form_area, st.spinner("Generating..."):
+                with result_container:
+                    is_answered = cls.__on_submit(client=client, handed_off_image=handed_off_image)
+
+        with form_area.container():
+            cls.__display_form()
+
+        if is_answered:
+            return SubComponentResult()
+
+        answer = StoredAnswerSState.get()
+        image_bytes = StoredImageSState.get()
+        if answer and image_bytes:
+            with result_container:
+                st.markdown("#### Result")
+                st.image(
+                    image=image_bytes,
+                    caption=StoredPromptSState.get(),
+                    use_column_width=True,
+                )
+                st.write(answer)
+
+        return SubComponentResult()
+
     @staticmethod
-    def __sub_component(client: OpenAI) -> SubComponentResult:
-        form_dict = {}
+    def __display_form() -> None:
         form = st.form(key="ImageRecognition_Form", clear_on_submit=True)
         with form:
             st.markdown("#### Form")
 
-            form_dict["prompt"] = st.text_input(
+            st.text_input(
                 label="Prompt",
                 disabled=SubmitSState.get(),
                 placeholder="Please input prompt...",
                 key="ImageRecognition_PromptInput",
             )
 
-            form_dict["uploaded_image"] = st.file_uploader(
+            st.file_uploader(
                 label="Uploader",
                 type=EnumHandler.get_enum_member_values(enum=ExtensionEnum),
                 key="ImageRecognition_UploadedImage",
             )
 
-            is_submited = st.form_submit_button(
+            st.form_submit_button(
                 label="Submit",
                 disabled=SubmitSState.get(),
                 on_click=OnSubmitHandler.lock_submit_button,
@@ -113,36 +191,29 @@ class ImageRecognitionComponent:
             if error_message:
                 st.warning(error_message)
 
-        if is_submited:
-            try:
-                form_schema = FormSchema.construct_using_form_dict(**form_dict)
-            except:
-                OnSubmitHandler.set_error_message(error_message="Please fill out the form completely.")
-                OnSubmitHandler.unlock_submit_button()
-                return SubComponentResult(call_rerun=True)
-
-            st.markdown("#### Result")
-            OnSubmitHandler.display_uploaded_image(form_schema=form_schema)
-            try:
-                generated_answer = OnSubmitHandler.query_answer_and_display_streamly(client=client, form_schema=form_schema)
-            except AuthenticationError:
-                OnSubmitHandler.set_error_message(error_message="Specified OpenAI APIKey isn't valid.")
-                OnSubmitHandler.unlock_submit_button()
-                return SubComponentResult(call_rerun=True)
-            OnSubmitHandler.update_s_states(form_schema=form_schema, answer=generated_answer)
-            OnSubmitHandler.reset_error_message()
-            OnSubmitHandler.unlock_submit_button()
-            return SubComponentResult(call_rerun=True)
-
-        answer = StoredAnswerSState.get()
-        image_array_bgr = StoredImageSState.get()
-        if answer and type(image_array_bgr) == np.ndarray:
-            st.markdown("#### Result")
-            st.image(
-                image=image_array_bgr,
-                caption=StoredPromptSState.get(),
-                use_column_width=True,
-            )
-            st.write(answer)
-
-        return SubComponentResult()
+    @staticmethod
+    @TracingHandler.traced_root
+    def __on_submit(client: OpenAI, handed_off_image: Optional[Dict[str, Any]]) -> bool:
+        try:
+            with TracingHandler.span(name="validate_form"):
+                if handed_off_image:
+                    form_schema = FormSchema(**handed_off_image)
+                else:
+                    form_schema = FormSchema.construct_using_form_dict(**OnSubmitHandler.get_form_dict())
+        except:
+            OnSubmitHandler.set_error_message(error_message="Please fill out the form completely.")
+            return False
+
+        st.markdown("#### Result")
+        OnSubmitHandler.display_uploaded_image(form_schema=form_schema)
+        try:
+            generated_answer = OnSubmitHandler.query_answer_and_display_streamly(client=client, form_schema=form_schema)
+        except AuthenticationError:
+            OnSubmitHandler.set_error_message(error_message="Specified OpenAI APIKey isn't valid.")
+            return False
+        except OverloadedException:
+            OnSubmitHandler.set_error_message(error_message="The server is busy. Please try again in a minute.")
+            return False
+        OnSubmitHandler.update_s_states(form_schema=form_schema, answer=generated_answer)
+        OnSubmitHandler.reset_error_message()
+        return True
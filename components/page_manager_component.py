@@ -1,21 +1,53 @@
+import hmac
+import time
+
 from openai import OpenAI
 import streamlit as st
+from streamlit.runtime.scriptrunner import RerunException, get_script_run_ctx
 
+from enums.api_key_enum import ApiKeyStatusEnum
+from enums.env_enum import EnvEnum
 from enums.global_enum import PageEnum
+from handlers.api_key_handler import ApiKeyHandler
 from handlers.enum_handler import EnumHandler
-from s_states.global_s_states import PageSState, OpenAiClientSState
+from handlers.memory_profiler_handler import MemoryProfilerHandler
+from handlers.metrics_handler import MetricsHandler
+from handlers.profiler_handler import ProfilerHandler, PROFILE_DIRECTORY
+from handlers.rerun_stats_handler import RerunStatsHandler
+from handlers.tracing_handler import TracingHandler
+from s_states.global_s_states import PageSState, OpenAiClientSState, ProfilingModeSState, ProfileReportSState
 from components.home_component import HomeComponent
 from components.chat_gpt_component import ChatGptComponent
 from components.image_recognition_component import ImageRecognitionComponent
 from components.image_generation_component import ImageGenerationComponent
 from components.speech_recognition_component import SpeechRecognitionComponent
 from components.speech_generation_component import SpeechGenerationComponent
+from components.voice_chat_component import VoiceChatComponent
+from components.admin_component import AdminComponent
 
 
 class PageManagerComponent:
     @classmethod
     def display_component(cls) -> None:
+        if not (EnvEnum.PROFILING_MODE.value or (ProfilingModeSState.get() and cls.__is_admin())):
+            cls.__display_components()
+            return
+
+        top_functions = []
+        try:
+            with ProfilerHandler.profile(label=PageSState.get().name) as top_functions:
+                cls.__display_components()
+        finally:
+            ProfileReportSState.set(value=top_functions)
+        cls.__display_component_of_profile_report()
+
+    @classmethod
+    def __display_components(cls) -> None:
         cls.__display_component_of_api_key_input()
+        cls.__display_component_of_admin_password_input()
+        # The Admin page shows every session's data, so it is hidden from everyone but admins.
+        if PageSState.get() == PageEnum.ADMIN and not cls.__is_admin():
+            PageSState.reset()
         cls.__display_component_of_selected_page(page_type=PageSState.get())
 
     @classmethod
@@ -31,28 +63,104 @@ class PageManagerComponent:
             return
         client = OpenAiClientSState.get()
         if not client:
-            OpenAiClientSState.set(value=OpenAI(api_key=inputed_api_key))
+            OpenAiClientSState.set(value=OpenAI(api_key=inputed_api_key, base_url=EnvEnum.OPENAI_BASE_URL.value, http_client=TracingHandler.make_http_client()))
             return
         if inputed_api_key != client.api_key:
-            OpenAiClientSState.set(value=OpenAI(api_key=inputed_api_key))
+            OpenAiClientSState.set(value=OpenAI(api_key=inputed_api_key, base_url=EnvEnum.OPENAI_BASE_URL.value, http_client=TracingHandler.make_http_client()))
+            return
+
+    @staticmethod
+    def __display_component_of_admin_password_input() -> None:
+        if not EnvEnum.ADMIN_PASSWORD.value:
             return
+        st.sidebar.text_input(
+            label="Admin Password",
+            type="password",
+            key="Sidebar_Admin_Password_TextInput",
+        )
 
     @staticmethod
-    def __display_component_of_selected_page(page_type: PageEnum) -> None:
+    def __is_admin() -> bool:
+        admin_password = EnvEnum.ADMIN_PASSWORD.value
+        inputed_password = st.session_state.get("Sidebar_Admin_Password_TextInput")
+        if not (admin_password and inputed_password):
+            return False
+        return hmac.compare_digest(inputed_password.encode(), admin_password.encode())
+
+    @classmethod
+    def __display_component_of_selected_page(cls, page_type: PageEnum) -> None:
         client = OpenAiClientSState.get()
 
         if not client:
             st.warning("OpenAI API Key hasn't been set yet.")
             return
+        if ApiKeyHandler.validate(client=client) == ApiKeyStatusEnum.INVALID:
+            st.error("Specified OpenAI APIKey isn't valid. Please check it before submitting.")
+            return
 
         st.sidebar.selectbox(
             label="Pages Selection",
-            options=EnumHandler.get_enum_members(PageEnum),
+            options=[member for member in EnumHandler.get_enum_members(PageEnum) if member != PageEnum.ADMIN or cls.__is_admin()],
             format_func=lambda x: x.value,
             key=PageSState.get_name(),
         )
 
+        cls.__display_component_of_rerun_stats(page_type=page_type)
+
         st.write(f"## {page_type.value}")
+        start_time = time.perf_counter()
+        is_rerun_requested = False
+        try:
+            cls.__display_component_of_page(page_type=page_type, client=client)
+        except RerunException:
+            is_rerun_requested = True
+            raise
+        finally:
+            duration_seconds = time.perf_counter() - start_time
+            RerunStatsHandler.record_run(
+                page_name=page_type.name,
+                duration_seconds=duration_seconds,
+                is_rerun_requested=is_rerun_requested,
+            )
+            MetricsHandler.observe(name="page_run_seconds", value=duration_seconds, labels={"page": page_type.name})
+            cls.__record_session_state_size()
+
+    @staticmethod
+    def __record_session_state_size() -> None:
+        ctx = get_script_run_ctx()
+        if not ctx:
+            return
+        session_state = {key: st.session_state[key] for key in st.session_state.keys()}
+        session_state_bytes = sum(MetricsHandler.estimate_size(value=value) for value in session_state.values())
+        MetricsHandler.set_gauge(name="session_state_bytes", value=session_state_bytes, labels={"session": ctx.session_id})
+        if MemoryProfilerHandler.is_tracing():
+            MemoryProfilerHandler.record_session(session_id=ctx.session_id, page_name=PageSState.get().name, session_state=session_state)
+
+    @classmethod
+    def __display_component_of_rerun_stats(cls, page_type: PageEnum) -> None:
+        stats = RerunStatsHandler.get_stats(page_name=page_type.name)
+        with st.sidebar.expander("Rerun Stats"):
+            st.caption(
+                f"Runs: {stats['runs']:.0f} / Reruns: {stats['reruns']:.0f}  \n"
+                f"Avg: {stats['total_seconds'] / max(stats['runs'], 1) * 1000:.0f} ms / Max: {stats['max_seconds'] * 1000:.0f} ms"
+            )
+            # Profiled runs write to disk, so only admins may turn profiling on.
+            if not (EnvEnum.PROFILING_MODE.value or cls.__is_admin()):
+                return
+            st.checkbox(
+                label="Profile reruns",
+                disabled=bool(EnvEnum.PROFILING_MODE.value),
+                key=ProfilingModeSState.get_name(),
+            )
+
+    @staticmethod
+    def __display_component_of_profile_report() -> None:
+        with st.sidebar.expander("Profile: Top Functions", expanded=True):
+            st.caption(f"Cumulative time of this run. Profiles are saved to {PROFILE_DIRECTORY}.")
+            st.dataframe(data=ProfileReportSState.get(), hide_index=True, use_container_width=True)
+
+    @staticmethod
+    def __display_component_of_page(page_type: PageEnum, client: OpenAI) -> None:
         if page_type == PageEnum.HOME:
             HomeComponent.display_component(client=client)
         elif page_type == PageEnum.CHAT_GPT:
@@ -65,3 +173,7 @@ class PageManagerComponent:
             SpeechRecognitionComponent.display_component(client=client)
         elif page_type == PageEnum.SPEECH_GENERATION:
             SpeechGenerationComponent.display_component(client=client)
+        elif page_type == PageEnum.VOICE_CHAT:
+            VoiceChatComponent.display_component(client=client)
+        elif page_type == PageEnum.ADMIN:
+            AdminComponent.display_component(client=client)
@@ -1,19 +1,42 @@
+from typing import Any, Dict
+
 from openai import OpenAI, AuthenticationError
 from pydantic import BaseModel, ValidationError, Field
 import streamlit as st
 
-from enums.speech_generation_enum import VoiceEnum
+from enums.job_enum import JobStatusEnum
+from enums.scheduler_enum import SchedulerLaneEnum
+from enums.speech_generation_enum import AiModelEnum, VoiceEnum, FormatEnum
+from exceptions.exceptions import OverloadedException
+from handlers.admission_handler import AdmissionHandler
 from handlers.enum_handler import EnumHandler
+from handlers.job_handler import JobHandler, POLL_INTERVAL_SECONDS
 from handlers.speech_generation_handler import SpeechGenerationHandler
-from s_states.speech_generation_s_states import SubmitSState, ErrorMessageSState, VoiceTypeSState, StoredPromptSState, StoredSpeechSState
+from handlers.tracing_handler import TracingHandler
+from s_states.speech_generation_s_states import (
+    SubmitSState,
+    ErrorMessageSState,
+    JobIdSState,
+    AiModelTypeSState,
+    VoiceTypeSState,
+    FormatTypeSState,
+    StoredPromptSState,
+    StoredSpeechSState,
+)
 from components.sub_compornent_result import SubComponentResult
 
 
+SCHEDULER_COST = 2.0
+
+
 class FormSchema(BaseModel):
+    ai_model_type: AiModelEnum
     voice_type: VoiceEnum
+    format_type: FormatEnum
     prompt: str = Field(min_length=1)
 
 
+@TracingHandler.traced_class
 class OnSubmitHandler:
     @staticmethod
     def lock_submit_button():
@@ -23,6 +46,15 @@ class OnSubmitHandler:
     def unlock_submit_button():
         SubmitSState.reset()
 
+    @staticmethod
+    def get_form_dict() -> Dict[str, Any]:
+        return {
+            "ai_model_type": st.session_state.get("SpeechGeneration_ModelSelectBox"),
+            "voice_type": st.session_state.get("SpeechGeneration_VoiceSelectBox"),
+            "format_type": st.session_state.get("SpeechGeneration_FormatSelectBox"),
+            "prompt": st.session_state.get("SpeechGeneration_PromptTextArea"),
+        }
+
     @staticmethod
     def set_error_message(error_message: str) -> None:
         ErrorMessageSState.set(value=error_message)
@@ -36,16 +68,37 @@ class OnSubmitHandler:
         speech_bytes = SpeechGenerationHandler.generate_speech(
             client=client,
             prompt=form_schema.prompt,
+            model_type=form_schema.ai_model_type,
             voice_type=form_schema.voice_type,
+            format_type=form_schema.format_type,
         )
         return speech_bytes
 
+    @staticmethod
+    def submit_job(client: OpenAI, form_schema: FormSchema) -> None:
+        load_level = AdmissionHandler.admit(client=client, lane=SchedulerLaneEnum.BATCH)
+        model_type = AdmissionHandler.degrade_speech_model(model_type=form_schema.ai_model_type, load_level=load_level)
+        notice = AdmissionHandler.make_notice(changes=(("model", form_schema.ai_model_type.name, model_type.name),))
+        if notice:
+            st.toast(notice)
+
+        job_id = JobHandler.submit(
+            func=OnSubmitHandler.generate_speech,
+            payload=form_schema,
+            cost=SCHEDULER_COST,
+            client=client,
+            form_schema=form_schema.model_copy(update={"ai_model_type": model_type}),
+        )
+        JobIdSState.set(value=job_id)
+
     @staticmethod
     def update_s_states(
         form_schema: FormSchema,
         speech_bytes: bytes,
     ) -> None:
+        AiModelTypeSState.set(value=form_schema.ai_model_type)
         VoiceTypeSState.set(value=form_schema.voice_type)
+        FormatTypeSState.set(value=form_schema.format_type)
         StoredPromptSState.set(value=form_schema.prompt)
         StoredSpeechSState.set(value=speech_bytes)
 
@@ -57,14 +110,41 @@ class SpeechGenerationComponent:
         if res.call_return:
             st.rerun()
 
+    @classmethod
+    def __sub_component(cls, client: OpenAI) -> SubComponentResult:
+        form_area = st.empty()
+        if SubmitSState.get():
+            OnSubmitHandler.unlock_submit_button()
+            cls.__on_submit(client=client)
+        is_job_pending = cls.__poll_job()
+
+        with form_area.container():
+            cls.__display_form(is_job_pending=is_job_pending)
+
+        speech_bytes = StoredSpeechSState.get()
+        if speech_bytes and not is_job_pending:
+            st.markdown("#### Result")
+            st.audio(data=speech_bytes, format=SpeechGenerationHandler.get_mime_type(format_type=FormatTypeSState.get()))
+            st.write(StoredPromptSState.get())
+        return SubComponentResult(call_rerun=is_job_pending)
+
     @staticmethod
-    def __sub_component(client: OpenAI) -> SubComponentResult:
-        form_dict = {}
+    def __display_form(is_job_pending: bool) -> None:
         form = st.form(key="SpeechGeneration_Form", clear_on_submit=True)
         with form:
             st.markdown("#### Form")
+            left_col, center_col, right_col = st.columns(3)
+
+            left_col.selectbox(
+                label="Model",
+                options=EnumHandler.get_enum_members(enum=AiModelEnum),
+                format_func=lambda x: x.name,
+                index=EnumHandler.enum_member_to_index(member=AiModelTypeSState.get()),
+                placeholder="Select model...",
+                key="SpeechGeneration_ModelSelectBox",
+            )
 
-            form_dict["voice_type"] = st.selectbox(
+            center_col.selectbox(
                 label="Voice",
                 options=EnumHandler.get_enum_members(enum=VoiceEnum),
                 format_func=lambda x: x.name,
@@ -73,16 +153,25 @@ class SpeechGenerationComponent:
                 key="SpeechGeneration_VoiceSelectBox",
             )
 
-            form_dict["prompt"] = st.text_area(
+            right_col.selectbox(
+                label="Format",
+                options=EnumHandler.get_enum_members(enum=FormatEnum),
+                format_func=lambda x: x.name,
+                index=EnumHandler.enum_member_to_index(member=FormatTypeSState.get()),
+                placeholder="Select format...",
+                key="SpeechGeneration_FormatSelectBox",
+            )
+
+            st.text_area(
                 label="Prompt",
                 disabled=SubmitSState.get(),
                 placeholder="Please input prompt...",
                 key="SpeechGeneration_PromptTextArea",
             )
 
-            is_submited = st.form_submit_button(
+            st.form_submit_button(
                 label="Submit",
-                disabled=SubmitSState.get(),
+                disabled=SubmitSState.get() or is_job_pending,
                 on_click=OnSubmitHandler.lock_submit_button,
                 type="primary",
             )
@@ -91,35 +180,52 @@ class SpeechGenerationComponent:
             if error_message:
                 st.warning(error_message)
 
-        if is_submited:
-            try:
-                form_schema = FormSchema(**form_dict)
-            except ValidationError:
-                OnSubmitHandler.set_error_message(error_message="Please fill out the form completely.")
-                OnSubmitHandler.unlock_submit_button()
-                return SubComponentResult(call_rerun=True)
-
-            with form:
-                with st.spinner("Generating..."):
-                    try:
-                        generated_speech_bytes = OnSubmitHandler.generate_speech(client=client, form_schema=form_schema)
-                    except AuthenticationError:
-                        OnSubmitHandler.set_error_message(error_message="Specified OpenAI APIKey isn't valid.")
-                        OnSubmitHandler.unlock_submit_button()
-                        return SubComponentResult(call_rerun=True)
-
-            OnSubmitHandler.update_s_states(
-                form_schema=form_schema,
-                speech_bytes=generated_speech_bytes,
-            )
+    @staticmethod
+    @TracingHandler.traced_root
+    def __on_submit(client: OpenAI) -> None:
+        try:
+            with TracingHandler.span(name="validate_form"):
+                form_schema = FormSchema(**OnSubmitHandler.get_form_dict())
+        except ValidationError:
+            OnSubmitHandler.set_error_message(error_message="Please fill out the form completely.")
+            return
+
+        try:
+            OnSubmitHandler.submit_job(client=client, form_schema=form_schema)
+        except OverloadedException:
+            OnSubmitHandler.set_error_message(error_message="The server is busy. Please try again in a minute.")
 
-            OnSubmitHandler.reset_error_message()
-            OnSubmitHandler.unlock_submit_button()
-            return SubComponentResult(call_rerun=True)
+    @staticmethod
+    def __poll_job() -> bool:
+        job_id = JobIdSState.get()
+        if not job_id:
+            return False
+
+        job_status = JobHandler.wait(job_id=job_id, timeout_seconds=POLL_INTERVAL_SECONDS)
+        if job_status == JobStatusEnum.PENDING:
+            st.info("Waiting in queue...")
+            queue_position = JobHandler.get_queue_position(job_id=job_id)
+            if queue_position:
+                st.caption(f"Position in queue: {queue_position}")
+            return True
+        if job_status == JobStatusEnum.RUNNING:
+            st.info("Generating...")
+            return True
+
+        JobIdSState.reset()
+        if job_status == JobStatusEnum.NOT_FOUND:
+            OnSubmitHandler.set_error_message(error_message="The generation job was lost. Please submit again.")
+            return False
+        try:
+            form_schema, generated_speech_bytes = JobHandler.pop_result(job_id=job_id)
+        except AuthenticationError:
+            OnSubmitHandler.set_error_message(error_message="Specified OpenAI APIKey isn't valid.")
+            return False
+
+        OnSubmitHandler.update_s_states(
+            form_schema=form_schema,
+            speech_bytes=generated_speech_bytes,
+        )
 
-        speech_bytes = StoredSpeechSState.get()
-        if speech_bytes:
-            st.markdown("#### Result")
-            st.audio(data=speech_bytes, format="audio/mp3")
-            st.write(StoredPromptSState.get())
-        return SubComponentResult()
+        OnSubmitHandler.reset_error_message()
+        return False
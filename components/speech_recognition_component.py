@@ -1,30 +1,57 @@
-from typing import Optional, Any
+from typing import Any, Callable, Dict, Optional
 
 from openai import OpenAI, AuthenticationError
 from pydantic import BaseModel, ValidationError
 import streamlit as st
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 
+from enums.job_enum import JobStatusEnum
+from enums.scheduler_enum import SchedulerLaneEnum
 from enums.speech_recognition_enum import ExtensionEnum, LanguageEnum
+from exceptions.exceptions import OverloadedException
+from handlers.admission_handler import AdmissionHandler
 from handlers.enum_handler import EnumHandler
-from handlers.speech_recognition_handler import SpeechRecognitionHandler
-from s_states.speech_recognition_s_states import SubmitSState, ErrorMessageSState, LanguageTypeSState, StoredSpeechSState, StoredTranscriptSState
+from handlers.audio_handler import AudioHandler
+from handlers.job_handler import JobHandler, POLL_INTERVAL_SECONDS
+from handlers.scheduler_handler import SchedulerHandler
+from handlers.speech_recognition_handler import SpeechRecognitionHandler, MAX_WORKERS, WHISPER_MODEL
+from handlers.transcript_cache_handler import TranscriptCacheHandler
+from handlers.tracing_handler import TracingHandler
+from s_states.speech_recognition_s_states import (
+    SubmitSState,
+    ErrorMessageSState,
+    JobIdSState,
+    LanguageTypeSState,
+    LongAudioModeSState,
+    PreprocessModeSState,
+    StoredSpeechSState,
+    StoredTranscriptSState,
+)
 from components.sub_compornent_result import SubComponentResult
 
 
+SCHEDULER_COST = 2.0
+LONG_AUDIO_SCHEDULER_COST = 4.0
+
+
 class FormSchema(BaseModel):
     language_type: LanguageEnum
+    is_long_audio: bool
+    is_preprocess: bool
     speech_file: Any
 
     @classmethod
-    def construct_using_form_dict(cls, language_type: LanguageEnum, uploaded_speech: UploadedFile):
-        return cls(language_type=language_type, speech_file=uploaded_speech)
+    def construct_using_form_dict(cls, language_type: LanguageEnum, is_long_audio: bool, is_preprocess: bool, uploaded_speech: UploadedFile):
+        if uploaded_speech is None:
+            raise ValueError("No speech file uploaded")
+        return cls(language_type=language_type, is_long_audio=is_long_audio, is_preprocess=is_preprocess, speech_file=uploaded_speech)
 
     @property
     def speech_bytes(self) -> bytes:
         return self.speech_file.getvalue()
 
 
+@TracingHandler.traced_class
 class OnSubmitHandler:
     @staticmethod
     def lock_submit_button():
@@ -34,6 +61,15 @@ class OnSubmitHandler:
     def unlock_submit_button():
         SubmitSState.reset()
 
+    @staticmethod
+    def get_form_dict() -> Dict[str, Any]:
+        return {
+            "language_type": st.session_state.get("ChatGpt_LanguageSelectBox"),
+            "is_long_audio": st.session_state.get("SpeechRecognition_LongAudioCheckBox"),
+            "is_preprocess": st.session_state.get("SpeechRecognition_PreprocessCheckBox"),
+            "uploaded_speech": st.session_state.get("SpeechRecognition_UploadedSpeech"),
+        }
+
     @staticmethod
     def set_error_message(error_message: str) -> None:
         ErrorMessageSState.set(value=error_message)
@@ -47,17 +83,89 @@ class OnSubmitHandler:
         st.audio(data=form_schema.speech_file, format="audio/mp3")
 
     @staticmethod
-    def recognize_speech(client: OpenAI, form_schema: FormSchema) -> Optional[str]:
+    def make_cache_key(form_schema: FormSchema) -> str:
+        return TranscriptCacheHandler.make_key(
+            speech_bytes=form_schema.speech_bytes,
+            language_type=form_schema.language_type,
+            model=WHISPER_MODEL,
+            is_preprocessed=form_schema.is_preprocess,
+        )
+
+    @staticmethod
+    def recognize_speech(client: OpenAI, form_schema: FormSchema, cache_key: str, display_func: Callable[[str], None], max_workers: int = 1) -> Optional[str]:
+        speech_bytes = OnSubmitHandler.preprocess_speech(form_schema=form_schema, display_func=display_func)
+        transcript = OnSubmitHandler.query_transcript(
+            client=client,
+            form_schema=form_schema,
+            speech_bytes=speech_bytes,
+            display_func=display_func,
+            max_workers=max_workers,
+        )
+        if transcript:
+            TranscriptCacheHandler.set(key=cache_key, transcript=transcript)
+        return transcript
+
+    @staticmethod
+    def preprocess_speech(form_schema: FormSchema, display_func: Callable[[str], None]) -> bytes:
+        if not form_schema.is_preprocess:
+            return form_schema.speech_bytes
+
+        original_bytes = form_schema.speech_bytes
+        preprocessed_bytes = AudioHandler.preprocess_wav_bytes(wav_bytes=original_bytes)
+        reduction_ratio = len(original_bytes) / max(len(preprocessed_bytes), 1)
+        display_func(f"Preprocessed: {len(original_bytes) / 1024:,.0f} KB → {len(preprocessed_bytes) / 1024:,.0f} KB ({reduction_ratio:.1f}x smaller)")
+        return preprocessed_bytes
+
+    @staticmethod
+    def query_transcript(
+        client: OpenAI,
+        form_schema: FormSchema,
+        speech_bytes: bytes,
+        display_func: Callable[[str], None],
+        max_workers: int = 1,
+    ) -> Optional[str]:
+        if form_schema.is_long_audio:
+            transcript = SpeechRecognitionHandler.recognize_long_speech(
+                client=client,
+                speech_bytes=speech_bytes,
+                language_type=form_schema.language_type,
+                display_func=display_func,
+                max_workers=max_workers,
+            )
+            return transcript
+
         transcript = SpeechRecognitionHandler.recognize_speech(
             client=client,
-            speech_file=form_schema.speech_file,
+            speech_file=(form_schema.speech_file.name, speech_bytes),
             language_type=form_schema.language_type,
         )
+        display_func(transcript)
         return transcript
 
+    @staticmethod
+    def submit_job(client: OpenAI, form_schema: FormSchema, cache_key: str) -> None:
+        # Whisper has no cheaper variant, so transcription jobs can only be admitted or shed.
+        AdmissionHandler.admit(client=client, lane=SchedulerLaneEnum.BATCH)
+        # Long audio is transcribed segment by segment in parallel, and every Whisper request in flight counts against the scheduler's caps.
+        max_workers = SchedulerHandler.get_parallelism(client=client, lane=SchedulerLaneEnum.BATCH, parallelism=MAX_WORKERS) if form_schema.is_long_audio else 1
+        job_id = JobHandler.submit(
+            func=OnSubmitHandler.recognize_speech,
+            payload=form_schema,
+            is_progress_reported=True,
+            cost=LONG_AUDIO_SCHEDULER_COST if form_schema.is_long_audio else SCHEDULER_COST,
+            parallelism=max_workers,
+            client=client,
+            form_schema=form_schema,
+            cache_key=cache_key,
+            max_workers=max_workers,
+        )
+        JobIdSState.set(value=job_id)
+
     @staticmethod
     def update_s_states(form_schema: FormSchema, transcript: Optional[str]):
         LanguageTypeSState.set(value=form_schema.language_type)
+        LongAudioModeSState.set(value=form_schema.is_long_audio)
+        PreprocessModeSState.set(value=form_schema.is_preprocess)
         StoredSpeechSState.set(value=form_schema.speech_bytes)
         if transcript:
             StoredTranscriptSState.set(value=transcript)
@@ -70,14 +178,40 @@ class SpeechRecognitionComponent:
         if res.call_return:
             st.rerun()
 
+    @classmethod
+    def __sub_component(cls, client: OpenAI) -> SubComponentResult:
+        form_area = st.empty()
+        result_container = st.container()
+        is_transcribed = False
+        if SubmitSState.get():
+            OnSubmitHandler.unlock_submit_button()
+            with result_container:
+                is_transcribed = cls.__on_submit(client=client)
+        with result_container:
+            is_job_pending = cls.__poll_job()
+
+        with form_area.container():
+            cls.__display_form(is_job_pending=is_job_pending)
+
+        if is_transcribed or is_job_pending:
+            return SubComponentResult(call_rerun=is_job_pending)
+
+        transcript = StoredTranscriptSState.get()
+        if transcript:
+            with result_container:
+                st.markdown("#### Result")
+                st.audio(data=StoredSpeechSState.get(), format="audio/mp3")
+                st.write(transcript)
+
+        return SubComponentResult()
+
     @staticmethod
-    def __sub_component(client: OpenAI) -> SubComponentResult:
-        form_dict = {}
+    def __display_form(is_job_pending: bool) -> None:
         form = st.form(key="SpeechRecognition_Form", clear_on_submit=True)
         with form:
             st.markdown("#### Form")
 
-            form_dict["language_type"] = st.selectbox(
+            st.selectbox(
                 label="Language",
                 options=EnumHandler.get_enum_members(enum=LanguageEnum),
                 format_func=lambda x: x.name,
@@ -86,15 +220,27 @@ class SpeechRecognitionComponent:
                 key="ChatGpt_LanguageSelectBox",
             )
 
-            form_dict["uploaded_speech"] = st.file_uploader(
+            st.checkbox(
+                label="Long audio mode (WAV only)",
+                value=LongAudioModeSState.get(),
+                key="SpeechRecognition_LongAudioCheckBox",
+            )
+
+            st.checkbox(
+                label="Downmix, resample and trim silence before upload (WAV only)",
+                value=PreprocessModeSState.get(),
+                key="SpeechRecognition_PreprocessCheckBox",
+            )
+
+            st.file_uploader(
                 label="Uploader",
                 type=EnumHandler.get_enum_member_values(enum=ExtensionEnum),
                 key="SpeechRecognition_UploadedSpeech",
             )
 
-            is_submited = st.form_submit_button(
+            st.form_submit_button(
                 label="Submit",
-                disabled=SubmitSState.get(),
+                disabled=SubmitSState.get() or is_job_pending,
                 on_click=OnSubmitHandler.lock_submit_button,
                 type="primary",
             )
@@ -103,31 +249,65 @@ class SpeechRecognitionComponent:
             if error_message:
                 st.warning(error_message)
 
-        if is_submited:
-            try:
-                form_schema = FormSchema.construct_using_form_dict(**form_dict)
-            except:
-                OnSubmitHandler.set_error_message(error_message="Please fill out the form completely.")
-                OnSubmitHandler.unlock_submit_button()
-                return SubComponentResult(call_rerun=True)
-
-            st.markdown("#### Result")
-            OnSubmitHandler.display_audio(form_schema=form_schema)
+    @staticmethod
+    @TracingHandler.traced_root
+    def __on_submit(client: OpenAI) -> bool:
+        try:
+            with TracingHandler.span(name="validate_form"):
+                form_schema = FormSchema.construct_using_form_dict(**OnSubmitHandler.get_form_dict())
+        except:
+            OnSubmitHandler.set_error_message(error_message="Please fill out the form completely.")
+            return False
+
+        if (form_schema.is_long_audio or form_schema.is_preprocess) and not AudioHandler.is_wav(audio_bytes=form_schema.speech_bytes):
+            OnSubmitHandler.set_error_message(error_message="Long audio mode and preprocessing support only WAV files.")
+            return False
+
+        cache_key = OnSubmitHandler.make_cache_key(form_schema=form_schema)
+        cached_transcript = TranscriptCacheHandler.get(key=cache_key)
+        if cached_transcript is None:
             try:
-                generated_transcript = OnSubmitHandler.recognize_speech(client=client, form_schema=form_schema)
-            except AuthenticationError:
-                OnSubmitHandler.set_error_message(error_message="Specified OpenAI APIKey isn't valid.")
-                OnSubmitHandler.unlock_submit_button()
-                return SubComponentResult(call_rerun=True)
-            OnSubmitHandler.update_s_states(form_schema=form_schema, transcript=generated_transcript)
-            OnSubmitHandler.reset_error_message()
-            OnSubmitHandler.unlock_submit_button()
-            return SubComponentResult(call_rerun=True)
+                OnSubmitHandler.submit_job(client=client, form_schema=form_schema, cache_key=cache_key)
+            except OverloadedException:
+                OnSubmitHandler.set_error_message(error_message="The server is busy. Please try again in a minute.")
+            return False
 
-        transcript = StoredTranscriptSState.get()
-        if transcript:
-            st.markdown("#### Result")
-            st.audio(data=StoredSpeechSState.get(), format="audio/mp3")
-            st.write(transcript)
+        st.markdown("#### Result")
+        OnSubmitHandler.display_audio(form_schema=form_schema)
+        st.write(cached_transcript)
+        OnSubmitHandler.update_s_states(form_schema=form_schema, transcript=cached_transcript)
+        OnSubmitHandler.reset_error_message()
+        return True
 
-        return SubComponentResult()
+    @staticmethod
+    def __poll_job() -> bool:
+        job_id = JobIdSState.get()
+        if not job_id:
+            return False
+
+        job_status = JobHandler.wait(job_id=job_id, timeout_seconds=POLL_INTERVAL_SECONDS)
+        if job_status == JobStatusEnum.PENDING:
+            st.info("Waiting in queue...")
+            queue_position = JobHandler.get_queue_position(job_id=job_id)
+            if queue_position:
+                st.caption(f"Position in queue: {queue_position}")
+            return True
+        if job_status == JobStatusEnum.RUNNING:
+            st.info("Transcribing...")
+            progress = JobHandler.get_progress(job_id=job_id)
+            if progress:
+                st.write(progress)
+            return True
+
+        JobIdSState.reset()
+        if job_status == JobStatusEnum.NOT_FOUND:
+            OnSubmitHandler.set_error_message(error_message="The transcription job was lost. Please submit again.")
+            return False
+        try:
+            form_schema, generated_transcript = JobHandler.pop_result(job_id=job_id)
+        except AuthenticationError:
+            OnSubmitHandler.set_error_message(error_message="Specified OpenAI APIKey isn't valid.")
+            return False
+        OnSubmitHandler.update_s_states(form_schema=form_schema, transcript=generated_transcript)
+        OnSubmitHandler.reset_error_message()
+        return False
@@ -0,0 +1,84 @@
+import time
+
+import streamlit as st
+
+from handlers.metrics_handler import MetricsHandler
+
+
+MIN_UPDATE_INTERVAL_SECONDS = 0.05
+UPDATE_INTERVAL_SECONDS_PER_CHAR = 0.0002
+MAX_UPDATE_INTERVAL_SECONDS = 0.5
+FENCES = ("```", "~~~")
+
+
+class StreamingMarkdownComponent:
+    """
+    Renders a streamed markdown answer. Completed paragraphs and code blocks are frozen into their own elements, so each update only resends the open tail.
+    Tail updates are coalesced, and the wait grows with the tail's size so long open blocks are re-parsed less often.
+    """
+
+    def __init__(self) -> None:
+        self.__container = st.container()
+        self.__tail_area = self.__container.empty()
+        self.__frozen_length = 0
+        self.__scan_offset = 0
+        self.__is_in_code_block = False
+        self.__displayed_tail = ""
+        self.__last_update_time = 0.0
+
+    def write(self, answer: str) -> None:
+        boundary = self.__find_block_boundary(answer=answer)
+        if boundary:
+            self.__freeze(block=answer[self.__frozen_length : boundary])
+
+        tail_length = len(answer) - self.__frozen_length
+        update_interval = min(MIN_UPDATE_INTERVAL_SECONDS + tail_length * UPDATE_INTERVAL_SECONDS_PER_CHAR, MAX_UPDATE_INTERVAL_SECONDS)
+        if time.perf_counter() - self.__last_update_time < update_interval:
+            return
+        self.__update_tail(tail=answer[self.__frozen_length :])
+
+    def flush(self, answer: str) -> None:
+        self.__update_tail(tail=answer[self.__frozen_length :])
+
+    def __freeze(self, block: str) -> None:
+        self.__tail_area.markdown(block)
+        self.__record_update(sent_chars=len(block))
+        self.__frozen_length += len(block)
+        self.__tail_area = self.__container.empty()
+        self.__displayed_tail = ""
+
+    def __update_tail(self, tail: str) -> None:
+        if tail == self.__displayed_tail:
+            return
+        self.__tail_area.markdown(tail)
+        self.__record_update(sent_chars=len(tail))
+        self.__displayed_tail = tail
+        self.__last_update_time = time.perf_counter()
+
+    @staticmethod
+    def __record_update(sent_chars: int) -> None:
+        MetricsHandler.increment(name="stream_render_updates_total")
+        MetricsHandler.increment(name="stream_render_chars_total", value=sent_chars)
+
+    def __find_block_boundary(self, answer: str) -> int:
+        """
+        Returns the end of the longest prefix of the answer made of complete blocks, or 0 if no new block was completed.
+        A blank line outside a code fence ends a block when the next line starts a new, unindented block.
+        Each line is inspected once, keeping the scan offset and fence state between calls, so a long open code block does not slow every update down.
+        """
+        boundary = 0
+        while True:
+            # The last line may still be growing, so only lines followed by a newline are inspected.
+            line_end = answer.find("\n", self.__scan_offset)
+            if line_end < 0:
+                return boundary
+            line = answer[self.__scan_offset : line_end]
+            if line.lstrip().startswith(FENCES):
+                self.__is_in_code_block = not self.__is_in_code_block
+            elif not self.__is_in_code_block and not line.strip():
+                if line_end + 1 == len(answer):
+                    # The first character of the next line decides, so this line is inspected again on the next update.
+                    return boundary
+                if not answer[line_end + 1].isspace():
+                    boundary = line_end + 1
+            self.__scan_offset = line_end + 1
@@ -0,0 +1,274 @@
+from typing import Any, Dict, Optional
+
+from openai import OpenAI, AuthenticationError
+from pydantic import BaseModel
+import streamlit as st
+from streamlit.runtime.uploaded_file_manager import UploadedFile
+
+from enums.chatgpt_enum import AiModelEnum, SenderEnum
+from enums.scheduler_enum import LoadLevelEnum, SchedulerLaneEnum
+from enums.speech_generation_enum import VoiceEnum
+from enums.speech_recognition_enum import ExtensionEnum, LanguageEnum
+from exceptions.exceptions import InvalidModelTypeException, OverloadedException
+from handlers.admission_handler import AdmissionHandler
+from handlers.enum_handler import EnumHandler
+from handlers.scheduler_handler import SchedulerHandler
+from handlers.speech_generation_handler import SpeechGenerationHandler
+from handlers.voice_chat_handler import VoiceChatHandler, MAX_SPEECH_WORKERS, SPEECH_FORMAT
+from handlers.tracing_handler import TracingHandler
+from s_states.voice_chat_s_states import (
+    SubmitSState,
+    ErrorMessageSState,
+    LanguageTypeSState,
+    AiModelTypeSState,
+    VoiceTypeSState,
+    StoredHistorySState,
+    StoredTurnSState,
+)
+from components.streaming_markdown_component import StreamingMarkdownComponent
+from components.sub_compornent_result import SubComponentResult
+
+
+SCHEDULER_COST = 3.0
+
+
+class FormSchema(BaseModel):
+    language_type: LanguageEnum
+    ai_model_type: AiModelEnum
+    voice_type: VoiceEnum
+    speech_name: str
+    speech_bytes: bytes
+
+    @classmethod
+    def construct_using_form_dict(
+        cls,
+        language_type: LanguageEnum,
+        ai_model_type: AiModelEnum,
+        voice_type: VoiceEnum,
+        uploaded_speech: UploadedFile,
+    ):
+        return cls(
+            language_type=language_type,
+            ai_model_type=ai_model_type,
+            voice_type=voice_type,
+            speech_name=uploaded_speech.name,
+            speech_bytes=uploaded_speech.getvalue(),
+        )
+
+
+@TracingHandler.traced_class
+class OnSubmitHandler:
+    @staticmethod
+    def lock_submit_button():
+        SubmitSState.set(value=True)
+
+    @staticmethod
+    def unlock_submit_button():
+        SubmitSState.reset()
+
+    @staticmethod
+    def get_form_dict() -> Dict[str, Any]:
+        return {
+            "language_type": st.session_state.get("VoiceChat_LanguageSelectBox"),
+            "ai_model_type": st.session_state.get("VoiceChat_ModelSelectBox"),
+            "voice_type": st.session_state.get("VoiceChat_VoiceSelectBox"),
+            "uploaded_speech": st.session_state.get("VoiceChat_UploadedSpeech"),
+        }
+
+    @staticmethod
+    def set_error_message(error_message: str) -> None:
+        ErrorMessageSState.set(value=error_message)
+
+    @staticmethod
+    def reset_error_message() -> None:
+        ErrorMessageSState.reset()
+
+    @staticmethod
+    def talk_and_play_streamly(client: OpenAI, form_schema: FormSchema) -> Dict[str, Any]:
+        load_level = AdmissionHandler.admit(client=client, lane=SchedulerLaneEnum.INTERACTIVE)
+        model_type = AdmissionHandler.degrade_chat_model(model_type=form_schema.ai_model_type, load_level=load_level)
+        notice = AdmissionHandler.make_notice(changes=(("model", form_schema.ai_model_type.name, model_type.name),))
+        if notice:
+            st.toast(notice)
+
+        # The answer stream and every TTS request in flight count against the scheduler's caps.
+        parallelism = SchedulerHandler.get_parallelism(client=client, lane=SchedulerLaneEnum.INTERACTIVE, parallelism=1 + MAX_SPEECH_WORKERS)
+        queue_area = st.empty()
+        with SchedulerHandler.slot(
+            client=client,
+            lane=SchedulerLaneEnum.INTERACTIVE,
+            cost=SCHEDULER_COST,
+            display_func=lambda queue_position: queue_area.info(f"Waiting in queue... (position {queue_position})"),
+            parallelism=parallelism,
+        ):
+            queue_area.empty()
+            return OnSubmitHandler.talk_and_play_pipelined(
+                client=client,
+                form_schema=form_schema,
+                model_type=model_type,
+                load_level=load_level,
+                max_speech_workers=max(parallelism - 1, 1),
+            )
+
+    @staticmethod
+    def talk_and_play_pipelined(
+        client: OpenAI,
+        form_schema: FormSchema,
+        model_type: AiModelEnum,
+        load_level: LoadLevelEnum,
+        max_speech_workers: int = MAX_SPEECH_WORKERS,
+    ) -> Dict[str, Any]:
+        with st.chat_message(name=SenderEnum.USER.value):
+            transcript_area = st.empty()
+            transcript_area.caption("Transcribing...")
+        with st.chat_message(name=SenderEnum.ASSISTANT.value):
+            answer_renderer = StreamingMarkdownComponent()
+            speech_container = st.container()
+
+        turn = VoiceChatHandler.talk(
+            client=client,
+            speech_file=(form_schema.speech_name, form_schema.speech_bytes),
+            chat_history=StoredHistorySState.get(),
+            language_type=form_schema.language_type,
+            chat_model_type=model_type,
+            voice_type=form_schema.voice_type,
+            display_transcript_func=transcript_area.write,
+            display_answer_func=answer_renderer.write,
+            play_speech_func=lambda speech_bytes: speech_container.audio(data=speech_bytes, format=SpeechGenerationHandler.get_mime_type(format_type=SPEECH_FORMAT)),
+            load_level=load_level,
+            max_speech_workers=max_speech_workers,
+        )
+        answer_renderer.flush(answer=turn["answer"])
+        speech_container.caption(OnSubmitHandler.format_timings(timings=turn["timings"]))
+        return turn
+
+    @staticmethod
+    def format_timings(timings: Dict[str, float]) -> str:
+        return (
+            f"End of speech → first audio: {timings['first_speech_seconds']:.1f} s "
+            f"(transcription {timings['transcription_seconds']:.1f} s, first token {timings['first_token_seconds']:.1f} s, "
+            f"whole turn {timings['total_seconds']:.1f} s)"
+        )
+
+    @staticmethod
+    def update_s_states(form_schema: FormSchema, turn: Dict[str, Any]) -> None:
+        LanguageTypeSState.set(value=form_schema.language_type)
+        AiModelTypeSState.set(value=form_schema.ai_model_type)
+        VoiceTypeSState.set(value=form_schema.voice_type)
+        StoredHistorySState.add(sender_type=SenderEnum.USER, content=turn["transcript"])
+        StoredHistorySState.add(sender_type=SenderEnum.ASSISTANT, content=turn["answer"])
+        # MP3 segments can be joined as they are, so the whole answer replays as one track.
+        StoredTurnSState.set(value={"speech": b"".join(turn["speech_segments"]), "timings": turn["timings"]})
+
+
+class VoiceChatComponent:
+    @classmethod
+    def display_component(cls, client: OpenAI) -> None:
+        res = cls.__sub_component(client=client)
+        if res.call_return:
+            st.rerun()
+
+    @classmethod
+    def __sub_component(cls, client: OpenAI) -> SubComponentResult:
+        history_container = st.container()
+        with history_container:
+            cls.__display_history()
+
+        form_area = st.empty()
+        if SubmitSState.get():
+            OnSubmitHandler.unlock_submit_button()
+            with form_area, st.spinner("Talking..."):
+                with history_container:
+                    cls.__on_submit(client=client)
+
+        with form_area.container():
+            cls.__display_form()
+        return SubComponentResult()
+
+    @staticmethod
+    def __display_history() -> None:
+        st.markdown("#### Conversation")
+        for chat in StoredHistorySState.get():
+            with st.chat_message(name=chat["role"]):
+                st.write(chat["content"])
+
+        stored_turn = StoredTurnSState.get()
+        if stored_turn:
+            st.audio(data=stored_turn["speech"], format=SpeechGenerationHandler.get_mime_type(format_type=SPEECH_FORMAT))
+            st.caption(OnSubmitHandler.format_timings(timings=stored_turn["timings"]))
+
+    @staticmethod
+    def __display_form() -> None:
+        form = st.form(key="VoiceChat_Form", clear_on_submit=True)
+        with form:
+            st.markdown("#### Form")
+            left_col, center_col, right_col = st.columns(3)
+
+            left_col.selectbox(
+                label="Language",
+                options=EnumHandler.get_enum_members(enum=LanguageEnum),
+                format_func=lambda x: x.name,
+                index=EnumHandler.enum_member_to_index(member=LanguageTypeSState.get()),
+                placeholder="Select language...",
+                key="VoiceChat_LanguageSelectBox",
+            )
+
+            center_col.selectbox(
+                label="Model",
+                options=EnumHandler.get_enum_members(enum=AiModelEnum),
+                format_func=lambda x: x.name,
+                index=EnumHandler.enum_member_to_index(member=AiModelTypeSState.get()),
+                placeholder="Select model...",
+                key="VoiceChat_ModelSelectBox",
+            )
+
+            right_col.selectbox(
+                label="Voice",
+                options=EnumHandler.get_enum_members(enum=VoiceEnum),
+                format_func=lambda x: x.name,
+                index=EnumHandler.enum_member_to_index(member=VoiceTypeSState.get()),
+                placeholder="Select voice...",
+                key="VoiceChat_VoiceSelectBox",
+            )
+
+            st.file_uploader(
+                label="Recorded speech",
+                type=EnumHandler.get_enum_member_values(enum=ExtensionEnum),
+                key="VoiceChat_UploadedSpeech",
+            )
+
+            st.form_submit_button(
+                label="Submit",
+                disabled=SubmitSState.get(),
+                on_click=OnSubmitHandler.lock_submit_button,
+                type="primary",
+            )
+
+            error_message = ErrorMessageSState.get()
+            if error_message:
+                st.warning(error_message)
+
+    @staticmethod
+    @TracingHandler.traced_root
+    def __on_submit(client: OpenAI) -> Optional[Dict[str, Any]]:
+        try:
+            with TracingHandler.span(name="validate_form"):
+                form_schema = FormSchema.construct_using_form_dict(**OnSubmitHandler.get_form_dict())
+        except:
+            OnSubmitHandler.set_error_message(error_message="Please fill out the form completely.")
+            return None
+
+        try:
+            turn = OnSubmitHandler.talk_and_play_streamly(client=client, form_schema=form_schema)
+        except AuthenticationError:
+            OnSubmitHandler.set_error_message(error_message="Specified OpenAI APIKey isn't valid.")
+            return None
+        except InvalidModelTypeException:
+            OnSubmitHandler.set_error_message(error_message="Please fill out the form completely.")
+            return None
+        except OverloadedException:
+            OnSubmitHandler.set_error_message(error_message="The server is busy. Please try again in a minute.")
+            return None
+        OnSubmitHandler.update_s_states(form_schema=form_schema, turn=turn)
+        OnSubmitHandler.reset_error_message()
+        return turn
@@ -0,0 +1,7 @@
+from enum import Enum, auto
+
+
+class ApiKeyStatusEnum(Enum):
+    VALID = auto()
+    INVALID = auto()
+    UNKNOWN = auto()
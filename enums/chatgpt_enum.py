@@ -4,10 +4,12 @@ from enum import Enum
 class SenderEnum(Enum):
     USER = "user"
     ASSISTANT = "assistant"
+    SYSTEM = "system"
 
     
 class AiModelEnum(Enum):
     NONE = None
+    AUTO = "auto"
     GPT4_1106_PREVIEW = "gpt-4-1106-preview"
     GPT4 = "gpt-4"
     GPT35_TURBO_1106 = "gpt-3.5-turbo-1106"
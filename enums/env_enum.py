@@ -7,3 +7,11 @@ load_dotenv()
 
 class EnvEnum(Enum):    
     DEFAULT_OPENAI_APIKEY = os.environ.get("DEFAULT_OPENAI_APIKEY", None)
+    METRICS_PORT = os.environ.get("METRICS_PORT", None)
+    OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", None)
+    PROFILING_MODE = os.environ.get("PROFILING_MODE", None)
+    ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", None)
+    MEMORY_PROFILING_MODE = os.environ.get("MEMORY_PROFILING_MODE", None)
+    S_STATE_BACKEND = os.environ.get("S_STATE_BACKEND", None)
+    TRACE_SAMPLE_RATE = os.environ.get("TRACE_SAMPLE_RATE", None)
+    TRACE_SLOW_SECONDS = os.environ.get("TRACE_SLOW_SECONDS", None)
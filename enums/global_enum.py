@@ -8,3 +8,5 @@ class PageEnum(Enum):
     IMAGE_GENERATION = "🌅 Image Generation"
     SPEECH_RECOGNITION = "👂 Speech Recognition"
     SPEECH_GENERATION = "📢 Speech Generation"
+    VOICE_CHAT = "🗣️ Voice Chat"
+    ADMIN = "📈 Admin"
@@ -15,3 +15,9 @@ class SizeEnum(Enum):
 class QualityEnum(Enum):
     STANDARD = "standard"
     HD = "hd"
+
+
+class DraftSizeEnum(Enum):
+    # Only DALL-E 2 supports these sizes.
+    W256xH256 = "256x256"
+    W512xH512 = "512x512"
@@ -0,0 +1,9 @@
+from enum import Enum, auto
+
+
+class JobStatusEnum(Enum):
+    PENDING = auto()
+    RUNNING = auto()
+    DONE = auto()
+    FAILED = auto()
+    NOT_FOUND = auto()
@@ -1,9 +1,16 @@
 from enum import Enum, auto
 
 
+class SStateBackendEnum(Enum):
+    MEMORY = "memory"
+    SQLITE = "sqlite"
+
+
 class GlobalSStateEnum(Enum):
     CURRENT_PAGE = auto()
     OPENAI_CLIENT = auto()
+    PROFILING_MODE = auto()
+    PROFILE_REPORT = auto()
 
 
 class ChatGptSStateEnum(Enum):
@@ -11,6 +18,12 @@ class ChatGptSStateEnum(Enum):
     ERROR_MESSAGE = auto()
     AI_MODEL_TYPE = auto()
     STORED_HISTORY = auto()
+    CONVERSATION_ID = auto()
+    HISTORY_LIMIT = auto()
+    SEARCH_RESULT = auto()
+    DOCUMENT_MODE = auto()
+    DOCUMENT_JOB_ID = auto()
+    DOCUMENT_STATUS = auto()
 
 
 class ImageRecognitionSStateEnum(Enum):
@@ -19,22 +32,31 @@ class ImageRecognitionSStateEnum(Enum):
     STORED_PROMPT = auto()
     STORED_IMAGE = auto()
     STORED_ANSWER = auto()
+    HANDED_OFF_IMAGE = auto()
 
 
 class ImageGenerationSStateEnum(Enum):
     SUBMIT = auto()
     ERROR_MESSAGE = auto()
+    JOB_ID = auto()
     AI_MODEL_TYPE = auto()
     SIZE_TYPE = auto()
     QUALITY_TYPE = auto()
     STORED_PROMPT = auto()
     STORED_IMAGE = auto()
+    STORED_IMAGE_URL = auto()
+    DRAFT_MODE = auto()
+    DRAFT_SIZE_TYPE = auto()
+    STORED_DRAFTS = auto()
 
 
 class SpeechGenerationSStateEnum(Enum):
     SUBMIT = auto()
     ERROR_MESSAGE = auto()
+    JOB_ID = auto()
+    AI_MODEL_TYPE = auto()
     VOICE_TYPE = auto()
+    FORMAT_TYPE = auto()
     STORED_PROMPT = auto()
     STORED_SPEECH = auto()
 
@@ -42,6 +64,19 @@ class SpeechGenerationSStateEnum(Enum):
 class SpeechRecognitionSStateEnum(Enum):
     SUBMIT = auto()
     ERROR_MESSAGE = auto()
+    JOB_ID = auto()
     LANGUAGE_TYPE = auto()
+    LONG_AUDIO_MODE = auto()
+    PREPROCESS_MODE = auto()
     STORED_SPEECH = auto()
-    STORED_TRANSCRIPT = auto()
\ No newline at end of file
+    STORED_TRANSCRIPT = auto()
+
+
+class VoiceChatSStateEnum(Enum):
+    SUBMIT = auto()
+    ERROR_MESSAGE = auto()
+    LANGUAGE_TYPE = auto()
+    AI_MODEL_TYPE = auto()
+    VOICE_TYPE = auto()
+    STORED_HISTORY = auto()
+    STORED_TURN = auto()
\ No newline at end of file
@@ -0,0 +1,13 @@
+from enum import Enum
+
+
+class SchedulerLaneEnum(Enum):
+    # Lower values are scheduled first.
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+class LoadLevelEnum(Enum):
+    NORMAL = 0
+    DEGRADED = 1
+    OVERLOADED = 2
@@ -1,6 +1,11 @@
 from enum import Enum
 
 
+class AiModelEnum(Enum):
+    TTS_1 = "tts-1"
+    TTS_1_HD = "tts-1-hd"
+
+
 class VoiceEnum(Enum):
     ALLOY = "alloy"
     ECHO = "echo"
@@ -8,3 +13,10 @@ class VoiceEnum(Enum):
     ONYX = "onyx"
     NOVA = "nova"
     SHIMMER = "shimmer"
+
+
+class FormatEnum(Enum):
+    MP3 = "mp3"
+    OPUS = "opus"
+    AAC = "aac"
+    FLAC = "flac"
@@ -7,4 +7,9 @@ class InvalidModelTypeException(Exception):
 
 class EmptyResponseException(Exception):
     def __init__(self, message="Received an empty response"):
+        super().__init__(message)
+
+
+class OverloadedException(Exception):
+    def __init__(self, message="The server is too busy to accept the request"):
         super().__init__(message)
\ No newline at end of file
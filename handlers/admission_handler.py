@@ -0,0 +1,108 @@
+from typing import Optional, Tuple
+
+from openai import OpenAI
+
+from enums.chatgpt_enum import AiModelEnum as ChatModelEnum
+from enums.image_generation_enum import SizeEnum, QualityEnum
+from enums.scheduler_enum import LoadLevelEnum, SchedulerLaneEnum
+from enums.speech_generation_enum import AiModelEnum as SpeechModelEnum
+from exceptions.exceptions import OverloadedException
+from handlers.metrics_handler import MetricsHandler
+from handlers.scheduler_handler import SchedulerHandler
+
+
+LATENCY_WINDOW_SECONDS = 60.0
+LATENCY_QUANTILE = 0.9
+DEGRADED_QUEUE_DEPTH = 8
+OVERLOADED_QUEUE_DEPTH = 32
+DEGRADED_WAIT_SECONDS = 5.0
+OVERLOADED_WAIT_SECONDS = 30.0
+DEGRADED_FIRST_TOKEN_SECONDS = 5.0
+# Interactive requests are only shed when even the interactive lane is this far behind.
+MAX_INTERACTIVE_QUEUE_DEPTH = 16
+DEGRADED_CHAT_MODELS = (ChatModelEnum.GPT4_1106_PREVIEW, ChatModelEnum.GPT4)
+DEGRADED_CHAT_MODEL = ChatModelEnum.GPT35_TURBO
+DEGRADED_IMAGE_SIZE = SizeEnum.W1024xH1024
+DEGRADED_IMAGE_QUALITY = QualityEnum.STANDARD
+DEGRADED_SPEECH_MODEL = SpeechModelEnum.TTS_1
+DEGRADED_VISION_DETAIL = "low"
+DEFAULT_VISION_DETAIL = "auto"
+
+
+class AdmissionHandler:
+    """
+    Decides from live scheduler and latency metrics whether a request on the server default API key is served as asked, served cheaper or refused.
+    Under DEGRADED load, requests switch to cheaper models and options, which are also faster, so the queue drains instead of growing.
+    Under OVERLOADED load, new batch jobs are refused as well, and interactive requests only when their own lane is far behind.
+    """
+
+    @staticmethod
+    def get_load_level() -> LoadLevelEnum:
+        queue_depth = SchedulerHandler.get_queue_depth()
+        wait_seconds = MetricsHandler.get_recent_quantile(name="scheduler_wait_seconds", q=LATENCY_QUANTILE, window_seconds=LATENCY_WINDOW_SECONDS) or 0.0
+        first_token_seconds = (
+            MetricsHandler.get_recent_quantile(name="handler_time_to_first_token_seconds", q=LATENCY_QUANTILE, window_seconds=LATENCY_WINDOW_SECONDS) or 0.0
+        )
+
+        if queue_depth >= OVERLOADED_QUEUE_DEPTH or wait_seconds >= OVERLOADED_WAIT_SECONDS:
+            load_level = LoadLevelEnum.OVERLOADED
+        elif queue_depth >= DEGRADED_QUEUE_DEPTH or wait_seconds >= DEGRADED_WAIT_SECONDS or first_token_seconds >= DEGRADED_FIRST_TOKEN_SECONDS:
+            load_level = LoadLevelEnum.DEGRADED
+        else:
+            load_level = LoadLevelEnum.NORMAL
+        MetricsHandler.set_gauge(name="admission_load_level", value=load_level.value)
+        return load_level
+
+    @classmethod
+    def admit(cls, client: OpenAI, lane: SchedulerLaneEnum) -> LoadLevelEnum:
+        """
+        Returns the load level the request should be served at, or raises OverloadedException if it is shed.
+        Requests with the user's own API key do not use the shared capacity and are always served as asked.
+        """
+        if not SchedulerHandler.is_scheduled(client=client):
+            return LoadLevelEnum.NORMAL
+
+        load_level = cls.get_load_level()
+        is_shed = load_level == LoadLevelEnum.OVERLOADED and (
+            lane == SchedulerLaneEnum.BATCH or SchedulerHandler.get_queue_depth(lane=lane) >= MAX_INTERACTIVE_QUEUE_DEPTH
+        )
+        MetricsHandler.increment(
+            name="admission_decisions_total",
+            labels={"lane": lane.name, "load_level": load_level.name, "decision": "shed" if is_shed else "admit"},
+        )
+        if is_shed:
+            raise OverloadedException()
+        return load_level
+
+    @staticmethod
+    def degrade_chat_model(model_type: ChatModelEnum, load_level: LoadLevelEnum) -> ChatModelEnum:
+        if load_level == LoadLevelEnum.NORMAL or model_type not in DEGRADED_CHAT_MODELS:
+            return model_type
+        return DEGRADED_CHAT_MODEL
+
+    @staticmethod
+    def degrade_image_options(size_type: SizeEnum, quality_type: QualityEnum, load_level: LoadLevelEnum) -> Tuple[SizeEnum, QualityEnum]:
+        if load_level == LoadLevelEnum.NORMAL:
+            return size_type, quality_type
+        return DEGRADED_IMAGE_SIZE, DEGRADED_IMAGE_QUALITY
+
+    @staticmethod
+    def degrade_speech_model(model_type: SpeechModelEnum, load_level: LoadLevelEnum) -> SpeechModelEnum:
+        if load_level == LoadLevelEnum.NORMAL:
+            return model_type
+        return DEGRADED_SPEECH_MODEL
+
+    @staticmethod
+    def get_vision_detail(load_level: LoadLevelEnum) -> str:
+        # Low detail sends the image as a single 512px tile, which is much cheaper and faster than the tiled high detail.
+        return DEFAULT_VISION_DETAIL if load_level == LoadLevelEnum.NORMAL else DEGRADED_VISION_DETAIL
+
+    @staticmethod
+    def make_notice(changes: Tuple[Tuple[str, str, str], ...]) -> Optional[str]:
+        """
+        Returns a message telling the user which (option, requested, used) changes were made, or None if nothing changed.
+        """
+        changed = [f"{option} {used} instead of {requested}" for option, requested, used in changes if requested != used]
+        if not changed:
+            return None
+        return "The server is busy, so this request uses " + ", ".join(changed) + "."
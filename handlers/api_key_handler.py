@@ -0,0 +1,65 @@
+import hashlib
+import threading
+import time
+from typing import Dict, Tuple
+
+from openai import OpenAI, AuthenticationError
+
+from enums.api_key_enum import ApiKeyStatusEnum
+from handlers.metrics_handler import MetricsHandler
+from handlers.single_flight_handler import SingleFlightHandler
+
+
+VALID_TTL_SECONDS = 15 * 60
+INVALID_TTL_SECONDS = 5 * 60
+# Kept short so the key is checked again soon, but long enough that reruns do not each wait for the timeout while the API is unreachable.
+UNKNOWN_TTL_SECONDS = 30
+VALIDATION_TIMEOUT_SECONDS = 10.0
+
+
+class ApiKeyHandler:
+    """
+    Validates API keys with the cheap model list endpoint. Results are shared by all sessions until their TTL expires.
+    """
+
+    __lock = threading.Lock()
+    __statuses: Dict[str, Tuple[ApiKeyStatusEnum, float]] = {}
+
+    @classmethod
+    def validate(cls, client: OpenAI) -> ApiKeyStatusEnum:
+        key_hash = cls.get_key_hash(client=client)
+        with cls.__lock:
+            status, expires_at = cls.__statuses.get(key_hash, (ApiKeyStatusEnum.UNKNOWN, 0.0))
+        if time.time() < expires_at:
+            return status
+
+        status = SingleFlightHandler.do(
+            key=SingleFlightHandler.make_key(client=client, operation="models.list"),
+            operation="models.list",
+            func=lambda: cls.__request_status(client=client),
+        )
+        ttl_seconds = {
+            ApiKeyStatusEnum.VALID: VALID_TTL_SECONDS,
+            ApiKeyStatusEnum.INVALID: INVALID_TTL_SECONDS,
+            ApiKeyStatusEnum.UNKNOWN: UNKNOWN_TTL_SECONDS,
+        }[status]
+        with cls.__lock:
+            cls.__statuses[key_hash] = (status, time.time() + ttl_seconds)
+        return status
+
+    @staticmethod
+    def __request_status(client: OpenAI) -> ApiKeyStatusEnum:
+        try:
+            client.with_options(max_retries=0, timeout=VALIDATION_TIMEOUT_SECONDS).models.list()
+            status = ApiKeyStatusEnum.VALID
+        except AuthenticationError:
+            status = ApiKeyStatusEnum.INVALID
+        except Exception:
+            # Network trouble, rate limits or odd responses say nothing about the key. Let the real request decide.
+            status = ApiKeyStatusEnum.UNKNOWN
+        MetricsHandler.increment(name="api_key_validations_total", labels={"status": status.name})
+        return status
+
+    @staticmethod
+    def get_key_hash(client: OpenAI) -> str:
+        return hashlib.sha256(f"{client.base_url}:{client.api_key}".encode()).hexdigest()
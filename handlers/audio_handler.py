@@ -0,0 +1,146 @@
+import io
+from typing import List, Tuple
+import wave
+
+import numpy as np
+
+from handlers.metrics_handler import MetricsHandler
+
+
+TARGET_SAMPLE_RATE = 16000
+RESAMPLE_FILTER_TAPS = 31
+RESAMPLE_CHUNK_SAMPLES = 1 << 20
+VAD_FRAME_SECONDS = 0.03
+VAD_THRESHOLD_DB = -40.0
+VAD_FLOOR_RMS = 1e-4
+MAX_SILENCE_SECONDS = 0.5
+KEEP_SILENCE_SECONDS = 0.2
+
+
+class AudioHandler:
+    @staticmethod
+    def is_wav(audio_bytes: bytes) -> bool:
+        return audio_bytes[:4] == b"RIFF" and audio_bytes[8:12] == b"WAVE"
+
+    @staticmethod
+    @MetricsHandler.measured
+    def split_wav_bytes(wav_bytes: bytes, segment_seconds: float, overlap_seconds: float, max_segment_bytes: int) -> List[bytes]:
+        with wave.open(io.BytesIO(wav_bytes), "rb") as wav_reader:
+            params = wav_reader.getparams()
+            frames_bytes = wav_reader.readframes(params.nframes)
+
+        frame_width = params.nchannels * params.sampwidth
+        frames = np.frombuffer(buffer=frames_bytes, dtype=np.uint8).reshape(-1, frame_width)
+
+        segment_frames = min(int(segment_seconds * params.framerate), max_segment_bytes // frame_width)
+        overlap_frames = min(int(overlap_seconds * params.framerate), segment_frames // 2)
+        step_frames = segment_frames - overlap_frames
+
+        segments = []
+        for start in range(0, max(len(frames) - overlap_frames, 1), step_frames):
+            buffer = io.BytesIO()
+            with wave.open(buffer, "wb") as wav_writer:
+                wav_writer.setparams(params)
+                wav_writer.writeframes(frames[start : start + segment_frames].tobytes())
+            segments.append(buffer.getvalue())
+        return segments
+
+    @staticmethod
+    def wav_bytes_to_array(wav_bytes: bytes) -> Tuple[np.ndarray, int]:
+        with wave.open(io.BytesIO(wav_bytes), "rb") as wav_reader:
+            params = wav_reader.getparams()
+            frames_bytes = wav_reader.readframes(params.nframes)
+
+        raw = np.frombuffer(buffer=frames_bytes, dtype=np.uint8)
+        if params.sampwidth == 1:
+            samples = (raw.astype(np.float32) - 128.0) / 128.0
+        elif params.sampwidth == 2:
+            samples = raw.view(np.dtype("<i2")).astype(np.float32) / 32768.0
+        elif params.sampwidth == 3:
+            triplets = raw.reshape(-1, 3).astype(np.int32)
+            packed = triplets[:, 0] | (triplets[:, 1] << 8) | (triplets[:, 2] << 16)
+            samples = ((packed << 8) >> 8).astype(np.float32) / 8388608.0
+        elif params.sampwidth == 4:
+            samples = raw.view(np.dtype("<i4")).astype(np.float32) / 2147483648.0
+        else:
+            raise ValueError(f"Unsupported sample width: {params.sampwidth}")
+        return samples.reshape(-1, params.nchannels), params.framerate
+
+    @staticmethod
+    def array_to_wav_bytes(samples: np.ndarray, sample_rate: int) -> bytes:
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2")
+        channels = 1 if pcm.ndim == 1 else pcm.shape[1]
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_writer:
+            wav_writer.setnchannels(channels)
+            wav_writer.setsampwidth(2)
+            wav_writer.setframerate(sample_rate)
+            wav_writer.writeframes(pcm.tobytes())
+        return buffer.getvalue()
+
+    @staticmethod
+    def downmix(samples: np.ndarray) -> np.ndarray:
+        return samples.mean(axis=1, dtype=np.float32)
+
+    @staticmethod
+    def resample(samples: np.ndarray, sample_rate: int, target_sample_rate: int) -> np.ndarray:
+        if sample_rate == target_sample_rate or len(samples) == 0:
+            return samples
+
+        if target_sample_rate < sample_rate:
+            # Windowed-sinc low-pass at the new Nyquist frequency to avoid aliasing.
+            cutoff = target_sample_rate / sample_rate / 2
+            taps = np.arange(RESAMPLE_FILTER_TAPS) - (RESAMPLE_FILTER_TAPS - 1) / 2
+            kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(RESAMPLE_FILTER_TAPS)
+            samples = np.convolve(samples, (kernel / kernel.sum()).astype(np.float32), mode="same")
+
+        # Linear interpolation in chunks, so hour-long input does not need full-length float64 position arrays.
+        step = sample_rate / target_sample_rate
+        last_index = len(samples) - 1
+        resampled_samples = np.empty(int(len(samples) * target_sample_rate / sample_rate), dtype=np.float32)
+        for chunk_start in range(0, len(resampled_samples), RESAMPLE_CHUNK_SAMPLES):
+            positions = np.arange(chunk_start, min(chunk_start + RESAMPLE_CHUNK_SAMPLES, len(resampled_samples))) * step
+            left_indices = np.minimum(positions.astype(np.int64), last_index)
+            right_indices = np.minimum(left_indices + 1, last_index)
+            fractions = (positions - left_indices).astype(np.float32)
+            resampled_samples[chunk_start : chunk_start + len(positions)] = samples[left_indices] + (samples[right_indices] - samples[left_indices]) * fractions
+        return resampled_samples
+
+    @staticmethod
+    def trim_silence(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+        frame_length = max(int(VAD_FRAME_SECONDS * sample_rate), 1)
+        frame_count = len(samples) // frame_length
+        if frame_count == 0:
+            return samples
+
+        frames = samples[: frame_count * frame_length].reshape(frame_count, frame_length)
+        rms = np.sqrt(np.mean(np.square(frames), axis=1))
+        threshold = max(rms.max() * 10 ** (VAD_THRESHOLD_DB / 20), VAD_FLOOR_RMS)
+        is_voiced = rms > threshold
+        if not is_voiced.any():
+            # Nothing to trim against. Uploading an empty WAV would fail, so let the transcription decide.
+            return samples
+
+        # Keep a little padding around voiced frames so that word edges survive,
+        # which also keeps internal pauses shorter than MAX_SILENCE_SECONDS intact.
+        keep_frames = max(int(KEEP_SILENCE_SECONDS / VAD_FRAME_SECONDS), 1)
+        bridge_frames = max(int(MAX_SILENCE_SECONDS / VAD_FRAME_SECONDS), 1)
+        kernel = np.ones(2 * keep_frames + 1, dtype=bool)
+        is_kept = np.convolve(is_voiced, kernel, mode="same") > 0
+
+        voiced_indices = np.flatnonzero(is_voiced)
+        gaps = np.diff(voiced_indices)
+        for gap_start, gap in zip(voiced_indices[:-1], gaps):
+            if gap <= bridge_frames:
+                is_kept[gap_start : gap_start + gap] = True
+
+        return frames[is_kept].reshape(-1)
+
+    @classmethod
+    @MetricsHandler.measured
+    def preprocess_wav_bytes(cls, wav_bytes: bytes) -> bytes:
+        samples, sample_rate = cls.wav_bytes_to_array(wav_bytes=wav_bytes)
+        mono_samples = cls.downmix(samples=samples)
+        resampled_samples = cls.resample(samples=mono_samples, sample_rate=sample_rate, target_sample_rate=TARGET_SAMPLE_RATE)
+        trimmed_samples = cls.trim_silence(samples=resampled_samples, sample_rate=TARGET_SAMPLE_RATE)
+        return cls.array_to_wav_bytes(samples=trimmed_samples, sample_rate=TARGET_SAMPLE_RATE)
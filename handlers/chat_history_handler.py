@@ -0,0 +1,104 @@
+from contextlib import contextmanager
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional
+import uuid
+
+from enums.chatgpt_enum import SenderEnum
+
+
+DATABASE_PATH = "./.cache/chat_history.sqlite3"
+TITLE_MAX_CHARS = 40
+LIST_CONVERSATION_COUNT = 50
+
+
+class ChatHistoryHandler:
+    """
+    Append-only conversation store. Messages are keyed by (conversation_id, turn) so recent turns can be read without loading the whole conversation.
+    Conversations are only read back for the owner_id they were created with, see OwnerHandler.
+    """
+
+    @classmethod
+    def create_conversation(cls, owner_id: str, title: str) -> str:
+        conversation_id = uuid.uuid4().hex
+        now = time.time()
+        with cls.__connect() as connection:
+            connection.execute(
+                "INSERT INTO conversations (id, owner_id, title, created_at, updated_at, message_count) VALUES (?, ?, ?, ?, ?, 0)",
+                (conversation_id, owner_id, title[:TITLE_MAX_CHARS], now, now),
+            )
+        return conversation_id
+
+    @classmethod
+    def append_message(cls, conversation_id: str, sender_type: SenderEnum, sender_name: str, content: str) -> int:
+        now = time.time()
+        with cls.__connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            (turn,) = connection.execute("SELECT message_count FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+            connection.execute(
+                "INSERT INTO messages (conversation_id, turn, role, role_name, content, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (conversation_id, turn, sender_type.value, sender_name, content, now),
+            )
+            connection.execute("UPDATE conversations SET message_count = ?, updated_at = ? WHERE id = ?", (turn + 1, now, conversation_id))
+        return turn
+
+    @classmethod
+    def get_recent_messages(cls, owner_id: str, conversation_id: str, count: int, before_turn: Optional[int] = None) -> List[Dict[str, Any]]:
+        with cls.__connect() as connection:
+            rows = connection.execute(
+                "SELECT turn, role, role_name, content FROM messages WHERE conversation_id = ? AND turn < ? "
+                "AND EXISTS (SELECT 1 FROM conversations WHERE id = ? AND owner_id = ?) ORDER BY turn DESC LIMIT ?",
+                (conversation_id, before_turn if before_turn is not None else 2**62, conversation_id, owner_id, count),
+            ).fetchall()
+        return [{"turn": turn, "role": role, "role_name": role_name, "content": content} for turn, role, role_name, content in reversed(rows)]
+
+    @classmethod
+    def get_conversation(cls, owner_id: str, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns None for conversations that do not exist or belong to someone else.
+        """
+        with cls.__connect() as connection:
+            row = connection.execute(
+                "SELECT id, title, updated_at, message_count FROM conversations WHERE id = ? AND owner_id = ?",
+                (conversation_id, owner_id),
+            ).fetchone()
+        if not row:
+            return None
+        return {"id": row[0], "title": row[1], "updated_at": row[2], "message_count": row[3]}
+
+    @classmethod
+    def list_conversations(cls, owner_id: str, count: int = LIST_CONVERSATION_COUNT) -> List[Dict[str, Any]]:
+        with cls.__connect() as connection:
+            rows = connection.execute(
+                "SELECT id, title, updated_at, message_count FROM conversations WHERE owner_id = ? AND message_count > 0 ORDER BY updated_at DESC LIMIT ?",
+                (owner_id, count),
+            ).fetchall()
+        return [{"id": row[0], "title": row[1], "updated_at": row[2], "message_count": row[3]} for row in rows]
+
+    @staticmethod
+    @contextmanager
+    def __connect() -> Iterator[sqlite3.Connection]:
+        os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
+        connection = sqlite3.connect(DATABASE_PATH, timeout=30, isolation_level=None)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS conversations (id TEXT PRIMARY KEY, owner_id TEXT NOT NULL DEFAULT '', title TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL, message_count INTEGER NOT NULL)"
+            )
+            # Conversations stored before owners were recorded get an empty owner, which no one matches.
+            if "owner_id" not in [column[1] for column in connection.execute("PRAGMA table_info(conversations)")]:
+                connection.execute("ALTER TABLE conversations ADD COLUMN owner_id TEXT NOT NULL DEFAULT ''")
+            connection.execute("CREATE INDEX IF NOT EXISTS conversations_owner_id_updated_at ON conversations (owner_id, updated_at)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages (conversation_id TEXT NOT NULL, turn INTEGER NOT NULL, role TEXT NOT NULL, role_name TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (conversation_id, turn)) WITHOUT ROWID"
+            )
+            yield connection
+            if connection.in_transaction:
+                connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
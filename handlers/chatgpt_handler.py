@@ -1,33 +1,50 @@
-from typing import Any, List, Callable
+from contextlib import contextmanager
+import json
+import time
+from typing import Any, Iterator, List, Callable
 
 from openai import OpenAI
 
 from enums.chatgpt_enum import AiModelEnum, SenderEnum
 from exceptions.exceptions import InvalidModelTypeException, EmptyResponseException
+from handlers.metrics_handler import MetricsHandler
+from handlers.single_flight_handler import SingleFlightHandler
 
 
 class ChatGptHandler:
     @staticmethod
+    @MetricsHandler.measured
     def query_answer(
         client: OpenAI,
         prompt: str,
         chat_history: List[Any] = [],
         model_type: AiModelEnum = AiModelEnum.GPT35_TURBO,
     ) -> str:
-        if model_type == AiModelEnum.NONE:
+        # AUTO has to be resolved by ModelRouterHandler before a request is made.
+        if model_type in (AiModelEnum.NONE, AiModelEnum.AUTO):
             raise InvalidModelTypeException()
 
         copyed_chat_history = chat_history.copy()
         copyed_chat_history.append({"role": SenderEnum.USER.value, "content": prompt})
 
-        response = client.chat.completions.create(model=model_type.value, messages=copyed_chat_history)
-
-        answer = response.choices[0].message.content
+        with ChatGptHandler.__observe_model(model_type=model_type):
+            answer = SingleFlightHandler.do(
+                key=SingleFlightHandler.make_key(client=client, operation="chat.completions.create", model=model_type.value, messages=copyed_chat_history),
+                operation="chat.completions.create",
+                func=lambda: client.chat.completions.create(model=model_type.value, messages=copyed_chat_history).choices[0].message.content,
+            )
         if not answer:
             raise EmptyResponseException()
+        MetricsHandler.record_bytes(
+            handler="ChatGptHandler",
+            method="query_answer",
+            request_bytes=len(json.dumps(copyed_chat_history).encode()),
+            response_bytes=len(answer.encode()),
+        )
         return answer
 
     @staticmethod
+    @MetricsHandler.measured
     def query_answer_and_display_streamly(
         client: OpenAI,
         prompt: str,
@@ -35,21 +52,77 @@ class ChatGptHandler:
         chat_history: List[Any] = [],
         model_type: AiModelEnum = AiModelEnum.GPT35_TURBO,
     ) -> str:
-        if model_type == AiModelEnum.NONE:
+        # AUTO has to be resolved by ModelRouterHandler before a request is made.
+        if model_type in (AiModelEnum.NONE, AiModelEnum.AUTO):
             raise InvalidModelTypeException()
 
         copyed_chat_history = chat_history.copy()
         copyed_chat_history.append({"role": SenderEnum.USER.value, "content": prompt})
 
-        stream_response = client.chat.completions.create(
-            model=model_type.value,
-            messages=copyed_chat_history,
-            stream=True,
-        )
+        def stream_answer(publish: Callable[[str], None]) -> str:
+            stream_response = client.chat.completions.create(
+                model=model_type.value,
+                messages=copyed_chat_history,
+                stream=True,
+            )
+            answer = ""
+            for chunk in stream_response:
+                answer_peace = chunk.choices[0].delta.content or ""  # type: ignore
+                answer += answer_peace
+                publish(answer_peace)
+            return answer
+
+        start_time = time.perf_counter()
+        first_token_time = None
+        token_count = 0
+        displayed_answer = ""
+
+        def display_answer(answer_peace: str) -> None:
+            nonlocal first_token_time, token_count, displayed_answer
+            if answer_peace:
+                first_token_time = first_token_time or time.perf_counter()
+                token_count += 1
+                displayed_answer += answer_peace
+            display_func(displayed_answer)
 
-        answer = ""
-        for chunk in stream_response:
-            answer_peace = chunk.choices[0].delta.content or ""  # type: ignore
-            answer += answer_peace
-            display_func(answer)
+        # Identical concurrent prompts share one stream. Only the new chunks are shared, and each session rebuilds the answer.
+        with ChatGptHandler.__observe_model(model_type=model_type):
+            answer = SingleFlightHandler.do_streaming(
+                key=SingleFlightHandler.make_key(client=client, operation="chat.completions.create:stream", model=model_type.value, messages=copyed_chat_history),
+                operation="chat.completions.create:stream",
+                func=stream_answer,
+                on_update=display_answer,
+            )
+        MetricsHandler.record_stream(
+            handler="ChatGptHandler",
+            method="query_answer_and_display_streamly",
+            start_time=start_time,
+            first_token_time=first_token_time,
+            token_count=token_count,
+            extra_labels={"model": model_type.name},
+        )
+        MetricsHandler.record_bytes(
+            handler="ChatGptHandler",
+            method="query_answer_and_display_streamly",
+            request_bytes=len(json.dumps(copyed_chat_history).encode()),
+            response_bytes=len(answer.encode()),
+        )
         return answer
+
+    @staticmethod
+    @contextmanager
+    def __observe_model(model_type: AiModelEnum) -> Iterator[None]:
+        """
+        Records the latency and outcome of each request per model. ModelRouterHandler reads them back as rolling statistics.
+        """
+        start_time = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            MetricsHandler.observe(
+                name="chatgpt_model_latency_seconds",
+                value=time.perf_counter() - start_time,
+                labels={"model": model_type.name, "outcome": outcome},
+            )
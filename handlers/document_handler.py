@@ -0,0 +1,230 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import io
+import json
+import os
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterator, List, Tuple
+import uuid
+
+from openai import OpenAI
+
+from enums.chatgpt_enum import SenderEnum
+from handlers.embedding_handler import EmbeddingHandler, MAX_BATCH_SIZE
+from handlers.metrics_handler import MetricsHandler
+from handlers.vector_index_handler import VectorIndex, VectorIndexHandler
+
+
+DOCUMENT_INDEX_NAME = "chat_documents"
+MANIFEST_FILE_NAME = "documents.jsonl"
+CHUNK_CHARS = 1500
+CHUNK_OVERLAP_CHARS = 200
+MAX_CONCURRENT_EMBEDDING_REQUESTS = 4
+TEXT_READ_CHARS = 64 * 1024
+CONTEXT_CHUNK_COUNT = 4
+# Chunks of failed ingestions stay in the append-only index, so more candidates are searched than returned.
+CANDIDATE_CHUNK_FACTOR = 3
+
+
+class DocumentHandler:
+    """
+    Ingests text and PDF documents into the owner's vector index, and retrieves the chunks closest to a question.
+    Documents are read and chunked lazily, and at most max_workers batches are in flight, so memory stays bounded by the batch size.
+    Each ingestion tags its chunks with an ingestion_id and is recorded in a manifest only after its last batch was added.
+    A document whose ingestion failed partway is therefore ingested again on retry, and only chunks of recorded ingestions are retrieved.
+    """
+
+    @classmethod
+    @MetricsHandler.measured
+    def ingest_documents(
+        cls,
+        client: OpenAI,
+        owner_id: str,
+        documents: List[Tuple[str, BinaryIO]],
+        display_func: Callable[[str], None] = print,
+        max_workers: int = MAX_CONCURRENT_EMBEDDING_REQUESTS,
+    ) -> Dict[str, int]:
+        index = VectorIndexHandler.get_index(name=DOCUMENT_INDEX_NAME, owner_id=owner_id)
+        indexed_document_ids = set(cls.__read_manifest(index=index))
+
+        summary = {"document_count": 0, "skipped_count": 0, "chunk_count": 0}
+        for name, stream in documents:
+            document_id = cls.__hash_stream(stream=stream)
+            if document_id in indexed_document_ids:
+                summary["skipped_count"] += 1
+                continue
+            ingestion_id = uuid.uuid4().hex
+            chunk_count = cls.__ingest_document(
+                client=client,
+                owner_id=owner_id,
+                name=name,
+                document_id=document_id,
+                ingestion_id=ingestion_id,
+                stream=stream,
+                display_func=lambda chunk_count: display_func(f"{name}: {chunk_count:,} chunks embedded"),
+                max_workers=max_workers,
+            )
+            cls.__record_ingestion(index=index, entry={"document_id": document_id, "ingestion_id": ingestion_id, "name": name, "chunk_count": chunk_count})
+            indexed_document_ids.add(document_id)
+            summary["document_count"] += 1
+            summary["chunk_count"] += chunk_count
+        return summary
+
+    @classmethod
+    def retrieve_chunks(cls, client: OpenAI, owner_id: str, query: str, top_k: int = CONTEXT_CHUNK_COUNT) -> List[Dict[str, Any]]:
+        index = VectorIndexHandler.get_index(name=DOCUMENT_INDEX_NAME, owner_id=owner_id)
+        ingestion_ids = set(cls.__read_manifest(index=index).values())
+        if not ingestion_ids:
+            return []
+        query_vector = EmbeddingHandler.embed_text(client=client, text=query)
+        results = index.search(query_vector=query_vector, top_k=top_k * CANDIDATE_CHUNK_FACTOR)
+        return [{"score": score, **metadata} for score, metadata in results if metadata["ingestion_id"] in ingestion_ids][:top_k]
+
+    @staticmethod
+    def make_context_message(chunks: List[Dict[str, Any]]) -> Dict[str, str]:
+        excerpts = "\n\n".join(f"[{chunk['name']} #{chunk['chunk'] + 1}]\n{chunk['text']}" for chunk in chunks)
+        return {
+            "role": SenderEnum.SYSTEM.value,
+            "content": f"Answer using the following excerpts from the user's documents when they are relevant, and cite them by their bracketed labels.\n\n{excerpts}",
+        }
+
+    @classmethod
+    def __ingest_document(
+        cls,
+        client: OpenAI,
+        owner_id: str,
+        name: str,
+        document_id: str,
+        ingestion_id: str,
+        stream: BinaryIO,
+        display_func: Callable[[int], None],
+        max_workers: int,
+    ) -> int:
+        index = VectorIndexHandler.get_index(name=DOCUMENT_INDEX_NAME, owner_id=owner_id)
+        chunk_count = 0
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="DocumentHandler") as executor:
+            pending: Deque[Tuple[List[Dict[str, Any]], Future]] = deque()
+
+            def add_oldest_batch() -> None:
+                nonlocal chunk_count
+                metadata, future = pending.popleft()
+                # Batches are added in submission order, so chunk numbers follow the document.
+                index.add(vectors=future.result(), metadata=metadata)
+                chunk_count += len(metadata)
+                display_func(chunk_count)
+
+            def submit_batch(texts: List[str], first_chunk: int) -> Tuple[List[Dict[str, Any]], Future]:
+                return cls.__submit_batch(
+                    executor=executor,
+                    client=client,
+                    name=name,
+                    document_id=document_id,
+                    ingestion_id=ingestion_id,
+                    texts=texts,
+                    first_chunk=first_chunk,
+                )
+
+            submitted_count = 0
+            batch: List[str] = []
+            for text in cls.__iter_chunks(texts=cls.__iter_texts(name=name, stream=stream)):
+                batch.append(text)
+                if len(batch) < MAX_BATCH_SIZE:
+                    continue
+                pending.append(submit_batch(texts=batch, first_chunk=submitted_count))
+                submitted_count += len(batch)
+                batch = []
+                if len(pending) >= max_workers:
+                    add_oldest_batch()
+            if batch:
+                pending.append(submit_batch(texts=batch, first_chunk=submitted_count))
+            while pending:
+                add_oldest_batch()
+        MetricsHandler.increment(name="document_chunks_total", value=chunk_count)
+        return chunk_count
+
+    @staticmethod
+    def __submit_batch(
+        executor: ThreadPoolExecutor, client: OpenAI, name: str, document_id: str, ingestion_id: str, texts: List[str], first_chunk: int
+    ) -> Tuple[List[Dict[str, Any]], Future]:
+        metadata = [
+            {"document_id": document_id, "ingestion_id": ingestion_id, "name": name, "chunk": first_chunk + offset, "text": text}
+            for offset, text in enumerate(texts)
+        ]
+        return metadata, executor.submit(EmbeddingHandler.embed_texts, client=client, texts=texts)
+
+    @staticmethod
+    def __read_manifest(index: VectorIndex) -> Dict[str, str]:
+        """
+        Returns the ingestion_id of each completely ingested document by document_id.
+        """
+        manifest_path = os.path.join(index.directory, MANIFEST_FILE_NAME)
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path, "rb") as f:
+            manifest = f.read()
+        # A line that is still being written is left for a later read.
+        entries = [json.loads(line) for line in manifest[: manifest.rfind(b"\n") + 1].decode().splitlines() if line.strip()]
+        return {entry["document_id"]: entry["ingestion_id"] for entry in reversed(entries)}
+
+    @classmethod
+    def __record_ingestion(cls, index: VectorIndex, entry: Dict[str, Any]) -> None:
+        with index.lock:
+            # If the same document finished concurrently, the first record wins and these chunks are never retrieved.
+            if entry["document_id"] in cls.__read_manifest(index=index):
+                return
+            os.makedirs(index.directory, exist_ok=True)
+            with open(os.path.join(index.directory, MANIFEST_FILE_NAME), "ab") as f:
+                f.write((json.dumps(entry) + "\n").encode())
+
+    @staticmethod
+    def __iter_texts(name: str, stream: BinaryIO) -> Iterator[str]:
+        stream.seek(0)
+        if name.lower().endswith(".pdf"):
+            from pypdf import PdfReader
+
+            for page in PdfReader(stream).pages:
+                yield page.extract_text() + "\n\n"
+            return
+
+        reader = io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+        try:
+            while True:
+                text = reader.read(TEXT_READ_CHARS)
+                if not text:
+                    break
+                yield text
+        finally:
+            # Detaching keeps the uploaded file open for the caller.
+            reader.detach()
+
+    @staticmethod
+    def __iter_chunks(texts: Iterator[str]) -> Iterator[str]:
+        """
+        Cuts the text into chunks of about CHUNK_CHARS, preferring paragraph, line and sentence breaks, with CHUNK_OVERLAP_CHARS repeated between chunks.
+        """
+        buffer = ""
+        for text in texts:
+            buffer += text
+            while len(buffer) >= CHUNK_CHARS + CHUNK_OVERLAP_CHARS:
+                end = CHUNK_CHARS
+                for separator in ("\n\n", "\n", ". ", " "):
+                    position = buffer.rfind(separator, CHUNK_CHARS // 2, CHUNK_CHARS)
+                    if position != -1:
+                        end = position + len(separator)
+                        break
+                chunk = buffer[:end].strip()
+                if chunk:
+                    yield chunk
+                buffer = buffer[max(end - CHUNK_OVERLAP_CHARS, 1) :]
+        chunk = buffer.strip()
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def __hash_stream(stream: BinaryIO) -> str:
+        stream.seek(0)
+        digest = hashlib.sha256()
+        for block in iter(lambda: stream.read(1024 * 1024), b""):
+            digest.update(block)
+        stream.seek(0)
+        return digest.hexdigest()
@@ -0,0 +1,39 @@
+from typing import List
+
+import numpy as np
+from openai import OpenAI
+
+from exceptions.exceptions import EmptyResponseException
+from handlers.metrics_handler import MetricsHandler
+
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+MAX_BATCH_SIZE = 256
+MAX_INPUT_CHARS = 8000
+
+
+class EmbeddingHandler:
+    @staticmethod
+    @MetricsHandler.measured
+    def embed_texts(client: OpenAI, texts: List[str], batch_size: int = MAX_BATCH_SIZE) -> np.ndarray:
+        """
+        Returns one float32 row per text, requesting up to batch_size texts at once.
+        """
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            batch = [text[:MAX_INPUT_CHARS] or " " for text in texts[start : start + batch_size]]
+            response = client.embeddings.create(model=EMBEDDING_MODEL, input=batch)
+            if len(response.data) != len(batch):
+                raise EmptyResponseException()
+            embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+            MetricsHandler.record_bytes(
+                handler="EmbeddingHandler",
+                method="embed_texts",
+                request_bytes=sum(len(text.encode()) for text in batch),
+                response_bytes=len(batch) * len(embeddings[-1]) * 4,
+            )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    @classmethod
+    def embed_text(cls, client: OpenAI, text: str) -> np.ndarray:
+        return cls.embed_texts(client=client, texts=[text])[0]
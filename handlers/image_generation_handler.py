@@ -1,11 +1,17 @@
+import base64
+from typing import List
+
 from openai import OpenAI
 
-from enums.image_generation_enum import AiModelEnum, SizeEnum, QualityEnum
+from enums.image_generation_enum import AiModelEnum, SizeEnum, QualityEnum, DraftSizeEnum
 from exceptions.exceptions import EmptyResponseException
+from handlers.metrics_handler import MetricsHandler
+from handlers.single_flight_handler import SingleFlightHandler
 
 
 class ImageGenerationHandler:
     @staticmethod
+    @MetricsHandler.measured
     def generate_image(
         client: OpenAI,
         prompt: str,
@@ -13,14 +19,58 @@ class ImageGenerationHandler:
         size_type: SizeEnum = SizeEnum.W1024xH1024,
         quality_type: QualityEnum = QualityEnum.STANDARD,
     ) -> str:
-        response = client.images.generate(
-            prompt=prompt,
-            model=model_type.value,
-            size=size_type.value,
-            quality=quality_type.value,
-            n=1,
+        request = {
+            "prompt": prompt,
+            "model": model_type.value,
+            "size": size_type.value,
+            "quality": quality_type.value,
+            "n": 1,
+        }
+        image_url = SingleFlightHandler.do(
+            key=SingleFlightHandler.make_key(client=client, operation="images.generate", **request),
+            operation="images.generate",
+            func=lambda: client.images.generate(**request).data[0].url,
         )
-        image_url = response.data[0].url
         if not image_url:
             raise EmptyResponseException()
+        MetricsHandler.record_bytes(
+            handler="ImageGenerationHandler",
+            method="generate_image",
+            request_bytes=len(prompt.encode()),
+            response_bytes=len(image_url.encode()),
+        )
         return image_url
+
+    @staticmethod
+    @MetricsHandler.measured
+    def generate_draft_images(
+        client: OpenAI,
+        prompt: str,
+        size_type: DraftSizeEnum = DraftSizeEnum.W512xH512,
+        image_count: int = 4,
+    ) -> List[bytes]:
+        """
+        Generates several small DALL-E 2 images in one request. They come back inline as base64, so no separate downloads are needed.
+        """
+        request = {
+            "prompt": prompt,
+            "model": AiModelEnum.DALLE_2.value,
+            "size": size_type.value,
+            "n": image_count,
+            "response_format": "b64_json",
+        }
+        images_b64 = SingleFlightHandler.do(
+            key=SingleFlightHandler.make_key(client=client, operation="images.generate", **request),
+            operation="images.generate",
+            func=lambda: [image.b64_json for image in client.images.generate(**request).data],
+        )
+        if not images_b64 or not all(images_b64):
+            raise EmptyResponseException()
+        images = [base64.b64decode(image_b64) for image_b64 in images_b64]
+        MetricsHandler.record_bytes(
+            handler="ImageGenerationHandler",
+            method="generate_draft_images",
+            request_bytes=len(prompt.encode()),
+            response_bytes=sum(len(image_b64) for image_b64 in images_b64),
+        )
+        return images
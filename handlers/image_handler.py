@@ -4,14 +4,18 @@ import cv2
 import numpy as np
 import requests
 
+from handlers.metrics_handler import MetricsHandler
+
 
 class ImageHandler:
     @staticmethod
+    @MetricsHandler.measured
     def bytes_to_b64(image_bytes: bytes) -> str:
         image_b64 = base64.b64encode(s=image_bytes).decode()
         return image_b64
 
     @staticmethod
+    @MetricsHandler.measured
     def bytes_to_array_rgb(image_bytes: bytes) -> np.ndarray:
         image_bgr = cv2.imdecode(
             buf=np.frombuffer(buffer=image_bytes, dtype=np.uint8),
@@ -21,13 +25,16 @@ class ImageHandler:
         return image_rgb
 
     @staticmethod
+    @MetricsHandler.measured
     def download_as_bytes(image_url: str) -> bytes:
         response = requests.get(url=image_url)
         response.raise_for_status()
-        image_bytes = bytearray(response.content)
+        image_bytes = response.content
+        MetricsHandler.record_bytes(handler="ImageHandler", method="download_as_bytes", response_bytes=len(image_bytes))
         return image_bytes
 
     @classmethod
+    @MetricsHandler.measured
     def download_as_array_rgb(cls, image_url: str) -> np.ndarray:
         image_bytes = cls.download_as_bytes(image_url=image_url)
         image_rgb = cls.bytes_to_array_rgb(image_bytes=image_bytes)
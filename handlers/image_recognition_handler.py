@@ -1,9 +1,11 @@
-from typing import Any, Callable
+import time
+from typing import Any, Callable, Optional
 
 from openai import OpenAI
 
 from enums.chatgpt_enum import SenderEnum
 from exceptions.exceptions import EmptyResponseException
+from handlers.metrics_handler import MetricsHandler
 
 
 VISION_MODEL = "gpt-4-vision-preview"
@@ -11,16 +13,19 @@ VISION_MODEL = "gpt-4-vision-preview"
 
 class ImageRecognitionHandler:
     @classmethod
+    @MetricsHandler.measured
     def query_answer(
         cls,
         client: OpenAI,
-        image_b64: str,
+        image_b64: Optional[str],
         prompt: str,
+        image_url: Optional[str] = None,
+        detail: str = "auto",
     ) -> str:
         response = client.chat.completions.create(
             model=VISION_MODEL,
             messages=[
-                cls.__get_user_prompt_with_image(prompt=prompt, image_b64=image_b64),
+                cls.__get_user_prompt_with_image(prompt=prompt, image_b64=image_b64, image_url=image_url, detail=detail),
             ],
             max_tokens=1000,
         )
@@ -28,34 +33,65 @@ class ImageRecognitionHandler:
         answer = response.choices[0].message.content
         if not answer:
             raise EmptyResponseException()
+        MetricsHandler.record_bytes(
+            handler="ImageRecognitionHandler",
+            method="query_answer",
+            request_bytes=len(image_url or image_b64 or "") + len(prompt.encode()),
+            response_bytes=len(answer.encode()),
+        )
         return answer
 
     @classmethod
+    @MetricsHandler.measured
     def query_answer_and_display_streamly(
         cls,
         client: OpenAI,
-        image_b64: str,
+        image_b64: Optional[str],
         prompt: str,
         display_func: Callable[[str], None] = print,
+        image_url: Optional[str] = None,
+        detail: str = "auto",
     ) -> str:
         stream_response = client.chat.completions.create(
             model=VISION_MODEL,
             messages=[
-                cls.__get_user_prompt_with_image(prompt=prompt, image_b64=image_b64),
+                cls.__get_user_prompt_with_image(prompt=prompt, image_b64=image_b64, image_url=image_url, detail=detail),
             ],
             stream=True,
             max_tokens=1000,
         )
 
+        start_time = time.perf_counter()
+        first_token_time = None
+        token_count = 0
         answer = ""
         for chunk in stream_response:
             answer_peace = chunk.choices[0].delta.content or ""  # type: ignore
+            if answer_peace:
+                first_token_time = first_token_time or time.perf_counter()
+                token_count += 1
             answer += answer_peace
             display_func(answer)
+        MetricsHandler.record_stream(
+            handler="ImageRecognitionHandler",
+            method="query_answer_and_display_streamly",
+            start_time=start_time,
+            first_token_time=first_token_time,
+            token_count=token_count,
+        )
+        MetricsHandler.record_bytes(
+            handler="ImageRecognitionHandler",
+            method="query_answer_and_display_streamly",
+            request_bytes=len(image_url or image_b64 or "") + len(prompt.encode()),
+            response_bytes=len(answer.encode()),
+        )
         return answer
 
     @staticmethod
-    def __get_user_prompt_with_image(prompt: str, image_b64: str) -> Any:
+    def __get_user_prompt_with_image(prompt: str, image_b64: Optional[str], image_url: Optional[str], detail: str) -> Any:
+        """
+        A still valid image_url is sent as is, so the image is fetched by OpenAI instead of being uploaded again.
+        """
         return {
             "role": SenderEnum.USER.value,
             "content": [
@@ -65,7 +101,7 @@ class ImageRecognitionHandler:
                 },
                 {
                     "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"},
+                    "image_url": {"url": image_url or f"data:image/jpeg;base64,{image_b64}", "detail": detail},
                 },
             ],
         }
@@ -0,0 +1,175 @@
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import functools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+import uuid
+
+from enums.job_enum import JobStatusEnum
+from enums.scheduler_enum import SchedulerLaneEnum
+from handlers.metrics_handler import MetricsHandler
+from handlers.scheduler_handler import SchedulerHandler, Ticket
+from handlers.tracing_handler import DetachedSpan, TracingHandler
+
+
+MAX_WORKERS = 8
+JOB_TTL_SECONDS = 60 * 60
+POLL_INTERVAL_SECONDS = 1.0
+
+
+class Job:
+    def __init__(self, future: Future, payload: Any) -> None:
+        self.future = future
+        self.payload = payload
+        self.progress: Optional[str] = None
+        self.finished_at: Optional[float] = None
+        self.ticket: Optional[Ticket] = None
+
+
+class JobHandler:
+    __executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="JobHandler")
+    __lock = threading.Lock()
+    __jobs: Dict[str, Job] = {}
+    __logger = logging.getLogger("JobHandler")
+
+    @classmethod
+    def submit(
+        cls,
+        func: Callable[..., Any],
+        payload: Any = None,
+        is_progress_reported: bool = False,
+        lane: SchedulerLaneEnum = SchedulerLaneEnum.BATCH,
+        cost: float = 1.0,
+        parallelism: int = 1,
+        **kwargs: Any,
+    ) -> str:
+        """
+        Jobs using the server default API key wait in SchedulerHandler before they are handed to the executor, so the scheduler, not the executor's FIFO queue, decides their order.
+        parallelism is how many upstream requests func sends at once, and the job holds that many scheduler slots.
+        """
+        job_id = uuid.uuid4().hex
+        if is_progress_reported:
+            kwargs["display_func"] = lambda progress: cls.__set_progress(job_id=job_id, progress=progress)
+
+        is_scheduled = SchedulerHandler.is_scheduled(client=kwargs.get("client"))
+        # The job's spans join the submitting trace, and its wait_ms shows how long it was queued.
+        detached_span = TracingHandler.detach(name=f"JobHandler.run:{func.__qualname__}")
+        with cls.__lock:
+            cls.__purge_expired_jobs()
+            future = Future() if is_scheduled else cls.__executor.submit(cls.__run, detached_span=detached_span, func=func, kwargs=kwargs)
+            job = Job(future=future, payload=payload)
+            cls.__jobs[job_id] = job
+        future.add_done_callback(lambda _: setattr(job, "finished_at", time.time()))
+
+        if is_scheduled:
+            job.ticket = SchedulerHandler.enqueue(
+                lane=lane,
+                cost=cost,
+                parallelism=parallelism,
+                start_func=lambda ticket: cls.__executor.submit(
+                    cls.__run_scheduled,
+                    ticket=ticket,
+                    future=future,
+                    detached_span=detached_span,
+                    func=func,
+                    kwargs=kwargs,
+                ),
+            )
+        return job_id
+
+    @classmethod
+    def spawn(cls, func: Callable[..., Any], lane: SchedulerLaneEnum = SchedulerLaneEnum.BATCH, cost: float = 1.0, **kwargs: Any) -> None:
+        """
+        Runs func like submit for callers that never collect the result. The job is forgotten once it finishes.
+        Its failure is logged and counted in job_failures_total instead of waiting for a pop_result that never comes.
+        """
+
+        @functools.wraps(func)
+        def run(**kwargs: Any) -> None:
+            try:
+                func(**kwargs)
+            except Exception:
+                cls.__logger.exception("Background job %s failed", func.__qualname__)
+                MetricsHandler.increment(name="job_failures_total", labels={"func": func.__qualname__})
+
+        job_id = cls.submit(func=run, lane=lane, cost=cost, **kwargs)
+        cls.__jobs[job_id].future.add_done_callback(lambda _: cls.__forget(job_id=job_id))
+
+    @classmethod
+    def get_status(cls, job_id: str) -> JobStatusEnum:
+        job = cls.__jobs.get(job_id)
+        if not job:
+            return JobStatusEnum.NOT_FOUND
+        if not job.future.done():
+            return JobStatusEnum.RUNNING if job.future.running() else JobStatusEnum.PENDING
+        if job.future.exception():
+            return JobStatusEnum.FAILED
+        return JobStatusEnum.DONE
+
+    @classmethod
+    def wait(cls, job_id: str, timeout_seconds: float) -> JobStatusEnum:
+        job = cls.__jobs.get(job_id)
+        if job:
+            wait([job.future], timeout=timeout_seconds)
+        return cls.get_status(job_id=job_id)
+
+    @classmethod
+    def get_queue_position(cls, job_id: str) -> Optional[int]:
+        """
+        Returns the 1-based position of a job still waiting in the scheduler, or None.
+        """
+        job = cls.__jobs.get(job_id)
+        if not job or not job.ticket or job.ticket.is_granted:
+            return None
+        return SchedulerHandler.get_position(ticket=job.ticket) + 1
+
+    @classmethod
+    def get_progress(cls, job_id: str) -> Optional[str]:
+        job = cls.__jobs.get(job_id)
+        return job.progress if job else None
+
+    @classmethod
+    def pop_result(cls, job_id: str) -> Tuple[Any, Any]:
+        """
+        Removes a finished job and returns its payload and result, re-raising the job's exception if it failed.
+        """
+        with cls.__lock:
+            job = cls.__jobs.pop(job_id)
+        return job.payload, job.future.result()
+
+    @staticmethod
+    def __run(detached_span: Optional[DetachedSpan], func: Callable[..., Any], kwargs: Dict[str, Any]) -> Any:
+        with TracingHandler.attach(detached_span=detached_span):
+            return func(**kwargs)
+
+    @staticmethod
+    def __run_scheduled(ticket: Ticket, future: Future, detached_span: Optional[DetachedSpan], func: Callable[..., Any], kwargs: Dict[str, Any]) -> None:
+        try:
+            with TracingHandler.attach(detached_span=detached_span):
+                if not future.set_running_or_notify_cancel():
+                    return
+                try:
+                    future.set_result(func(**kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            SchedulerHandler.release(ticket=ticket)
+
+    @classmethod
+    def __set_progress(cls, job_id: str, progress: str) -> None:
+        job = cls.__jobs.get(job_id)
+        if job:
+            job.progress = progress
+
+    @classmethod
+    def __forget(cls, job_id: str) -> None:
+        with cls.__lock:
+            cls.__jobs.pop(job_id, None)
+
+    @classmethod
+    def __purge_expired_jobs(cls) -> None:
+        expired_before = time.time() - JOB_TTL_SECONDS
+        for job_id, job in list(cls.__jobs.items()):
+            if job.finished_at and job.finished_at < expired_before:
+                del cls.__jobs[job_id]
@@ -0,0 +1,170 @@
+from collections import deque
+import threading
+import time
+import tracemalloc
+from typing import Any, Deque, Dict, List, Mapping, Optional
+
+import numpy as np
+
+from handlers.metrics_handler import MetricsHandler
+
+
+TRACEBACK_FRAMES = 10
+TOP_GROWTH_COUNT = 15
+MAX_VISIT_RECORDS = 100
+SESSION_TTL_SECONDS = 60 * 60
+SNAPSHOT_INTERVAL_SECONDS = 60
+
+
+class SessionMemory:
+    def __init__(self, page_name: str, key_sizes: Dict[str, int], key_descriptions: Dict[str, str]) -> None:
+        self.page_name = page_name
+        self.key_sizes = key_sizes
+        self.key_descriptions = key_descriptions
+        self.updated_at = time.time()
+
+
+class MemoryProfilerHandler:
+    __lock = threading.Lock()
+    __sessions: Dict[str, SessionMemory] = {}
+    __visits: Deque[Dict[str, Any]] = deque(maxlen=MAX_VISIT_RECORDS)
+    __last_snapshot: Optional[tracemalloc.Snapshot] = None
+    __last_snapshot_at = 0.0
+    __last_growth: List[Dict[str, Any]] = []
+
+    @staticmethod
+    def is_tracing() -> bool:
+        return tracemalloc.is_tracing()
+
+    @classmethod
+    def start(cls) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEBACK_FRAMES)
+
+    @classmethod
+    def stop(cls) -> None:
+        tracemalloc.stop()
+        with cls.__lock:
+            cls.__last_snapshot = None
+            cls.__last_snapshot_at = 0.0
+            cls.__last_growth = []
+
+    @classmethod
+    def record_session(cls, session_id: str, page_name: str, session_state: Mapping[str, Any]) -> None:
+        """
+        Attributes the session's bytes to its session state keys and records a visit whenever the session moves to another page.
+        Snapshots are left to the Admin page, since taking one on every page run would stall the script thread.
+        """
+        key_sizes = {key: MetricsHandler.estimate_size(value=value) for key, value in session_state.items()}
+        key_descriptions = {key: cls.__describe(value=value) for key, value in session_state.items()}
+        with cls.__lock:
+            cls.__purge_expired_sessions()
+            previous = cls.__sessions.get(session_id)
+            cls.__sessions[session_id] = SessionMemory(page_name=page_name, key_sizes=key_sizes, key_descriptions=key_descriptions)
+        if previous and previous.page_name == page_name:
+            return
+
+        traced_bytes = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        with cls.__lock:
+            cls.__visits.appendleft(
+                {
+                    "time": time.strftime("%H:%M:%S"),
+                    "session": session_id[:8],
+                    "page": page_name,
+                    "session_bytes": sum(key_sizes.values()),
+                    "traced_bytes": traced_bytes,
+                }
+            )
+
+    @classmethod
+    def take_snapshot_if_due(cls) -> None:
+        with cls.__lock:
+            is_due = time.time() - cls.__last_snapshot_at >= SNAPSHOT_INTERVAL_SECONDS
+        if is_due and tracemalloc.is_tracing():
+            cls.take_snapshot()
+
+    @classmethod
+    def take_snapshot(cls) -> List[Dict[str, Any]]:
+        """
+        Returns the allocation sites that grew the most since the previous snapshot.
+        """
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            )
+        )
+        with cls.__lock:
+            previous_snapshot = cls.__last_snapshot
+            cls.__last_snapshot = snapshot
+            cls.__last_snapshot_at = time.time()
+        if not previous_snapshot:
+            return []
+
+        growth = []
+        for stat in snapshot.compare_to(previous_snapshot, key_type="lineno")[:TOP_GROWTH_COUNT]:
+            frame = stat.traceback[0]
+            growth.append(
+                {
+                    "location": f"{frame.filename}:{frame.lineno}",
+                    "size_bytes": stat.size,
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                }
+            )
+        with cls.__lock:
+            cls.__last_growth = growth
+        return growth
+
+    @classmethod
+    def get_sessions(cls) -> List[Dict[str, Any]]:
+        with cls.__lock:
+            return [
+                {"session": session_id[:8], "page": memory.page_name, "bytes": sum(memory.key_sizes.values())}
+                for session_id, memory in sorted(cls.__sessions.items(), key=lambda item: -sum(item[1].key_sizes.values()))
+            ]
+
+    @classmethod
+    def get_largest_values(cls, count: int = 20) -> List[Dict[str, Any]]:
+        with cls.__lock:
+            values = [
+                {"session": session_id[:8], "key": key, "type": memory.key_descriptions[key], "bytes": size}
+                for session_id, memory in cls.__sessions.items()
+                for key, size in memory.key_sizes.items()
+            ]
+        return sorted(values, key=lambda value: -value["bytes"])[:count]
+
+    @classmethod
+    def get_bytes_by_key(cls) -> List[Dict[str, Any]]:
+        totals: Dict[str, int] = {}
+        with cls.__lock:
+            for memory in cls.__sessions.values():
+                for key, size in memory.key_sizes.items():
+                    totals[key] = totals.get(key, 0) + size
+        return [{"key": key, "bytes": size} for key, size in sorted(totals.items(), key=lambda item: -item[1])]
+
+    @classmethod
+    def get_visits(cls) -> List[Dict[str, Any]]:
+        with cls.__lock:
+            return list(cls.__visits)
+
+    @classmethod
+    def get_last_growth(cls) -> List[Dict[str, Any]]:
+        with cls.__lock:
+            return list(cls.__last_growth)
+
+    @staticmethod
+    def __describe(value: Any) -> str:
+        if isinstance(value, np.ndarray):
+            return f"ndarray {value.dtype} {value.shape}"
+        if isinstance(value, (list, tuple, dict, set)):
+            return f"{type(value).__name__} of {len(value)}"
+        return type(value).__name__
+
+    @classmethod
+    def __purge_expired_sessions(cls) -> None:
+        expired_before = time.time() - SESSION_TTL_SECONDS
+        for session_id, memory in list(cls.__sessions.items()):
+            if memory.updated_at < expired_before:
+                del cls.__sessions[session_id]
@@ -0,0 +1,278 @@
+from collections import deque
+from contextlib import contextmanager
+import functools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import sys
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple, TypeVar
+
+import numpy as np
+
+from handlers.tracing_handler import TracingHandler
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+RATE_BUCKETS = (1.0, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0, math.inf)
+GAUGE_TTL_SECONDS = 60 * 60
+RECENT_SAMPLE_COUNT = 256
+
+F = TypeVar("F", bound=Callable[..., Any])
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent_samples: Deque[Tuple[float, float]] = deque(maxlen=RECENT_SAMPLE_COUNT)
+
+    def observe(self, value: float) -> None:
+        self.recent_samples.append((time.perf_counter(), value))
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.bucket_counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates the q-quantile as the upper bound of the bucket it falls in.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative_count = 0
+        for upper_bound, bucket_count in zip(self.buckets, self.bucket_counts):
+            cumulative_count += bucket_count
+            if cumulative_count >= rank:
+                return upper_bound
+        return self.buckets[-1]
+
+
+class MetricsHandler:
+    __lock = threading.Lock()
+    __counters: Dict[Tuple[str, Labels], float] = {}
+    __histograms: Dict[Tuple[str, Labels], Histogram] = {}
+    __gauges: Dict[Tuple[str, Labels], Tuple[float, float]] = {}
+    __exporter: Optional[ThreadingHTTPServer] = None
+
+    @classmethod
+    def increment(cls, name: str, value: float = 1.0, labels: Optional[Dict[str, str]] = None) -> None:
+        key = (name, cls.__to_labels(labels=labels))
+        with cls.__lock:
+            cls.__counters[key] = cls.__counters.get(key, 0.0) + value
+
+    @classmethod
+    def observe(cls, name: str, value: float, labels: Optional[Dict[str, str]] = None, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        key = (name, cls.__to_labels(labels=labels))
+        with cls.__lock:
+            histogram = cls.__histograms.get(key)
+            if not histogram:
+                histogram = cls.__histograms[key] = Histogram(buckets=buckets)
+            histogram.observe(value=value)
+
+    @classmethod
+    def set_gauge(cls, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        key = (name, cls.__to_labels(labels=labels))
+        with cls.__lock:
+            cls.__gauges[key] = (value, time.time())
+
+    @classmethod
+    def get_recent_quantile(cls, name: str, q: float, window_seconds: float, labels: Optional[Dict[str, str]] = None) -> Optional[float]:
+        """
+        Returns the exact q-quantile of the samples observed within the last window_seconds across every label set that includes labels, or None if there are none.
+        Unlike the cumulative buckets, this follows the current load.
+        """
+        values = cls.__get_recent_values(name=name, window_seconds=window_seconds, labels=labels)
+        if not values:
+            return None
+        return float(np.quantile(values, q))
+
+    @classmethod
+    def get_recent_count(cls, name: str, window_seconds: float, labels: Optional[Dict[str, str]] = None) -> int:
+        return len(cls.__get_recent_values(name=name, window_seconds=window_seconds, labels=labels))
+
+    @classmethod
+    @contextmanager
+    def measure(cls, handler: str, method: str) -> Iterator[None]:
+        labels = {"handler": handler, "method": method}
+        start_time = time.perf_counter()
+        try:
+            with TracingHandler.span(name=f"{handler}.{method}"):
+                yield
+        except Exception as e:
+            cls.increment(name="handler_errors_total", labels={**labels, "error_type": type(e).__name__})
+            raise
+        finally:
+            cls.increment(name="handler_calls_total", labels=labels)
+            cls.observe(name="handler_latency_seconds", value=time.perf_counter() - start_time, labels=labels)
+
+    @classmethod
+    def measured(cls, func: F) -> F:
+        handler, _, method = func.__qualname__.rpartition(".")
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with cls.measure(handler=handler, method=method):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    @classmethod
+    def record_bytes(cls, handler: str, method: str, request_bytes: int = 0, response_bytes: int = 0) -> None:
+        labels = {"handler": handler, "method": method}
+        cls.increment(name="handler_request_bytes_total", value=request_bytes, labels=labels)
+        cls.increment(name="handler_response_bytes_total", value=response_bytes, labels=labels)
+
+    @classmethod
+    def record_stream(
+        cls,
+        handler: str,
+        method: str,
+        start_time: float,
+        first_token_time: Optional[float],
+        token_count: int,
+        extra_labels: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        Records time to first token and generation speed of a streamed answer. Each streamed chunk is counted as one token.
+        """
+        if first_token_time is None:
+            return
+        labels = {"handler": handler, "method": method, **(extra_labels or {})}
+        cls.observe(name="handler_time_to_first_token_seconds", value=first_token_time - start_time, labels=labels)
+        generation_seconds = time.perf_counter() - first_token_time
+        if token_count > 1 and generation_seconds > 0:
+            cls.observe(name="handler_tokens_per_second", value=(token_count - 1) / generation_seconds, labels=labels, buckets=RATE_BUCKETS)
+
+    @classmethod
+    def estimate_size(cls, value: Any) -> int:
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return len(value)
+        if isinstance(value, str):
+            return len(value.encode())
+        if isinstance(value, dict):
+            return sum(cls.estimate_size(value=item) for item in value.values())
+        if isinstance(value, (list, tuple, set)):
+            return sum(cls.estimate_size(value=item) for item in value)
+        return sys.getsizeof(value)
+
+    @classmethod
+    def to_dict(cls) -> Dict[str, List[Dict[str, Any]]]:
+        with cls.__lock:
+            cls.__purge_expired_gauges()
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in cls.__counters.items()],
+                "gauges": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), (value, _) in cls.__gauges.items()],
+                "histograms": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "p50": histogram.quantile(q=0.5),
+                        "p95": histogram.quantile(q=0.95),
+                        "buckets": {str(upper_bound): count for upper_bound, count in zip(histogram.buckets, histogram.bucket_counts)},
+                    }
+                    for (name, labels), histogram in cls.__histograms.items()
+                ],
+            }
+
+    @classmethod
+    def to_prometheus_text(cls) -> str:
+        lines = []
+        with cls.__lock:
+            cls.__purge_expired_gauges()
+            typed_names = set()
+            for (name, labels), value in sorted(cls.__counters.items()):
+                cls.__append_type_line(lines=lines, typed_names=typed_names, name=name, metric_type="counter")
+                lines.append(f"{name}{cls.__format_labels(labels=labels)} {value}")
+            for (name, labels), (value, _) in sorted(cls.__gauges.items()):
+                cls.__append_type_line(lines=lines, typed_names=typed_names, name=name, metric_type="gauge")
+                lines.append(f"{name}{cls.__format_labels(labels=labels)} {value}")
+            for (name, labels), histogram in sorted(cls.__histograms.items(), key=lambda item: item[0]):
+                cls.__append_type_line(lines=lines, typed_names=typed_names, name=name, metric_type="histogram")
+                cumulative_count = 0
+                for upper_bound, bucket_count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative_count += bucket_count
+                    bucket_labels = labels + (("le", "+Inf" if math.isinf(upper_bound) else str(upper_bound)),)
+                    lines.append(f"{name}_bucket{cls.__format_labels(labels=bucket_labels)} {cumulative_count}")
+                lines.append(f"{name}_sum{cls.__format_labels(labels=labels)} {histogram.sum}")
+                lines.append(f"{name}_count{cls.__format_labels(labels=labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def start_exporter(cls, port: int) -> None:
+        """
+        Serves /metrics (Prometheus text) and /metrics.json from a daemon thread. Safe to call on every script run.
+        """
+        with cls.__lock:
+            if cls.__exporter:
+                return
+            cls.__exporter = ThreadingHTTPServer(("0.0.0.0", port), MetricsRequestHandler)
+        threading.Thread(target=cls.__exporter.serve_forever, name="MetricsExporter", daemon=True).start()
+
+    @classmethod
+    def __get_recent_values(cls, name: str, window_seconds: float, labels: Optional[Dict[str, str]]) -> List[float]:
+        observed_after = time.perf_counter() - window_seconds
+        label_items = set((labels or {}).items())
+        with cls.__lock:
+            return [
+                value
+                for (histogram_name, histogram_labels), histogram in cls.__histograms.items()
+                if histogram_name == name and label_items <= set(histogram_labels)
+                for observed_at, value in histogram.recent_samples
+                if observed_at >= observed_after
+            ]
+
+    @staticmethod
+    def __append_type_line(lines: List[str], typed_names: Set[str], name: str, metric_type: str) -> None:
+        if name not in typed_names:
+            typed_names.add(name)
+            lines.append(f"# TYPE {name} {metric_type}")
+
+    @staticmethod
+    def __to_labels(labels: Optional[Dict[str, str]]) -> Labels:
+        return tuple(sorted((labels or {}).items()))
+
+    @staticmethod
+    def __format_labels(labels: Labels) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+    @classmethod
+    def __purge_expired_gauges(cls) -> None:
+        expired_before = time.time() - GAUGE_TTL_SECONDS
+        for key, (_, updated_at) in list(cls.__gauges.items()):
+            if updated_at < expired_before:
+                del cls.__gauges[key]
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path == "/metrics":
+            body = MetricsHandler.to_prometheus_text().encode()
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body = json.dumps(MetricsHandler.to_dict()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
@@ -0,0 +1,188 @@
+from collections import deque
+from contextlib import contextmanager
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from enums.chatgpt_enum import AiModelEnum
+from enums.scheduler_enum import LoadLevelEnum
+from handlers.metrics_handler import MetricsHandler
+
+
+DECISION_LOG_PATH = "./.cache/model_router_decisions.jsonl"
+MAX_DECISION_LOG_BYTES = 10 * 1024 * 1024
+DECISION_LOG_BACKUP_COUNT = 5
+RECENT_DECISION_COUNT = 200
+STATS_WINDOW_SECONDS = 10 * 60
+MIN_STATS_SAMPLES = 3
+MAX_ERROR_RATE = 0.3
+MESSAGE_OVERHEAD_TOKENS = 4
+RESPONSE_TOKEN_RESERVE = 1000
+COMPLEX_PROMPT_TOKENS = 500
+FAST_MODELS = (AiModelEnum.GPT35_TURBO_1106, AiModelEnum.GPT35_TURBO, AiModelEnum.GPT35_TURBO_16K)
+CAPABLE_MODELS = (AiModelEnum.GPT4_1106_PREVIEW, AiModelEnum.GPT4)
+CONTEXT_TOKENS = {
+    AiModelEnum.GPT4_1106_PREVIEW: 128000,
+    AiModelEnum.GPT4: 8192,
+    AiModelEnum.GPT35_TURBO_1106: 16385,
+    AiModelEnum.GPT35_TURBO: 4096,
+    AiModelEnum.GPT35_TURBO_16K: 16385,
+}
+COMPLEX_PROMPT_PATTERN = re.compile(
+    r"```|\b(prove|derive|analy[sz]e|compare|design|debug|refactor|optimi[sz]e|step by step|trade-?offs?)\b|証明|分析|比較|設計|最適化",
+    flags=re.IGNORECASE,
+)
+
+
+class ModelRouterHandler:
+    """
+    Resolves AiModelEnum.AUTO to a concrete model for each request.
+    Short and simple prompts go to the fast models, complex ones to the capable models, and a conversation too long for a tier escalates to one whose context fits.
+    Within a tier, models with a high recent error rate are skipped, and the one with the lowest recent time to first token wins. Models without recent samples count as fastest, so each gets measured.
+    Under load, complex prompts stay on the fast models unless the context does not fit them.
+    Every decision is logged with its measured latency to DECISION_LOG_PATH, so the rules can be tuned against it. The log is rotated at MAX_DECISION_LOG_BYTES.
+    """
+
+    __lock = threading.Lock()
+    __recent_decisions: Deque[Dict[str, Any]] = deque(maxlen=RECENT_DECISION_COUNT)
+    __logger: Optional[logging.Logger] = None
+
+    @classmethod
+    @contextmanager
+    def route(
+        cls,
+        prompt: str,
+        chat_history: List[Any],
+        model_type: AiModelEnum,
+        load_level: LoadLevelEnum = LoadLevelEnum.NORMAL,
+    ) -> Iterator[AiModelEnum]:
+        """
+        Yields model_type as it is unless it is AUTO. For AUTO, yields the chosen model and records the decision with the latency and outcome of the block.
+        """
+        if model_type != AiModelEnum.AUTO:
+            yield model_type
+            return
+
+        decision = cls.decide(prompt=prompt, chat_history=chat_history, load_level=load_level)
+        start_time = time.perf_counter()
+        is_error = True
+        try:
+            yield AiModelEnum[decision["model"]]
+            is_error = False
+        finally:
+            decision["latency_seconds"] = time.perf_counter() - start_time
+            decision["is_error"] = is_error
+            cls.__record(decision=decision)
+
+    @classmethod
+    def decide(cls, prompt: str, chat_history: List[Any], load_level: LoadLevelEnum = LoadLevelEnum.NORMAL) -> Dict[str, Any]:
+        prompt_tokens = cls.estimate_tokens(text=prompt) + MESSAGE_OVERHEAD_TOKENS
+        estimated_tokens = prompt_tokens + sum(cls.estimate_tokens(text=str(chat.get("content") or "")) + MESSAGE_OVERHEAD_TOKENS for chat in chat_history)
+        is_complex = prompt_tokens >= COMPLEX_PROMPT_TOKENS or bool(COMPLEX_PROMPT_PATTERN.search(prompt))
+        model_stats = {model_type: cls.get_model_stats(model_type=model_type) for model_type in FAST_MODELS + CAPABLE_MODELS}
+
+        if is_complex and load_level == LoadLevelEnum.NORMAL:
+            tiers, reason = (CAPABLE_MODELS, FAST_MODELS), "complex_prompt"
+        else:
+            tiers, reason = (FAST_MODELS, CAPABLE_MODELS), "busy" if is_complex else "simple_prompt"
+        model_type, is_escalated = cls.__choose(tiers=tiers, needed_tokens=estimated_tokens + RESPONSE_TOKEN_RESERVE, model_stats=model_stats)
+        if is_escalated:
+            reason = "long_context"
+
+        return {
+            "time": time.time(),
+            "model": model_type.name,
+            "reason": reason,
+            "prompt_tokens": prompt_tokens,
+            "estimated_tokens": estimated_tokens,
+            "is_complex": is_complex,
+            "load_level": load_level.name,
+            "model_stats": {stats_model_type.name: stats for stats_model_type, stats in model_stats.items()},
+        }
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """
+        Estimates about four ASCII characters per token and one token per other character, which is close enough for Japanese and English prompts.
+        """
+        ascii_length = len(text.encode("ascii", errors="ignore"))
+        return math.ceil(ascii_length / 4) + len(text) - ascii_length
+
+    @staticmethod
+    def get_model_stats(model_type: AiModelEnum) -> Dict[str, Any]:
+        labels = {"model": model_type.name}
+        sample_count = MetricsHandler.get_recent_count(name="chatgpt_model_latency_seconds", window_seconds=STATS_WINDOW_SECONDS, labels=labels)
+        error_count = MetricsHandler.get_recent_count(
+            name="chatgpt_model_latency_seconds",
+            window_seconds=STATS_WINDOW_SECONDS,
+            labels={**labels, "outcome": "error"},
+        )
+        first_token_seconds = MetricsHandler.get_recent_quantile(
+            name="handler_time_to_first_token_seconds",
+            q=0.5,
+            window_seconds=STATS_WINDOW_SECONDS,
+            labels=labels,
+        )
+        return {
+            "sample_count": sample_count,
+            "error_rate": error_count / sample_count if sample_count else 0.0,
+            "first_token_seconds": first_token_seconds,
+        }
+
+    @classmethod
+    def get_recent_decisions(cls) -> List[Dict[str, Any]]:
+        with cls.__lock:
+            return list(cls.__recent_decisions)
+
+    @staticmethod
+    def __choose(
+        tiers: Tuple[Tuple[AiModelEnum, ...], ...],
+        needed_tokens: int,
+        model_stats: Dict[AiModelEnum, Dict[str, Any]],
+    ) -> Tuple[AiModelEnum, bool]:
+        """
+        Returns the chosen model and whether it had to leave the first tier because no model there fits the context.
+        """
+        for tier_index, tier in enumerate(tiers):
+            fitting_models = [model_type for model_type in tier if CONTEXT_TOKENS[model_type] >= needed_tokens]
+            if not fitting_models:
+                continue
+            healthy_models = [
+                model_type
+                for model_type in fitting_models
+                if model_stats[model_type]["sample_count"] < MIN_STATS_SAMPLES or model_stats[model_type]["error_rate"] < MAX_ERROR_RATE
+            ] or fitting_models
+            chosen_model = min(healthy_models, key=lambda model_type: model_stats[model_type]["first_token_seconds"] or 0.0)
+            return chosen_model, tier_index > 0
+        # Nothing fits, so the largest context is the best that can be done.
+        return max(CONTEXT_TOKENS, key=CONTEXT_TOKENS.__getitem__), True
+
+    @classmethod
+    def __record(cls, decision: Dict[str, Any]) -> None:
+        labels = {"model": decision["model"], "reason": decision["reason"]}
+        MetricsHandler.increment(name="model_router_decisions_total", labels=labels)
+        MetricsHandler.observe(name="model_router_latency_seconds", value=decision["latency_seconds"], labels=labels)
+        with cls.__lock:
+            cls.__recent_decisions.append(decision)
+        cls.__get_logger().info(json.dumps(decision, ensure_ascii=False))
+
+    @classmethod
+    def __get_logger(cls) -> logging.Logger:
+        with cls.__lock:
+            if cls.__logger:
+                return cls.__logger
+            os.makedirs(os.path.dirname(DECISION_LOG_PATH), exist_ok=True)
+            file_handler = RotatingFileHandler(DECISION_LOG_PATH, maxBytes=MAX_DECISION_LOG_BYTES, backupCount=DECISION_LOG_BACKUP_COUNT, encoding="utf-8")
+            file_handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("ModelRouterHandler")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(file_handler)
+            cls.__logger = logger
+            return logger
@@ -0,0 +1,34 @@
+import hashlib
+import re
+import uuid
+
+from openai import OpenAI
+
+from handlers.api_key_handler import ApiKeyHandler
+from handlers.query_params_handler import QueryParamsHandler
+from handlers.scheduler_handler import SchedulerHandler
+
+
+OWNER_TOKEN_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+class OwnerHandler:
+    """
+    Tells apart whose stored conversations and indexes a session may see.
+    A user's own API key identifies them. Everyone on the server default API key shares that key, so they are told apart by a random token kept in the page URL.
+    The URL then works like a bookmark of the user's history, and sharing it shares the history.
+    """
+
+    @staticmethod
+    def get_owner_id(client: OpenAI) -> str:
+        """
+        Must be called from the script thread, because it reads and sets the query params.
+        """
+        if not SchedulerHandler.is_scheduled(client=client):
+            return ApiKeyHandler.get_key_hash(client=client)
+
+        owner_token = QueryParamsHandler.get(name="owner")
+        if not (owner_token and OWNER_TOKEN_PATTERN.fullmatch(owner_token)):
+            owner_token = uuid.uuid4().hex
+            QueryParamsHandler.update(owner=owner_token)
+        return hashlib.sha256(f"owner:{owner_token}".encode()).hexdigest()
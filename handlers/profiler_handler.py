@@ -0,0 +1,70 @@
+import cProfile
+from contextlib import contextmanager
+import os
+import pstats
+import time
+from typing import Any, Dict, Iterator, List
+import uuid
+
+
+PROFILE_DIRECTORY = "./.cache/profiles"
+MAX_PROFILE_FILES = 200
+TOP_FUNCTION_COUNT = 15
+
+
+class ProfilerHandler:
+    @classmethod
+    @contextmanager
+    def profile(cls, label: str) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Profiles the calling thread and dumps the result to PROFILE_DIRECTORY.
+        The yielded list is filled with the top functions by cumulative time when the block exits, even on reruns.
+        """
+        top_functions: List[Dict[str, Any]] = []
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield top_functions
+        finally:
+            profiler.disable()
+            cls.__dump(profiler=profiler, label=label)
+            top_functions.extend(cls.get_top_functions(profiler=profiler))
+
+    @staticmethod
+    def get_top_functions(profiler: cProfile.Profile, count: int = TOP_FUNCTION_COUNT) -> List[Dict[str, Any]]:
+        stats = pstats.Stats(profiler).sort_stats(pstats.SortKey.CUMULATIVE)
+        top_functions = []
+        for func in stats.fcn_list[:count]:  # type: ignore
+            _, call_count, total_time, cumulative_time, _ = stats.stats[func]  # type: ignore
+            file_name, line_number, function_name = func
+            top_functions.append(
+                {
+                    "function": f"{function_name} ({ProfilerHandler.__shorten_path(path=file_name)}:{line_number})",
+                    "calls": call_count,
+                    "cumulative_ms": cumulative_time * 1000,
+                    "own_ms": total_time * 1000,
+                }
+            )
+        return top_functions
+
+    @staticmethod
+    def __shorten_path(path: str) -> str:
+        _, separator, package_path = path.rpartition("site-packages" + os.sep)
+        if separator:
+            return package_path
+        if path.startswith(os.getcwd()):
+            return os.path.relpath(path)
+        return path
+
+    @staticmethod
+    def __dump(profiler: cProfile.Profile, label: str) -> None:
+        os.makedirs(PROFILE_DIRECTORY, exist_ok=True)
+        file_name = f"{time.strftime('%Y%m%d-%H%M%S')}_{label}_{uuid.uuid4().hex[:8]}.prof"
+        profiler.dump_stats(os.path.join(PROFILE_DIRECTORY, file_name))
+
+        profile_files = sorted(os.listdir(PROFILE_DIRECTORY))
+        for old_file_name in profile_files[:-MAX_PROFILE_FILES]:
+            try:
+                os.remove(os.path.join(PROFILE_DIRECTORY, old_file_name))
+            except FileNotFoundError:
+                pass
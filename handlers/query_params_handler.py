@@ -0,0 +1,23 @@
+from typing import Optional
+
+import streamlit as st
+
+
+class QueryParamsHandler:
+    @staticmethod
+    def get(name: str) -> Optional[str]:
+        values = st.experimental_get_query_params().get(name)
+        return values[0] if values else None
+
+    @staticmethod
+    def update(**params: Optional[str]) -> None:
+        """
+        Sets or, for None, removes the given query params while keeping the others.
+        """
+        query_params = st.experimental_get_query_params()
+        for name, value in params.items():
+            if value is None:
+                query_params.pop(name, None)
+            else:
+                query_params[name] = [value]
+        st.experimental_set_query_params(**query_params)
@@ -0,0 +1,21 @@
+import threading
+from typing import Dict
+
+
+class RerunStatsHandler:
+    __lock = threading.Lock()
+    __stats: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def record_run(cls, page_name: str, duration_seconds: float, is_rerun_requested: bool) -> None:
+        with cls.__lock:
+            stats = cls.__stats.setdefault(page_name, {"runs": 0, "reruns": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stats["runs"] += 1
+            stats["reruns"] += int(is_rerun_requested)
+            stats["total_seconds"] += duration_seconds
+            stats["max_seconds"] = max(stats["max_seconds"], duration_seconds)
+
+    @classmethod
+    def get_stats(cls, page_name: str) -> Dict[str, float]:
+        with cls.__lock:
+            return dict(cls.__stats.get(page_name, {"runs": 0, "reruns": 0, "total_seconds": 0.0, "max_seconds": 0.0}))
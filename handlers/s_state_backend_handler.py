@@ -0,0 +1,247 @@
+import abc
+from contextlib import contextmanager
+from enum import Enum
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import struct
+import time
+from typing import Any, Dict, Iterator, List, Optional
+import uuid
+
+import numpy as np
+import streamlit as st
+
+from enums.env_enum import EnvEnum
+from enums.s_state_enum import SStateBackendEnum
+from handlers.metrics_handler import MetricsHandler
+from handlers.query_params_handler import QueryParamsHandler
+
+
+STATE_DATABASE_PATH = "./.cache/s_states.sqlite3"
+STATE_ID_QUERY_PARAM = "state"
+STATE_TTL_SECONDS = 7 * 24 * 60 * 60
+SESSION_KEY = "_SStateBackend_Session"
+SERIALIZED_MAGIC = b"SST1"
+HEADER_LENGTH_FORMAT = "<I"
+
+
+class SStateSerializer:
+    """
+    Serializes a state value to a JSON header followed by raw buffers. bytes and ndarrays are written as they are in memory, and decoded ndarrays are views into the loaded blob.
+    Only plain data, enums from enums/, bytes and ndarrays are accepted, so loading a value never runs code.
+    """
+
+    @classmethod
+    def dumps(cls, value: Any) -> bytes:
+        buffers: List[memoryview] = []
+        header = json.dumps({"value": cls.__encode(value=value, buffers=buffers), "buffers": [buffer.nbytes for buffer in buffers]}, separators=(",", ":"))
+        header_bytes = header.encode()
+        return b"".join([SERIALIZED_MAGIC, struct.pack(HEADER_LENGTH_FORMAT, len(header_bytes)), header_bytes, *buffers])
+
+    @classmethod
+    def loads(cls, data: bytes) -> Any:
+        if data[: len(SERIALIZED_MAGIC)] != SERIALIZED_MAGIC:
+            raise ValueError("Not a serialized state value")
+        (header_length,) = struct.unpack_from(HEADER_LENGTH_FORMAT, data, len(SERIALIZED_MAGIC))
+        offset = len(SERIALIZED_MAGIC) + struct.calcsize(HEADER_LENGTH_FORMAT)
+        header = json.loads(data[offset : offset + header_length])
+        offset += header_length
+
+        data_view = memoryview(data)
+        buffers = []
+        for length in header["buffers"]:
+            buffers.append(data_view[offset : offset + length])
+            offset += length
+        return cls.__decode(item=header["value"], buffers=buffers)
+
+    @classmethod
+    def __encode(cls, value: Any, buffers: List[memoryview]) -> Any:
+        if value is None or isinstance(value, (bool, int, float, str)) and not isinstance(value, Enum):
+            return value
+        if isinstance(value, Enum):
+            return {"__enum__": f"{type(value).__module__}:{type(value).__qualname__}", "name": value.name}
+        if isinstance(value, (bytes, bytearray)):
+            buffers.append(memoryview(value))
+            return {"__bytes__": len(buffers) - 1, "is_mutable": isinstance(value, bytearray)}
+        if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+            array = np.ascontiguousarray(value)
+            buffers.append(memoryview(array.reshape(-1).view(np.uint8)))
+            return {"__ndarray__": len(buffers) - 1, "dtype": array.dtype.str, "shape": list(array.shape)}
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, list):
+            return [cls.__encode(value=item, buffers=buffers) for item in value]
+        if isinstance(value, tuple):
+            return {"__tuple__": [cls.__encode(value=item, buffers=buffers) for item in value]}
+        if isinstance(value, dict):
+            return {"__dict__": [[cls.__encode(value=key, buffers=buffers), cls.__encode(value=item, buffers=buffers)] for key, item in value.items()]}
+        raise TypeError(f"Unsupported state value type: {type(value).__name__}")
+
+    @classmethod
+    def __decode(cls, item: Any, buffers: List[memoryview]) -> Any:
+        if isinstance(item, list):
+            return [cls.__decode(item=element, buffers=buffers) for element in item]
+        if not isinstance(item, dict):
+            return item
+        if "__dict__" in item:
+            return {cls.__decode(item=key, buffers=buffers): cls.__decode(item=value, buffers=buffers) for key, value in item["__dict__"]}
+        if "__tuple__" in item:
+            return tuple(cls.__decode(item=element, buffers=buffers) for element in item["__tuple__"])
+        if "__bytes__" in item:
+            buffer = buffers[item["__bytes__"]]
+            return bytearray(buffer) if item["is_mutable"] else bytes(buffer)
+        if "__ndarray__" in item:
+            return np.frombuffer(buffers[item["__ndarray__"]], dtype=np.dtype(item["dtype"])).reshape(item["shape"])
+        if "__enum__" in item:
+            module_name, class_name = item["__enum__"].split(":")
+            if not module_name.startswith("enums."):
+                raise ValueError(f"Enums are only loaded from the enums package: {module_name}")
+            enum = importlib.import_module(module_name)
+            for name in class_name.split("."):
+                enum = getattr(enum, name)
+            return enum[item["name"]]
+        raise ValueError(f"Unknown serialized item: {item}")
+
+
+class SStateBackend(abc.ABC):
+    @abc.abstractmethod
+    def get(self, name: str) -> Any:
+        """
+        This method should return the stored value, or raise KeyError if there is none.
+        """
+        raise NotImplementedError("Subclasses must implement this method")
+
+    @abc.abstractmethod
+    def set(self, name: str, value: Any) -> None:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def flush(self) -> None:
+        """
+        Called at the end of every run.
+        """
+
+
+class MemorySStateBackend(SStateBackend):
+    def get(self, name: str) -> Any:
+        return st.session_state[name]
+
+    def set(self, name: str, value: Any) -> None:
+        st.session_state[name] = value
+
+
+class SqliteSStateBackend(SStateBackend):
+    """
+    Uses st.session_state as a write-behind cache of a SQLite store that every server process shares.
+    A session is identified by the state query param, so a reload, another worker process or a restarted server resumes the same state.
+    Values are loaded on the session's first access. Values read or set during a run are written back once at its end, and only if their serialized form changed,
+    which also catches lists and dicts that were changed in place.
+    Values that cannot be serialized, such as the OpenAI client, stay in the process.
+    """
+
+    def get(self, name: str) -> Any:
+        session = self.__get_session()
+        value = st.session_state[name]
+        session["touched_names"].add(name)
+        return value
+
+    def set(self, name: str, value: Any) -> None:
+        session = self.__get_session()
+        st.session_state[name] = value
+        session["touched_names"].add(name)
+
+    def flush(self) -> None:
+        session = st.session_state.get(SESSION_KEY)
+        if not session or not session["touched_names"]:
+            return
+
+        start_time = time.perf_counter()
+        now = time.time()
+        rows = []
+        for name in session["touched_names"]:
+            if name not in st.session_state:
+                continue
+            try:
+                data = SStateSerializer.dumps(value=st.session_state[name])
+            except TypeError:
+                continue
+            digest = self.__digest(data=data)
+            if session["digests"].get(name) == digest:
+                continue
+            session["digests"][name] = digest
+            rows.append((session["state_id"], name, data, now))
+        session["touched_names"].clear()
+
+        if rows:
+            with self.__connect() as connection:
+                connection.executemany("INSERT OR REPLACE INTO s_states (state_id, name, value, updated_at) VALUES (?, ?, ?, ?)", rows)
+        MetricsHandler.increment(name="s_state_backend_writes_total", value=len(rows))
+        MetricsHandler.observe(name="s_state_backend_flush_seconds", value=time.perf_counter() - start_time)
+
+    def __get_session(self) -> Dict[str, Any]:
+        session = st.session_state.get(SESSION_KEY)
+        if session:
+            return session
+
+        state_id = QueryParamsHandler.get(name=STATE_ID_QUERY_PARAM)
+        if not state_id:
+            state_id = uuid.uuid4().hex
+            QueryParamsHandler.update(**{STATE_ID_QUERY_PARAM: state_id})
+        session = {"state_id": state_id, "digests": {}, "touched_names": set()}
+        st.session_state[SESSION_KEY] = session
+
+        with self.__connect() as connection:
+            connection.execute("DELETE FROM s_states WHERE updated_at < ?", (time.time() - STATE_TTL_SECONDS,))
+            rows = connection.execute("SELECT name, value FROM s_states WHERE state_id = ?", (state_id,)).fetchall()
+        for name, data in rows:
+            if name in st.session_state:
+                continue
+            try:
+                st.session_state[name] = SStateSerializer.loads(data=data)
+            except (ValueError, KeyError, ImportError, AttributeError):
+                continue
+            session["digests"][name] = self.__digest(data=data)
+        MetricsHandler.increment(name="s_state_backend_loads_total", value=len(rows))
+        return session
+
+    @staticmethod
+    def __digest(data: bytes) -> str:
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    @staticmethod
+    @contextmanager
+    def __connect() -> Iterator[sqlite3.Connection]:
+        os.makedirs(os.path.dirname(STATE_DATABASE_PATH), exist_ok=True)
+        connection = sqlite3.connect(STATE_DATABASE_PATH, timeout=30, isolation_level=None)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS s_states (state_id TEXT NOT NULL, name TEXT NOT NULL, value BLOB NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (state_id, name)) WITHOUT ROWID"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS s_states_updated_at ON s_states (updated_at)")
+            connection.execute("BEGIN IMMEDIATE")
+            yield connection
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+
+class SStateBackendHandler:
+    __backend: Optional[SStateBackend] = None
+
+    @classmethod
+    def get_backend(cls) -> SStateBackend:
+        if cls.__backend is None:
+            backend_type = SStateBackendEnum(EnvEnum.S_STATE_BACKEND.value or SStateBackendEnum.MEMORY.value)
+            cls.__backend = SqliteSStateBackend() if backend_type == SStateBackendEnum.SQLITE else MemorySStateBackend()
+        return cls.__backend
+
+    @classmethod
+    def flush(cls) -> None:
+        cls.get_backend().flush()
@@ -0,0 +1,207 @@
+from contextlib import contextmanager
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from openai import OpenAI
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from enums.env_enum import EnvEnum
+from enums.scheduler_enum import SchedulerLaneEnum
+from handlers.metrics_handler import MetricsHandler
+
+
+MAX_CONCURRENT_REQUESTS = 8
+MAX_BATCH_REQUESTS = 6
+MAX_SESSION_REQUESTS = 2
+POSITION_REFRESH_SECONDS = 0.5
+
+
+class Ticket:
+    def __init__(self, session_id: str, lane: SchedulerLaneEnum, virtual_finish: float, start_func: Callable[["Ticket"], None], parallelism: int) -> None:
+        self.session_id = session_id
+        self.lane = lane
+        self.parallelism = parallelism
+        self.virtual_finish = virtual_finish
+        self.start_func = start_func
+        self.enqueued_at = time.perf_counter()
+        self.is_granted = False
+        self.is_released = False
+
+
+class SchedulerHandler:
+    """
+    Shares the upstream capacity of the server default API key between sessions.
+    Interactive requests always go first, and batch jobs may only use MAX_BATCH_REQUESTS of the MAX_CONCURRENT_REQUESTS slots, so chats never wait behind a batch.
+    Within a lane, sessions are served by self-clocked weighted fair queuing: each request advances its session's virtual time by its cost,
+    so a session that queues many expensive jobs waits behind light users instead of in front of them. No session runs more than MAX_SESSION_REQUESTS at once.
+    A ticket for a job that sends several upstream requests at once takes that many slots, so the caps count requests rather than jobs.
+    Requests with the user's own API key are not scheduled.
+    """
+
+    __lock = threading.Lock()
+    __waiting: Dict[SchedulerLaneEnum, List[Ticket]] = {lane: [] for lane in SchedulerLaneEnum}
+    __running_counts: Dict[SchedulerLaneEnum, int] = {lane: 0 for lane in SchedulerLaneEnum}
+    __session_running_counts: Dict[str, int] = {}
+    __virtual_times: Dict[SchedulerLaneEnum, float] = {lane: 0.0 for lane in SchedulerLaneEnum}
+    __session_virtual_finishes: Dict[Tuple[SchedulerLaneEnum, str], float] = {}
+
+    @staticmethod
+    def is_scheduled(client: Optional[OpenAI]) -> bool:
+        default_openai_apikey = EnvEnum.DEFAULT_OPENAI_APIKEY.value
+        return bool(client and default_openai_apikey and client.api_key == default_openai_apikey)
+
+    @staticmethod
+    def get_max_parallelism(lane: SchedulerLaneEnum) -> int:
+        return min(MAX_SESSION_REQUESTS, MAX_BATCH_REQUESTS if lane == SchedulerLaneEnum.BATCH else MAX_CONCURRENT_REQUESTS)
+
+    @classmethod
+    def get_parallelism(cls, client: Optional[OpenAI], lane: SchedulerLaneEnum, parallelism: int) -> int:
+        """
+        Returns how many upstream requests a job may send at once. Scheduled jobs are limited to what one ticket can hold.
+        """
+        if not cls.is_scheduled(client=client):
+            return parallelism
+        return max(1, min(parallelism, cls.get_max_parallelism(lane=lane)))
+
+    @staticmethod
+    def get_session_id() -> str:
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx else "background"
+
+    @classmethod
+    def enqueue(
+        cls,
+        lane: SchedulerLaneEnum,
+        cost: float,
+        start_func: Callable[[Ticket], None],
+        session_id: Optional[str] = None,
+        parallelism: int = 1,
+    ) -> Ticket:
+        """
+        Queues a request. start_func is called with the ticket once it may run, and the caller must release the ticket when it finishes.
+        parallelism is how many upstream requests the caller sends at once, as returned by get_parallelism.
+        """
+        session_id = session_id or cls.get_session_id()
+        parallelism = max(1, min(parallelism, cls.get_max_parallelism(lane=lane)))
+        with cls.__lock:
+            session_key = (lane, session_id)
+            virtual_start = max(cls.__virtual_times[lane], cls.__session_virtual_finishes.get(session_key, 0.0))
+            ticket = Ticket(session_id=session_id, lane=lane, virtual_finish=virtual_start + cost, start_func=start_func, parallelism=parallelism)
+            cls.__session_virtual_finishes[session_key] = ticket.virtual_finish
+            cls.__waiting[lane].append(ticket)
+            granted_tickets = cls.__dispatch()
+        cls.__start(tickets=granted_tickets)
+        return ticket
+
+    @classmethod
+    def release(cls, ticket: Ticket) -> None:
+        with cls.__lock:
+            if ticket.is_released:
+                return
+            ticket.is_released = True
+            if not ticket.is_granted:
+                cls.__waiting[ticket.lane].remove(ticket)
+                cls.__update_queue_depth()
+                return
+            cls.__running_counts[ticket.lane] -= ticket.parallelism
+            cls.__session_running_counts[ticket.session_id] -= ticket.parallelism
+            if not cls.__session_running_counts[ticket.session_id]:
+                del cls.__session_running_counts[ticket.session_id]
+            granted_tickets = cls.__dispatch()
+        cls.__start(tickets=granted_tickets)
+
+    @classmethod
+    def get_position(cls, ticket: Ticket) -> int:
+        """
+        Returns how many queued requests are expected to start before this one, or 0 once it started.
+        """
+        with cls.__lock:
+            if ticket.is_granted or ticket.is_released:
+                return 0
+            return sum(
+                1
+                for lane in SchedulerLaneEnum
+                for waiting_ticket in cls.__waiting[lane]
+                if (waiting_ticket.lane.value, waiting_ticket.virtual_finish) < (ticket.lane.value, ticket.virtual_finish)
+            )
+
+    @classmethod
+    def get_queue_depth(cls, lane: Optional[SchedulerLaneEnum] = None) -> int:
+        with cls.__lock:
+            return sum(len(cls.__waiting[waiting_lane]) for waiting_lane in SchedulerLaneEnum if lane in (None, waiting_lane))
+
+    @classmethod
+    @contextmanager
+    def slot(
+        cls,
+        client: OpenAI,
+        lane: SchedulerLaneEnum,
+        cost: float,
+        display_func: Callable[[int], None] = print,
+        parallelism: int = 1,
+    ) -> Iterator[None]:
+        """
+        Blocks until the request may run, reporting the queue position through display_func while it waits.
+        """
+        if not cls.is_scheduled(client=client):
+            yield
+            return
+
+        is_granted = threading.Event()
+        ticket = cls.enqueue(lane=lane, cost=cost, start_func=lambda _: is_granted.set(), parallelism=parallelism)
+        try:
+            while not is_granted.wait(timeout=POSITION_REFRESH_SECONDS):
+                display_func(cls.get_position(ticket=ticket) + 1)
+            yield
+        finally:
+            cls.release(ticket=ticket)
+
+    @classmethod
+    def __dispatch(cls) -> List[Ticket]:
+        granted_tickets = []
+        while sum(cls.__running_counts.values()) < MAX_CONCURRENT_REQUESTS:
+            ticket = cls.__pick_next()
+            # The next ticket waits for enough free slots rather than letting narrower ones overtake it.
+            if not ticket or sum(cls.__running_counts.values()) + ticket.parallelism > MAX_CONCURRENT_REQUESTS:
+                break
+            cls.__waiting[ticket.lane].remove(ticket)
+            ticket.is_granted = True
+            cls.__running_counts[ticket.lane] += ticket.parallelism
+            cls.__session_running_counts[ticket.session_id] = cls.__session_running_counts.get(ticket.session_id, 0) + ticket.parallelism
+            cls.__virtual_times[ticket.lane] = ticket.virtual_finish
+            MetricsHandler.observe(name="scheduler_wait_seconds", value=time.perf_counter() - ticket.enqueued_at, labels={"lane": ticket.lane.name})
+            granted_tickets.append(ticket)
+        cls.__forget_idle_sessions()
+        cls.__update_queue_depth()
+        return granted_tickets
+
+    @classmethod
+    def __pick_next(cls) -> Optional[Ticket]:
+        for lane in SchedulerLaneEnum:
+            eligible_tickets = [
+                ticket
+                for ticket in cls.__waiting[lane]
+                if cls.__session_running_counts.get(ticket.session_id, 0) + ticket.parallelism <= MAX_SESSION_REQUESTS
+                and (lane != SchedulerLaneEnum.BATCH or cls.__running_counts[lane] + ticket.parallelism <= MAX_BATCH_REQUESTS)
+            ]
+            if eligible_tickets:
+                return min(eligible_tickets, key=lambda ticket: ticket.virtual_finish)
+        return None
+
+    @classmethod
+    def __forget_idle_sessions(cls) -> None:
+        # A session whose virtual finish is behind the lane's virtual time would start at the virtual time anyway.
+        for session_key, virtual_finish in list(cls.__session_virtual_finishes.items()):
+            if virtual_finish <= cls.__virtual_times[session_key[0]]:
+                del cls.__session_virtual_finishes[session_key]
+
+    @classmethod
+    def __update_queue_depth(cls) -> None:
+        for lane in SchedulerLaneEnum:
+            MetricsHandler.set_gauge(name="scheduler_queue_depth", value=len(cls.__waiting[lane]), labels={"lane": lane.name})
+
+    @staticmethod
+    def __start(tickets: List[Ticket]) -> None:
+        for ticket in tickets:
+            ticket.start_func(ticket)
@@ -0,0 +1,112 @@
+import contextvars
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from openai import OpenAI
+
+from handlers.metrics_handler import MetricsHandler
+
+
+T = TypeVar("T")
+
+
+class Flight:
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        self.updates: List[Any] = []
+        self.is_done = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlightHandler:
+    """
+    Shares one upstream call between concurrent identical requests. Every caller gets the same result, or the same updates in the same order for streams.
+    The upstream call runs on its own thread, apart from every session's UI, so one session stopping or rerunning does not end the others' requests.
+    Finished flights are forgotten, so this never serves a stale answer.
+    """
+
+    __lock = threading.Lock()
+    __flights: Dict[str, Flight] = {}
+
+    @classmethod
+    def make_key(cls, client: OpenAI, operation: str, **params: Any) -> str:
+        request = {
+            # Requests are only shared between sessions using the same API key and endpoint.
+            "api_key": hashlib.sha256(str(client.api_key).encode()).hexdigest(),
+            "base_url": str(client.base_url),
+            "operation": operation,
+            "params": cls.__normalize(value=params),
+        }
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+    @classmethod
+    def do(cls, key: str, operation: str, func: Callable[[], T]) -> T:
+        return cls.do_streaming(key=key, operation=operation, func=lambda _: func(), on_update=lambda _: None)
+
+    @classmethod
+    def do_streaming(cls, key: str, operation: str, func: Callable[[Callable[[Any], None]], T], on_update: Callable[[Any], None]) -> T:
+        """
+        The first caller starts func with a publish callback. Every published update is passed to on_update of each caller, the first one included.
+        The flight keeps every update until it ends, so publish deltas rather than the whole value so far.
+        """
+        with cls.__lock:
+            flight = cls.__flights.get(key)
+            is_leader = flight is None
+            if flight is None:
+                flight = cls.__flights[key] = Flight()
+        MetricsHandler.increment(name="single_flight_requests_total", labels={"operation": operation, "role": "leader" if is_leader else "follower"})
+
+        if is_leader:
+            # The copied context keeps the upstream call in the first caller's trace.
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(cls.__run, key, flight, func), name=f"SingleFlight:{operation}", daemon=True).start()
+        cls.__follow(flight=flight, on_update=on_update)
+
+        if flight.error:
+            raise flight.error
+        return flight.result
+
+    @classmethod
+    def __run(cls, key: str, flight: Flight, func: Callable[[Callable[[Any], None]], Any]) -> None:
+        def publish(update: Any) -> None:
+            with flight.condition:
+                flight.updates.append(update)
+                flight.condition.notify_all()
+
+        try:
+            flight.result = func(publish)
+        except BaseException as e:
+            flight.error = e
+        finally:
+            with cls.__lock:
+                del cls.__flights[key]
+            with flight.condition:
+                flight.is_done = True
+                flight.condition.notify_all()
+
+    @staticmethod
+    def __follow(flight: Flight, on_update: Callable[[Any], None]) -> None:
+        delivered_count = 0
+        while True:
+            with flight.condition:
+                flight.condition.wait_for(lambda: flight.is_done or len(flight.updates) > delivered_count)
+                updates = flight.updates[delivered_count:]
+                is_done = flight.is_done
+            for update in updates:
+                on_update(update)
+            delivered_count += len(updates)
+            if is_done and delivered_count == len(flight.updates):
+                break
+
+    @classmethod
+    def __normalize(cls, value: Any) -> Any:
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, dict):
+            return {key: cls.__normalize(value=item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [cls.__normalize(value=item) for item in value]
+        return value
@@ -1,21 +1,47 @@
 from openai import OpenAI
 
-from enums.speech_generation_enum import VoiceEnum
+from enums.speech_generation_enum import AiModelEnum, VoiceEnum, FormatEnum
+from handlers.metrics_handler import MetricsHandler
+from handlers.single_flight_handler import SingleFlightHandler
+
+
+MIME_TYPES = {
+    FormatEnum.MP3: "audio/mpeg",
+    FormatEnum.OPUS: "audio/ogg",
+    FormatEnum.AAC: "audio/aac",
+    FormatEnum.FLAC: "audio/flac",
+}
 
 
 class SpeechGenerationHandler:
     @staticmethod
+    @MetricsHandler.measured
     def generate_speech(
         client: OpenAI,
         prompt: str,
+        model_type: AiModelEnum = AiModelEnum.TTS_1,
         voice_type: VoiceEnum = VoiceEnum.ALLOY,
+        format_type: FormatEnum = FormatEnum.MP3,
     ) -> bytes:
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice=voice_type.value,
-            input=prompt,
+        request = {
+            "model": model_type.value,
+            "voice": voice_type.value,
+            "input": prompt,
+            "response_format": format_type.value,
+        }
+        speech_bytes = SingleFlightHandler.do(
+            key=SingleFlightHandler.make_key(client=client, operation="audio.speech.create", **request),
+            operation="audio.speech.create",
+            func=lambda: b"".join(client.audio.speech.create(**request).iter_bytes()),
+        )
+        MetricsHandler.record_bytes(
+            handler="SpeechGenerationHandler",
+            method="generate_speech",
+            request_bytes=len(prompt.encode()),
+            response_bytes=len(speech_bytes),
         )
-        speech_bytes = bytes()
-        for data in response.iter_bytes():
-            speech_bytes += data
         return speech_bytes
+
+    @staticmethod
+    def get_mime_type(format_type: FormatEnum) -> str:
+        return MIME_TYPES[format_type]
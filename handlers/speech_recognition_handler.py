@@ -1,20 +1,137 @@
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import unicodedata
 
 from openai import OpenAI
 
 from enums.speech_recognition_enum import LanguageEnum
+from handlers.audio_handler import AudioHandler
+from handlers.metrics_handler import MetricsHandler
+
+
+WHISPER_MODEL = "whisper-1"
+SEGMENT_SECONDS = 120
+OVERLAP_SECONDS = 3
+MAX_SEGMENT_BYTES = 24 * 1024 * 1024
+MAX_WORKERS = 4
+PROMPT_TAIL_CHARS = 200
+STITCH_WINDOW_CHARS = 200
+STITCH_MIN_MATCH_CHARS = 8
 
 
 class SpeechRecognitionHandler:
     @staticmethod
+    @MetricsHandler.measured
     def recognize_speech(
         client: OpenAI,
         speech_file: Any,
         language_type: LanguageEnum = LanguageEnum.JAPANESE,
+        prompt: Optional[str] = None,
     ) -> str:
         transcript = client.audio.transcriptions.create(
-            model="whisper-1",
+            model=WHISPER_MODEL,
             language=language_type.value,
             file=speech_file,
+            prompt=prompt or "",
+        )
+        MetricsHandler.record_bytes(
+            handler="SpeechRecognitionHandler",
+            method="recognize_speech",
+            request_bytes=SpeechRecognitionHandler.get_file_size(speech_file=speech_file),
+            response_bytes=len(transcript.text.encode()),
         )
         return transcript.text
+
+    @classmethod
+    @MetricsHandler.measured
+    def recognize_long_speech(
+        cls,
+        client: OpenAI,
+        speech_bytes: bytes,
+        language_type: LanguageEnum = LanguageEnum.JAPANESE,
+        display_func: Callable[[str], None] = print,
+        max_workers: int = MAX_WORKERS,
+    ) -> str:
+        segments = AudioHandler.split_wav_bytes(
+            wav_bytes=speech_bytes,
+            segment_seconds=SEGMENT_SECONDS,
+            overlap_seconds=OVERLAP_SECONDS,
+            max_segment_bytes=MAX_SEGMENT_BYTES,
+        )
+
+        transcripts: Dict[int, str] = {}
+        stitched_count = 0
+        stitched_transcript = ""
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            running: Dict[Future, int] = {}
+            next_index = 0
+            while next_index < len(segments) or running:
+                while next_index < len(segments) and len(running) < max_workers:
+                    # The previous segment's text is only available when it finished before this one was submitted.
+                    previous_transcript = transcripts.get(next_index - 1, "")
+                    future = executor.submit(
+                        cls.recognize_speech,
+                        client=client,
+                        speech_file=(f"segment_{next_index}.wav", segments[next_index]),
+                        language_type=language_type,
+                        prompt=previous_transcript[-PROMPT_TAIL_CHARS:],
+                    )
+                    running[future] = next_index
+                    next_index += 1
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    transcripts[running.pop(future)] = future.result()
+
+                while stitched_count in transcripts:
+                    stitched_transcript = cls.__stitch_transcripts(
+                        former=stitched_transcript,
+                        latter=transcripts[stitched_count],
+                        language_type=language_type,
+                    )
+                    stitched_count += 1
+                display_func(stitched_transcript)
+        return stitched_transcript
+
+    @staticmethod
+    def get_file_size(speech_file: Any) -> int:
+        if isinstance(speech_file, tuple):
+            return len(speech_file[1])
+        if hasattr(speech_file, "size"):
+            return speech_file.size
+        return 0
+
+    @classmethod
+    def __stitch_transcripts(cls, former: str, latter: str, language_type: LanguageEnum) -> str:
+        former = former.strip()
+        latter = latter.strip()
+        if not former or not latter:
+            return former or latter
+
+        # Whisper transcribes the same audio with different case, punctuation and cut-off words at segment edges, so the texts are compared without them.
+        # Only text heard in both segments is dropped, so the overlap has to be a suffix of the former and a prefix of the latter.
+        # A match elsewhere in the windows would cut real text out of one of them.
+        normalized_former, former_positions = cls.__normalize_for_stitch(text=former)
+        normalized_latter, latter_positions = cls.__normalize_for_stitch(text=latter)
+        max_overlap = min(len(normalized_former), len(normalized_latter), STITCH_WINDOW_CHARS)
+        for overlap in range(max_overlap, STITCH_MIN_MATCH_CHARS - 1, -1):
+            if normalized_former.endswith(normalized_latter[:overlap]):
+                # The former's trailing punctuation is dropped, since the latter heard how the sentence goes on.
+                return former[: former_positions[-1] + 1] + latter[latter_positions[overlap - 1] + 1 :]
+
+        separator = " " if language_type == LanguageEnum.ENGLISH else ""
+        return former + separator + latter
+
+    @staticmethod
+    def __normalize_for_stitch(text: str) -> Tuple[str, List[int]]:
+        """
+        Returns the case-folded letters and digits of text, and the position in text each of them came from.
+        """
+        normalized_chars: List[str] = []
+        positions: List[int] = []
+        for position, char in enumerate(text):
+            for normalized_char in unicodedata.normalize("NFKC", char).casefold():
+                if normalized_char.isalnum():
+                    normalized_chars.append(normalized_char)
+                    positions.append(position)
+        return "".join(normalized_chars), positions
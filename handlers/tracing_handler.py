@@ -0,0 +1,273 @@
+from contextlib import contextmanager
+import contextvars
+import functools
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+import uuid
+
+import httpx
+
+from enums.env_enum import EnvEnum
+
+
+TRACE_LOG_PATH = "./.cache/traces/traces.jsonl"
+MAX_TRACE_LOG_BYTES = 10 * 1024 * 1024
+TRACE_LOG_BACKUP_COUNT = 5
+DEFAULT_TRACE_SAMPLE_RATE = 0.0
+DEFAULT_TRACE_SLOW_SECONDS = 5.0
+# The same defaults the openai package uses for its own HTTP client.
+HTTP_TIMEOUT = httpx.Timeout(timeout=600.0, connect=5.0)
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+C = TypeVar("C", bound=type)
+
+
+class Trace:
+    def __init__(self, is_head_sampled: bool) -> None:
+        self.trace_id = uuid.uuid4().hex
+        self.is_head_sampled = is_head_sampled
+        self.open_count = 0
+        self.has_error = False
+        self.finished_spans: List[Dict[str, Any]] = []
+
+
+class Span:
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> None:
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_time = time.time()
+        self.start_counter = time.perf_counter()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def mark_failed(self) -> None:
+        """
+        Keeps the trace even if the failure is handled further up, such as a rejected API key.
+        """
+        self.trace.has_error = True
+
+
+class DetachedSpan:
+    """
+    A place in a trace that work started on another thread, possibly after the trace's root span ended, is attached to.
+    """
+
+    def __init__(self, trace: Trace, parent_id: str, name: str) -> None:
+        self.trace = trace
+        self.parent_id = parent_id
+        self.name = name
+        self.detached_counter = time.perf_counter()
+
+
+class TracingHandler:
+    """
+    Records a trace of spans per submit. Spans of a trace are buffered until all of them, including detached background work, have ended.
+    The trace is then written to TRACE_LOG_PATH as one JSON line per span if it was head sampled (TRACE_SAMPLE_RATE), was slower than TRACE_SLOW_SECONDS or failed,
+    so slow requests can always be broken down afterwards while ordinary ones cost only memory.
+    Outside a trace, spans are no-ops.
+    """
+
+    __lock = threading.Lock()
+    __current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("TracingHandler_current_span", default=None)
+    __logger: Optional[logging.Logger] = None
+
+    @classmethod
+    @contextmanager
+    def trace(cls, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        Opens a new trace, or a child span if a trace is already active.
+        """
+        parent_span = cls.__current_span.get()
+        if parent_span:
+            with cls.__open_span(trace=parent_span.trace, name=name, parent_id=parent_span.span_id, attributes=attributes) as span:
+                yield span
+            return
+
+        sample_rate = float(EnvEnum.TRACE_SAMPLE_RATE.value or DEFAULT_TRACE_SAMPLE_RATE)
+        trace = Trace(is_head_sampled=random.random() < sample_rate)
+        with cls.__open_span(trace=trace, name=name, parent_id=None, attributes=attributes) as span:
+            yield span
+
+    @classmethod
+    @contextmanager
+    def span(cls, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        parent_span = cls.__current_span.get()
+        if not parent_span:
+            yield None
+            return
+        with cls.__open_span(trace=parent_span.trace, name=name, parent_id=parent_span.span_id, attributes=attributes) as span:
+            yield span
+
+    @classmethod
+    def traced(cls, func: Callable[..., Any]) -> Callable[..., Any]:
+        name = f"{func.__module__.rpartition('.')[2]}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not cls.__current_span.get():
+                return func(*args, **kwargs)
+            with cls.span(name=name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    @classmethod
+    def traced_root(cls, func: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Opens a trace for every call, such as a component's submit.
+        """
+        name = f"{func.__module__.rpartition('.')[2]}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with cls.trace(name=name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    @classmethod
+    def traced_class(cls, target: C) -> C:
+        """
+        Wraps every static and class method defined on the class in a span, so each OnSubmitHandler step shows up in the trace.
+        """
+        for attribute_name, attribute in list(vars(target).items()):
+            if attribute_name.startswith("__"):
+                continue
+            if isinstance(attribute, staticmethod):
+                setattr(target, attribute_name, staticmethod(cls.traced(func=attribute.__func__)))
+            elif isinstance(attribute, classmethod):
+                setattr(target, attribute_name, classmethod(cls.traced(func=attribute.__func__)))
+        return target
+
+    @classmethod
+    def detach(cls, name: str) -> Optional[DetachedSpan]:
+        """
+        Keeps the current trace open for work that runs later on another thread. The work must run inside attach with the returned value.
+        """
+        parent_span = cls.__current_span.get()
+        if not parent_span:
+            return None
+        with cls.__lock:
+            parent_span.trace.open_count += 1
+        return DetachedSpan(trace=parent_span.trace, parent_id=parent_span.span_id, name=name)
+
+    @classmethod
+    @contextmanager
+    def attach(cls, detached_span: Optional[DetachedSpan]) -> Iterator[None]:
+        if not detached_span:
+            yield
+            return
+        try:
+            with cls.__open_span(
+                trace=detached_span.trace,
+                name=detached_span.name,
+                parent_id=detached_span.parent_id,
+                attributes={"wait_ms": (time.perf_counter() - detached_span.detached_counter) * 1000},
+            ):
+                yield
+        finally:
+            cls.__close_trace_reference(trace=detached_span.trace)
+
+    @classmethod
+    def make_http_client(cls) -> httpx.Client:
+        """
+        Returns an HTTP client for OpenAI whose requests are recorded as spans, timed up to the response headers.
+        """
+        return httpx.Client(transport=TracingTransport(limits=HTTP_LIMITS), timeout=HTTP_TIMEOUT, follow_redirects=True)
+
+    @classmethod
+    @contextmanager
+    def __open_span(cls, trace: Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> Iterator[Span]:
+        span = Span(trace=trace, name=name, parent_id=parent_id, attributes=attributes)
+        with cls.__lock:
+            trace.open_count += 1
+        token = cls.__current_span.set(span)
+        error_type = None
+        try:
+            yield span
+        except BaseException as e:
+            error_type = type(e).__name__
+            raise
+        finally:
+            cls.__current_span.reset(token)
+            duration_seconds = time.perf_counter() - span.start_counter
+            with cls.__lock:
+                trace.finished_spans.append(
+                    {
+                        "trace_id": trace.trace_id,
+                        "span_id": span.span_id,
+                        "parent_id": span.parent_id,
+                        "name": span.name,
+                        "start_time": span.start_time,
+                        "duration_ms": duration_seconds * 1000,
+                        "status": "error" if error_type else "ok",
+                        "error_type": error_type,
+                        "attributes": span.attributes,
+                    }
+                )
+                # Exceptions caught by a caller, such as a failed form validation, are part of normal operation. Only a failing root fails the trace.
+                trace.has_error = trace.has_error or (error_type is not None and span.parent_id is None)
+            cls.__close_trace_reference(trace=trace)
+
+    @classmethod
+    def __close_trace_reference(cls, trace: Trace) -> None:
+        with cls.__lock:
+            trace.open_count -= 1
+            if trace.open_count:
+                return
+            # Background work attached after the root ended is waited for by the user as well, so the trace is measured from its first start to its last end.
+            slow_seconds = float(EnvEnum.TRACE_SLOW_SECONDS.value or DEFAULT_TRACE_SLOW_SECONDS)
+            first_start = min(finished_span["start_time"] for finished_span in trace.finished_spans)
+            last_end = max(finished_span["start_time"] + finished_span["duration_ms"] / 1000 for finished_span in trace.finished_spans)
+            is_kept = trace.is_head_sampled or trace.has_error or last_end - first_start >= slow_seconds
+            finished_spans, trace.finished_spans = trace.finished_spans, []
+        if is_kept:
+            cls.__write(spans=finished_spans)
+
+    @classmethod
+    def __write(cls, spans: List[Dict[str, Any]]) -> None:
+        logger = cls.__get_logger()
+        for span in spans:
+            logger.info(json.dumps(span, ensure_ascii=False, default=str))
+
+    @classmethod
+    def __get_logger(cls) -> logging.Logger:
+        with cls.__lock:
+            if cls.__logger:
+                return cls.__logger
+            os.makedirs(os.path.dirname(TRACE_LOG_PATH), exist_ok=True)
+            file_handler = RotatingFileHandler(TRACE_LOG_PATH, maxBytes=MAX_TRACE_LOG_BYTES, backupCount=TRACE_LOG_BACKUP_COUNT, encoding="utf-8")
+            file_handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("TracingHandler")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(file_handler)
+            cls.__logger = logger
+            return logger
+
+
+class TracingTransport(httpx.HTTPTransport):
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        with TracingHandler.span(name=f"HTTP {request.method} {request.url.path}", host=request.url.host) as span:
+            try:
+                response = super().handle_request(request)
+            except httpx.TransportError:
+                if span:
+                    span.mark_failed()
+                raise
+            if span:
+                span.set_attribute("status_code", response.status_code)
+                span.set_attribute("request_bytes", int(request.headers.get("content-length", 0)))
+                if response.is_error:
+                    span.mark_failed()
+            return response
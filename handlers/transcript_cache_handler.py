@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator, Optional
+
+from enums.speech_recognition_enum import LanguageEnum
+from handlers.metrics_handler import MetricsHandler
+
+
+CACHE_PATH = "./.cache/transcripts.sqlite3"
+MAX_ENTRIES = 1000
+TTL_SECONDS = 30 * 24 * 60 * 60
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class TranscriptCacheHandler:
+    __lock = threading.Lock()
+
+    @staticmethod
+    def make_key(speech_bytes: bytes, language_type: LanguageEnum, model: str, is_preprocessed: bool = False) -> str:
+        hasher = hashlib.sha256()
+        view = memoryview(speech_bytes)
+        for start in range(0, len(view), HASH_CHUNK_BYTES):
+            hasher.update(view[start : start + HASH_CHUNK_BYTES])
+        variant = "preprocessed" if is_preprocessed else "original"
+        return f"{model}:{language_type.value}:{variant}:{hasher.hexdigest()}"
+
+    @classmethod
+    def get(cls, key: str) -> Optional[str]:
+        now = time.time()
+        with cls.__lock, cls.__connect() as connection:
+            row = connection.execute("SELECT transcript, created_at FROM transcripts WHERE key = ?", (key,)).fetchone()
+            if not row:
+                MetricsHandler.increment(name="cache_misses_total", labels={"cache": "transcript"})
+                return None
+            transcript, created_at = row
+            if now - created_at > TTL_SECONDS:
+                connection.execute("DELETE FROM transcripts WHERE key = ?", (key,))
+                MetricsHandler.increment(name="cache_misses_total", labels={"cache": "transcript"})
+                return None
+            connection.execute("UPDATE transcripts SET accessed_at = ? WHERE key = ?", (now, key))
+            MetricsHandler.increment(name="cache_hits_total", labels={"cache": "transcript"})
+            return transcript
+
+    @classmethod
+    def set(cls, key: str, transcript: str) -> None:
+        now = time.time()
+        with cls.__lock, cls.__connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO transcripts (key, transcript, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, transcript, now, now),
+            )
+            connection.execute("DELETE FROM transcripts WHERE created_at < ?", (now - TTL_SECONDS,))
+            connection.execute(
+                "DELETE FROM transcripts WHERE key NOT IN (SELECT key FROM transcripts ORDER BY accessed_at DESC LIMIT ?)",
+                (MAX_ENTRIES,),
+            )
+
+    @staticmethod
+    @contextmanager
+    def __connect() -> Iterator[sqlite3.Connection]:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        connection = sqlite3.connect(CACHE_PATH)
+        try:
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS transcripts (key TEXT PRIMARY KEY, transcript TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                yield connection
+        finally:
+            connection.close()
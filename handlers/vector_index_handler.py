@@ -0,0 +1,253 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, so msvcrt locks the lock file instead.
+    fcntl = None
+    import msvcrt
+
+from handlers.metrics_handler import MetricsHandler
+
+
+INDEX_DIRECTORY = "./.cache/vector_indexes"
+IVF_MIN_VECTORS = 20000
+IVF_RETRAIN_GROWTH = 2.0
+IVF_TRAINING_SAMPLES_PER_LIST = 64
+IVF_TRAINING_ITERATIONS = 10
+IVF_MIN_PROBES = 8
+IVF_PROBE_RATIO = 0.1
+SEARCH_BATCH_ROWS = 65536
+MAX_CACHED_INDEXES = 64
+
+
+class VectorIndex:
+    """
+    Append-only index of unit-normalized float32 vectors in one contiguous memory-mapped file, with one JSON metadata line per vector.
+    Small indexes are searched exactly. From IVF_MIN_VECTORS on, an IVF partitioning is trained and only the lists closest to the query are scanned,
+    together with the vectors added since training.
+    Several processes may share the files. Appends hold an exclusive lock on a lock file, and every read first picks up the lines other processes appended.
+    Files that are rewritten rather than appended to are written aside and moved into place, so no process reads them half-written.
+    The IVF partitioning is trained on a snapshot of the rows without holding either lock, and only moved into place under them.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.lock = threading.RLock()
+        self.__vectors_path = os.path.join(directory, "vectors.f32")
+        self.__metadata_path = os.path.join(directory, "metadata.jsonl")
+        self.__info_path = os.path.join(directory, "index.json")
+        self.__ivf_path = os.path.join(directory, "ivf.npz")
+        self.__lock_path = os.path.join(directory, "index.lock")
+
+        self.dimensions: Optional[int] = None
+        self.metadata: List[Dict[str, Any]] = []
+        self.__metadata_bytes = 0
+        self.__vectors: Optional[np.memmap] = None
+        self.__ivf: Optional[Dict[str, np.ndarray]] = None
+        self.__ivf_mtime = 0.0
+        self.__is_training = False
+        with self.lock:
+            self.sync()
+
+    def __len__(self) -> int:
+        with self.lock:
+            self.sync()
+            return len(self.metadata)
+
+    def sync(self) -> None:
+        """
+        Reads what other processes appended since the last sync. Callers must hold lock.
+        """
+        if self.dimensions is None and os.path.exists(self.__info_path):
+            with open(self.__info_path) as f:
+                self.dimensions = json.load(f)["dimensions"]
+
+        if os.path.exists(self.__metadata_path) and os.path.getsize(self.__metadata_path) > self.__metadata_bytes:
+            with open(self.__metadata_path, "rb") as f:
+                f.seek(self.__metadata_bytes)
+                appended = f.read()
+            # A line that another process is still writing is picked up by a later sync.
+            complete_length = appended.rfind(b"\n") + 1
+            self.metadata.extend(json.loads(line) for line in appended[:complete_length].decode().splitlines() if line.strip())
+            self.__metadata_bytes += complete_length
+            self.__vectors = None
+
+        if os.path.exists(self.__ivf_path) and os.path.getmtime(self.__ivf_path) != self.__ivf_mtime:
+            self.__ivf_mtime = os.path.getmtime(self.__ivf_path)
+            self.__ivf = dict(np.load(self.__ivf_path))
+
+    def add(self, vectors: np.ndarray, metadata: List[Dict[str, Any]]) -> None:
+        vectors = self.__normalize(vectors=np.atleast_2d(vectors))
+        # Created on the first add, so looking into an owner's empty index leaves nothing behind.
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock, self.__lock_files():
+            self.sync()
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+                with open(f"{self.__info_path}.tmp", "w") as f:
+                    json.dump({"dimensions": self.dimensions}, f)
+                os.replace(f"{self.__info_path}.tmp", self.__info_path)
+            if vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Expected {self.dimensions} dimensions, got {vectors.shape[1]}")
+
+            # Vectors are written before metadata, so a crash in between leaves unreferenced rows or half a metadata line.
+            # Holding the file lock after a sync, both can be cut off without losing rows that other processes appended.
+            self.__truncate(path=self.__metadata_path, size=self.__metadata_bytes)
+            self.__truncate(path=self.__vectors_path, size=len(self.metadata) * self.dimensions * 4)
+            with open(self.__vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            appended = "".join(json.dumps(item) + "\n" for item in metadata).encode()
+            with open(self.__metadata_path, "ab") as f:
+                f.write(appended)
+            self.metadata.extend(metadata)
+            self.__metadata_bytes += len(appended)
+            self.__vectors = None
+
+            trained_count = int(self.__ivf["trained_count"]) if self.__ivf else 0
+            is_training = not self.__is_training and len(self.metadata) >= IVF_MIN_VECTORS and len(self.metadata) >= trained_count * IVF_RETRAIN_GROWTH
+            if is_training:
+                self.__is_training = True
+                # Rows are only ever appended, so the memory map of the rows so far stays valid while others append.
+                vectors = self.__get_vectors()
+
+        if is_training:
+            try:
+                self.__swap_ivf(ivf=self.__train_ivf(vectors=vectors))
+            finally:
+                with self.lock:
+                    self.__is_training = False
+
+    def search(self, query_vector: np.ndarray, top_k: int = 5, probe_count: Optional[int] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        with self.lock:
+            self.sync()
+            if not self.metadata:
+                return []
+            vectors = self.__get_vectors()
+            ivf = self.__ivf
+            metadata = self.metadata
+        query_vector = self.__normalize(vectors=np.atleast_2d(query_vector))[0]
+
+        # Another process may have trained on rows this one has not read yet. Until it has, the search stays exact.
+        if ivf and int(ivf["trained_count"]) <= len(vectors):
+            candidate_ids = self.__get_ivf_candidates(ivf=ivf, query_vector=query_vector, probe_count=probe_count, vector_count=len(vectors))
+            scores = vectors[candidate_ids] @ query_vector
+        else:
+            candidate_ids = None
+            scores = np.concatenate([vectors[start : start + SEARCH_BATCH_ROWS] @ query_vector for start in range(0, len(vectors), SEARCH_BATCH_ROWS)])
+
+        top_k = min(top_k, len(scores))
+        top_positions = np.argpartition(-scores, top_k - 1)[:top_k]
+        top_positions = top_positions[np.argsort(-scores[top_positions])]
+        MetricsHandler.increment(name="vector_index_scanned_vectors_total", value=len(scores))
+        return [
+            (float(scores[position]), metadata[int(candidate_ids[position]) if candidate_ids is not None else int(position)])
+            for position in top_positions
+        ]
+
+    @contextmanager
+    def __lock_files(self) -> Iterator[None]:
+        with open(self.__lock_path, "a+b") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @staticmethod
+    def __truncate(path: str, size: int) -> None:
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            os.truncate(path, size)
+
+    def __get_vectors(self) -> np.memmap:
+        if self.__vectors is None:
+            self.__vectors = np.memmap(self.__vectors_path, dtype=np.float32, mode="r", shape=(len(self.metadata), self.dimensions))
+        return self.__vectors
+
+    @staticmethod
+    def __get_ivf_candidates(ivf: Dict[str, np.ndarray], query_vector: np.ndarray, probe_count: Optional[int], vector_count: int) -> np.ndarray:
+        centroid_scores = ivf["centroids"] @ query_vector
+        probe_count = probe_count or max(IVF_MIN_PROBES, int(len(centroid_scores) * IVF_PROBE_RATIO))
+        probed_lists = np.argsort(-centroid_scores)[:probe_count]
+        offsets = ivf["offsets"]
+        candidate_ids = [ivf["ids"][offsets[list_index] : offsets[list_index + 1]] for list_index in probed_lists]
+        # Vectors added after training are not in any list yet, so they are always scanned.
+        candidate_ids.append(np.arange(int(ivf["trained_count"]), vector_count))
+        return np.sort(np.concatenate(candidate_ids))
+
+    def __train_ivf(self, vectors: np.memmap) -> Dict[str, np.ndarray]:
+        list_count = int(np.sqrt(len(vectors)))
+        rng = np.random.default_rng(seed=0)
+        sample_count = min(len(vectors), list_count * IVF_TRAINING_SAMPLES_PER_LIST)
+        samples = np.asarray(vectors[np.sort(rng.choice(len(vectors), size=sample_count, replace=False))])
+
+        centroids = samples[rng.choice(len(samples), size=list_count, replace=False)]
+        for _ in range(IVF_TRAINING_ITERATIONS):
+            assignments = np.argmax(samples @ centroids.T, axis=1)
+            for list_index in range(list_count):
+                members = samples[assignments == list_index]
+                if len(members):
+                    centroids[list_index] = members.sum(axis=0)
+            centroids = self.__normalize(vectors=centroids)
+
+        assignments = np.concatenate(
+            [np.argmax(vectors[start : start + SEARCH_BATCH_ROWS] @ centroids.T, axis=1) for start in range(0, len(vectors), SEARCH_BATCH_ROWS)]
+        )
+        ids = np.argsort(assignments, kind="stable")
+        offsets = np.searchsorted(assignments[ids], np.arange(list_count + 1))
+        return {"centroids": centroids, "ids": ids, "offsets": offsets, "trained_count": np.array(len(vectors))}
+
+    def __swap_ivf(self, ivf: Dict[str, np.ndarray]) -> None:
+        temporary_path = f"{self.__ivf_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as f:
+            np.savez(f, **ivf)
+        with self.lock, self.__lock_files():
+            self.sync()
+            # Another process may have trained on more rows in the meantime.
+            if self.__ivf and int(self.__ivf["trained_count"]) >= int(ivf["trained_count"]):
+                os.remove(temporary_path)
+                return
+            os.replace(temporary_path, self.__ivf_path)
+            self.__ivf = ivf
+            self.__ivf_mtime = os.path.getmtime(self.__ivf_path)
+
+    @staticmethod
+    def __normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class VectorIndexHandler:
+    __lock = threading.Lock()
+    __indexes: "OrderedDict[Tuple[str, str], VectorIndex]" = OrderedDict()
+
+    @classmethod
+    def get_index(cls, name: str, owner_id: str) -> VectorIndex:
+        """
+        Returns the owner's index with this name, so no one searches another owner's vectors. See OwnerHandler for owner_id.
+        Sessions of the same owner share one memory map. The least recently used indexes are dropped beyond MAX_CACHED_INDEXES.
+        """
+        with cls.__lock:
+            index = cls.__indexes.get((name, owner_id))
+            if index is None:
+                index = cls.__indexes[(name, owner_id)] = VectorIndex(directory=os.path.join(INDEX_DIRECTORY, name, owner_id))
+            cls.__indexes.move_to_end((name, owner_id))
+            while len(cls.__indexes) > MAX_CACHED_INDEXES:
+                cls.__indexes.popitem(last=False)
+            return index
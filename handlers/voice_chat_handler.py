@@ -0,0 +1,130 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import re
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from openai import OpenAI
+
+from enums.chatgpt_enum import AiModelEnum as ChatModelEnum
+from enums.scheduler_enum import LoadLevelEnum
+from enums.speech_generation_enum import AiModelEnum as SpeechModelEnum, VoiceEnum, FormatEnum
+from enums.speech_recognition_enum import LanguageEnum
+from handlers.chatgpt_handler import ChatGptHandler
+from handlers.metrics_handler import MetricsHandler
+from handlers.model_router_handler import ModelRouterHandler
+from handlers.speech_generation_handler import SpeechGenerationHandler
+from handlers.speech_recognition_handler import SpeechRecognitionHandler
+
+
+SPEECH_MODEL = SpeechModelEnum.TTS_1
+SPEECH_FORMAT = FormatEnum.MP3
+MAX_SPEECH_WORKERS = 3
+MIN_SEGMENT_CHARS = 80
+SENTENCE_END_PATTERN = re.compile(r"[.!?]+[\"')\]]*\s+|[。！？]+[」』）]*\s*|\n+")
+
+
+class VoiceChatHandler:
+    """
+    Runs one voice chat turn as a pipeline: the transcript is answered as a stream, and each finished sentence is sent to TTS while the rest is still generated.
+    Speech segments are played in answer order as soon as they and all earlier segments are ready.
+    """
+
+    @classmethod
+    @MetricsHandler.measured
+    def talk(
+        cls,
+        client: OpenAI,
+        speech_file: Any,
+        chat_history: List[Any],
+        language_type: LanguageEnum = LanguageEnum.JAPANESE,
+        chat_model_type: ChatModelEnum = ChatModelEnum.GPT35_TURBO,
+        voice_type: VoiceEnum = VoiceEnum.ALLOY,
+        display_transcript_func: Callable[[str], None] = print,
+        display_answer_func: Callable[[str], None] = print,
+        play_speech_func: Callable[[bytes], None] = print,
+        load_level: LoadLevelEnum = LoadLevelEnum.NORMAL,
+        max_speech_workers: int = MAX_SPEECH_WORKERS,
+    ) -> Dict[str, Any]:
+        # The turn starts when the recording is submitted, which is as close to the end of speech as the page can observe.
+        end_of_speech_time = time.perf_counter()
+        transcript = SpeechRecognitionHandler.recognize_speech(client=client, speech_file=speech_file, language_type=language_type)
+        transcribed_time = time.perf_counter()
+        display_transcript_func(transcript)
+
+        first_token_time: Optional[float] = None
+        first_speech_time: Optional[float] = None
+        speech_segments: List[bytes] = []
+        pending: Deque[Future] = deque()
+        spoken_length = 0
+
+        with ThreadPoolExecutor(max_workers=max_speech_workers, thread_name_prefix="VoiceChatHandler") as executor:
+
+            def speak(text: str) -> None:
+                pending.append(
+                    executor.submit(
+                        SpeechGenerationHandler.generate_speech,
+                        client=client,
+                        prompt=text,
+                        model_type=SPEECH_MODEL,
+                        voice_type=voice_type,
+                        format_type=SPEECH_FORMAT,
+                    )
+                )
+
+            def play_ready_segments(is_blocking: bool) -> None:
+                nonlocal first_speech_time
+                while pending and (is_blocking or pending[0].done()):
+                    speech_bytes = pending.popleft().result()
+                    first_speech_time = first_speech_time or time.perf_counter()
+                    speech_segments.append(speech_bytes)
+                    play_speech_func(speech_bytes)
+
+            def display_answer(answer: str) -> None:
+                nonlocal first_token_time, spoken_length
+                first_token_time = first_token_time or time.perf_counter()
+                display_answer_func(answer)
+                # The first segment is a single sentence so audio starts early. Later ones are longer, which means fewer TTS requests.
+                segments, consumed_length = cls.__split_segments(text=answer[spoken_length:], is_answer_start=not spoken_length)
+                for segment in segments:
+                    speak(text=segment)
+                spoken_length += consumed_length
+                play_ready_segments(is_blocking=False)
+
+            # AUTO can only be routed here, once the transcript is known.
+            with ModelRouterHandler.route(prompt=transcript, chat_history=chat_history, model_type=chat_model_type, load_level=load_level) as routed_model_type:
+                answer = ChatGptHandler.query_answer_and_display_streamly(
+                    client=client,
+                    prompt=transcript,
+                    display_func=display_answer,
+                    chat_history=chat_history,
+                    model_type=routed_model_type,
+                )
+            if answer[spoken_length:].strip():
+                speak(text=answer[spoken_length:].strip())
+            play_ready_segments(is_blocking=True)
+
+        timings = {
+            "transcription_seconds": transcribed_time - end_of_speech_time,
+            "first_token_seconds": (first_token_time or transcribed_time) - end_of_speech_time,
+            "first_speech_seconds": (first_speech_time or time.perf_counter()) - end_of_speech_time,
+            "total_seconds": time.perf_counter() - end_of_speech_time,
+        }
+        MetricsHandler.observe(name="voice_chat_first_speech_seconds", value=timings["first_speech_seconds"])
+        return {"transcript": transcript, "answer": answer, "speech_segments": speech_segments, "timings": timings}
+
+    @staticmethod
+    def __split_segments(text: str, is_answer_start: bool) -> Tuple[List[str], int]:
+        """
+        Returns the complete sentences at the start of text, merged into segments of at least MIN_SEGMENT_CHARS, and the length they cover.
+        """
+        segments = []
+        segment_start = 0
+        for match in SENTENCE_END_PATTERN.finditer(text):
+            segment = text[segment_start : match.end()].strip()
+            is_first_segment = is_answer_start and not segments
+            if not segment or (len(segment) < MIN_SEGMENT_CHARS and not is_first_segment):
+                continue
+            segments.append(segment)
+            segment_start = match.end()
+        return segments, segment_start
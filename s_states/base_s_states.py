@@ -1,7 +1,7 @@
 from typing import TypeVar, Generic
 import abc
 
-import streamlit as st
+from handlers.s_state_backend_handler import SStateBackendHandler
 
 
 T = TypeVar("T")
@@ -27,15 +27,15 @@ class BaseSState(Generic[T], abc.ABC):
     @classmethod
     def get(cls) -> T:
         try:
-            return st.session_state[cls.get_name()]
+            return SStateBackendHandler.get_backend().get(name=cls.get_name())
         except KeyError:
             cls.reset()
-            return st.session_state[cls.get_name()]
+            return SStateBackendHandler.get_backend().get(name=cls.get_name())
 
     @classmethod
     def set(cls, value: T) -> None:
-        st.session_state[cls.get_name()] = value
+        SStateBackendHandler.get_backend().set(name=cls.get_name(), value=value)
 
     @classmethod
     def reset(cls) -> None:
-        st.session_state[cls.get_name()] = cls.get_default()
+        SStateBackendHandler.get_backend().set(name=cls.get_name(), value=cls.get_default())
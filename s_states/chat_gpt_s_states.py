@@ -1,11 +1,14 @@
-from copy import deepcopy
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 
 from enums.chatgpt_enum import AiModelEnum, SenderEnum
 from enums.s_state_enum import ChatGptSStateEnum
 from s_states.base_s_states import BaseSState
 
 
+RECENT_MESSAGE_COUNT = 30
+QUERY_MESSAGE_COUNT = 20
+
+
 class SubmitSState(BaseSState[bool]):
     @staticmethod
     def get_name() -> str:
@@ -36,28 +39,101 @@ class AiModelTypeSState(BaseSState[AiModelEnum]):
         return AiModelEnum.NONE
 
 
-class StoredHistorySState(BaseSState[List[Dict[str, str]]]):
+class ConversationIdSState(BaseSState[Optional[str]]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{ChatGptSStateEnum.CONVERSATION_ID}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> Optional[str]:
+        return None
+
+
+class HistoryLimitSState(BaseSState[int]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{ChatGptSStateEnum.HISTORY_LIMIT}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> int:
+        return RECENT_MESSAGE_COUNT
+
+
+class SearchResultSState(BaseSState[Dict[str, Any]]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{ChatGptSStateEnum.SEARCH_RESULT}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> Dict[str, Any]:
+        return {"query": "", "results": [], "embedding_ms": 0.0, "search_ms": 0.0}
+
+
+class DocumentModeSState(BaseSState[bool]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{ChatGptSStateEnum.DOCUMENT_MODE}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> bool:
+        return False
+
+
+class DocumentJobIdSState(BaseSState[Optional[str]]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{ChatGptSStateEnum.DOCUMENT_JOB_ID}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> Optional[str]:
+        return None
+
+
+class DocumentStatusSState(BaseSState[Optional[str]]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{ChatGptSStateEnum.DOCUMENT_STATUS}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> Optional[str]:
+        return None
+
+
+class StoredHistorySState(BaseSState[List[Dict[str, Any]]]):
+    """
+    Holds only the most recent messages of the conversation. The full conversation lives in ChatHistoryHandler.
+    """
+
     @staticmethod
     def get_name() -> str:
         return f"{ChatGptSStateEnum.STORED_HISTORY}".replace(".", "_")
 
     @staticmethod
-    def get_default() -> List[Dict[str, str]]:
+    def get_default() -> List[Dict[str, Any]]:
         return []
 
     @classmethod
-    def add(cls, sender_type: SenderEnum, sender_name: str, content: str) -> None:
-        cls.get().append(
+    def add(cls, sender_type: SenderEnum, sender_name: str, content: str, turn: int) -> None:
+        chats = cls.get()
+        chats.append(
             {
+                "turn": turn,
                 "role": sender_type.value,
                 "role_name": sender_name,
                 "content": content,
             }
         )
+        del chats[: -HistoryLimitSState.get()]
+
+    @classmethod
+    def prepend(cls, chats: List[Dict[str, Any]]) -> None:
+        cls.set(value=chats + cls.get())
+
+    @classmethod
+    def get_first_turn(cls) -> int:
+        chats = cls.get()
+        return chats[0]["turn"] if chats else 0
 
     @classmethod
     def get_for_query(cls) -> List[Dict[str, str]]:
-        chats = deepcopy(cls.get())
-        for chat in chats:
-            chat.pop("role_name", None)
-        return chats
+        return [{"role": chat["role"], "content": chat["content"]} for chat in cls.get()[-QUERY_MESSAGE_COUNT:]]
@@ -1,10 +1,11 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from openai import OpenAI
 
 from enums.env_enum import EnvEnum
 from enums.global_enum import PageEnum
 from enums.s_state_enum import GlobalSStateEnum
+from handlers.tracing_handler import TracingHandler
 from s_states.base_s_states import BaseSState
 
 
@@ -29,5 +30,24 @@ class OpenAiClientSState(BaseSState[Optional[OpenAI]]):
         if not default_openai_apikey:
             return None
             
-        return OpenAI(api_key=default_openai_apikey)
-        
\ No newline at end of file
+        return OpenAI(api_key=default_openai_apikey, base_url=EnvEnum.OPENAI_BASE_URL.value, http_client=TracingHandler.make_http_client())
+
+
+class ProfilingModeSState(BaseSState[bool]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{GlobalSStateEnum.PROFILING_MODE}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> bool:
+        return False
+
+
+class ProfileReportSState(BaseSState[List[Dict[str, Any]]]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{GlobalSStateEnum.PROFILE_REPORT}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> List[Dict[str, Any]]:
+        return []
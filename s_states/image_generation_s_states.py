@@ -1,14 +1,15 @@
-from typing import Union, Optional
+from typing import Any, Dict, List, Union, Optional
 
 import cv2
 import numpy as np
 
-from enums.image_generation_enum import SizeEnum, AiModelEnum, QualityEnum
+from enums.image_generation_enum import SizeEnum, AiModelEnum, QualityEnum, DraftSizeEnum
 from enums.s_state_enum import ImageGenerationSStateEnum
 from s_states.base_s_states import BaseSState
 
 
 DUMMY_IMAGE = cv2.imread(filename="./static/images/dummy.jpg", flags=cv2.IMREAD_COLOR)
+MAX_DRAFT_SETS = 3
 
 
 class SubmitSState(BaseSState[bool]):
@@ -31,6 +32,16 @@ class ErrorMessageSState(BaseSState[Optional[str]]):
         return None
 
 
+class JobIdSState(BaseSState[Optional[str]]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{ImageGenerationSStateEnum.JOB_ID}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> Optional[str]:
+        return None
+
+
 class AiModelTypeSState(BaseSState[AiModelEnum]):
     @staticmethod
     def get_name() -> str:
@@ -71,11 +82,63 @@ class StoredPromptSState(BaseSState[Optional[str]]):
         return None
 
 
-class StoredImageSState(BaseSState[Union[np.ndarray, str]]):
+class StoredImageSState(BaseSState[Union[np.ndarray, bytes]]):
+    """
+    Holds the generated image as downloaded, still encoded, so it can be shown and handed off without decoding it.
+    """
+
     @staticmethod
     def get_name() -> str:
         return f"{ImageGenerationSStateEnum.STORED_IMAGE}".replace(".", "_")
 
     @staticmethod
-    def get_default() -> Union[np.ndarray, str]:
+    def get_default() -> Union[np.ndarray, bytes]:
         return DUMMY_IMAGE
+
+
+class StoredImageUrlSState(BaseSState[Optional[Dict[str, Any]]]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{ImageGenerationSStateEnum.STORED_IMAGE_URL}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> Optional[Dict[str, Any]]:
+        return None
+
+
+class DraftModeSState(BaseSState[bool]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{ImageGenerationSStateEnum.DRAFT_MODE}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> bool:
+        return False
+
+
+class DraftSizeTypeSState(BaseSState[DraftSizeEnum]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{ImageGenerationSStateEnum.DRAFT_SIZE_TYPE}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> DraftSizeEnum:
+        return DraftSizeEnum.W512xH512
+
+
+class StoredDraftsSState(BaseSState[List[Dict[str, Any]]]):
+    """
+    Holds the latest draft sets, newest first, each as {"prompt": str, "images": [encoded bytes]}.
+    """
+
+    @staticmethod
+    def get_name() -> str:
+        return f"{ImageGenerationSStateEnum.STORED_DRAFTS}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> List[Dict[str, Any]]:
+        return []
+
+    @classmethod
+    def add(cls, prompt: str, images: List[bytes]) -> None:
+        cls.set(value=[{"prompt": prompt, "images": images}] + cls.get()[: MAX_DRAFT_SETS - 1])
@@ -1,6 +1,4 @@
-from typing import Optional
-
-import numpy as np
+from typing import Any, Dict, Optional
 
 from enums.s_state_enum import ImageRecognitionSStateEnum
 from s_states.base_s_states import BaseSState
@@ -36,13 +34,27 @@ class StoredPromptSState(BaseSState[Optional[str]]):
         return None
 
 
-class StoredImageSState(BaseSState[Optional[np.ndarray]]):
+class StoredImageSState(BaseSState[Optional[bytes]]):
     @staticmethod
     def get_name() -> str:
         return f"{ImageRecognitionSStateEnum.STORED_IMAGE}".replace(".", "_")
 
     @staticmethod
-    def get_default() -> Optional[np.ndarray]:
+    def get_default() -> Optional[bytes]:
+        return None
+
+
+class HandedOffImageSState(BaseSState[Optional[Dict[str, Any]]]):
+    """
+    An image passed from another page, described as soon as the Image Recognition page runs.
+    """
+
+    @staticmethod
+    def get_name() -> str:
+        return f"{ImageRecognitionSStateEnum.HANDED_OFF_IMAGE}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> Optional[Dict[str, Any]]:
         return None
 
 
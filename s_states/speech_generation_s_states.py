@@ -1,6 +1,6 @@
 from typing import Optional
 
-from enums.speech_generation_enum import VoiceEnum
+from enums.speech_generation_enum import AiModelEnum, VoiceEnum, FormatEnum
 from enums.s_state_enum import SpeechGenerationSStateEnum
 from s_states.base_s_states import BaseSState
 
@@ -25,6 +25,26 @@ class ErrorMessageSState(BaseSState[Optional[str]]):
         return None
 
 
+class JobIdSState(BaseSState[Optional[str]]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{SpeechGenerationSStateEnum.JOB_ID}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> Optional[str]:
+        return None
+
+
+class AiModelTypeSState(BaseSState[AiModelEnum]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{SpeechGenerationSStateEnum.AI_MODEL_TYPE}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> AiModelEnum:
+        return AiModelEnum.TTS_1
+
+
 class VoiceTypeSState(BaseSState[VoiceEnum]):
     @staticmethod
     def get_name() -> str:
@@ -35,6 +55,16 @@ class VoiceTypeSState(BaseSState[VoiceEnum]):
         return VoiceEnum.ALLOY
 
 
+class FormatTypeSState(BaseSState[FormatEnum]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{SpeechGenerationSStateEnum.FORMAT_TYPE}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> FormatEnum:
+        return FormatEnum.MP3
+
+
 class StoredPromptSState(BaseSState[Optional[str]]):
     @staticmethod
     def get_name() -> str:
@@ -25,6 +25,16 @@ class ErrorMessageSState(BaseSState[Optional[str]]):
         return None
 
 
+class JobIdSState(BaseSState[Optional[str]]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{SpeechRecognitionSStateEnum.JOB_ID}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> Optional[str]:
+        return None
+
+
 class LanguageTypeSState(BaseSState[LanguageEnum]):
     @staticmethod
     def get_name() -> str:
@@ -35,6 +45,26 @@ class LanguageTypeSState(BaseSState[LanguageEnum]):
         return LanguageEnum.JAPANESE
 
 
+class LongAudioModeSState(BaseSState[bool]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{SpeechRecognitionSStateEnum.LONG_AUDIO_MODE}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> bool:
+        return False
+
+
+class PreprocessModeSState(BaseSState[bool]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{SpeechRecognitionSStateEnum.PREPROCESS_MODE}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> bool:
+        return False
+
+
 class StoredSpeechSState(BaseSState[Optional[bytes]]):
     @staticmethod
     def get_name() -> str:
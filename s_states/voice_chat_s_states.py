@@ -0,0 +1,86 @@
+from typing import Any, Dict, List, Optional
+
+from enums.chatgpt_enum import AiModelEnum, SenderEnum
+from enums.speech_generation_enum import VoiceEnum
+from enums.speech_recognition_enum import LanguageEnum
+from enums.s_state_enum import VoiceChatSStateEnum
+from s_states.base_s_states import BaseSState
+
+
+HISTORY_MESSAGE_COUNT = 20
+
+
+class SubmitSState(BaseSState[bool]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{VoiceChatSStateEnum.SUBMIT}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> bool:
+        return False
+
+
+class ErrorMessageSState(BaseSState[Optional[str]]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{VoiceChatSStateEnum.ERROR_MESSAGE}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> Optional[str]:
+        return None
+
+
+class LanguageTypeSState(BaseSState[LanguageEnum]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{VoiceChatSStateEnum.LANGUAGE_TYPE}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> LanguageEnum:
+        return LanguageEnum.JAPANESE
+
+
+class AiModelTypeSState(BaseSState[AiModelEnum]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{VoiceChatSStateEnum.AI_MODEL_TYPE}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> AiModelEnum:
+        return AiModelEnum.GPT35_TURBO
+
+
+class VoiceTypeSState(BaseSState[VoiceEnum]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{VoiceChatSStateEnum.VOICE_TYPE}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> VoiceEnum:
+        return VoiceEnum.ALLOY
+
+
+class StoredHistorySState(BaseSState[List[Dict[str, str]]]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{VoiceChatSStateEnum.STORED_HISTORY}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> List[Dict[str, str]]:
+        return []
+
+    @classmethod
+    def add(cls, sender_type: SenderEnum, content: str) -> None:
+        chats = cls.get()
+        chats.append({"role": sender_type.value, "content": content})
+        del chats[:-HISTORY_MESSAGE_COUNT]
+
+
+class StoredTurnSState(BaseSState[Optional[Dict[str, Any]]]):
+    @staticmethod
+    def get_name() -> str:
+        return f"{VoiceChatSStateEnum.STORED_TURN}".replace(".", "_")
+
+    @staticmethod
+    def get_default() -> Optional[Dict[str, Any]]:
+        return None
@@ -1,6 +1,17 @@
 from components.config_component import ConfigComponent
 from components.page_manager_component import PageManagerComponent
+from enums.env_enum import EnvEnum
+from handlers.memory_profiler_handler import MemoryProfilerHandler
+from handlers.metrics_handler import MetricsHandler
+from handlers.s_state_backend_handler import SStateBackendHandler
 
 
+if EnvEnum.METRICS_PORT.value:
+    MetricsHandler.start_exporter(port=int(EnvEnum.METRICS_PORT.value))
+if EnvEnum.MEMORY_PROFILING_MODE.value:
+    MemoryProfilerHandler.start()
 ConfigComponent.set_page_configs()
-PageManagerComponent.display_component()
\ No newline at end of file
+try:
+    PageManagerComponent.display_component()
+finally:
+    SStateBackendHandler.flush()
\ No newline at end of file
@@ -0,0 +1,59 @@
+import pytest
+
+from enums.speech_recognition_enum import LanguageEnum
+from handlers.speech_recognition_handler import SpeechRecognitionHandler
+
+
+stitch_transcripts = SpeechRecognitionHandler._SpeechRecognitionHandler__stitch_transcripts  # type: ignore
+
+
+@pytest.mark.parametrize(
+    "former, latter, language_type, expected",
+    [
+        (
+            "Look at the brown fox.",
+            "The brown fox jumps over the lazy dog.",
+            LanguageEnum.ENGLISH,
+            "Look at the brown fox jumps over the lazy dog.",
+        ),
+        (
+            "It was a sunny day and the quick brown fo",
+            "the quick brown fox jumps over the lazy dog.",
+            LanguageEnum.ENGLISH,
+            "It was a sunny day and the quick brown fox jumps over the lazy dog.",
+        ),
+        (
+            "It was a sunny day and the quick brown fox",
+            "ick brown fox, jumps over the lazy dog.",
+            LanguageEnum.ENGLISH,
+            "It was a sunny day and the quick brown fox, jumps over the lazy dog.",
+        ),
+        (
+            "今日はとても良い天気ですね。",
+            "とても良い天気ですね、散歩に行きましょう。",
+            LanguageEnum.JAPANESE,
+            "今日はとても良い天気ですね、散歩に行きましょう。",
+        ),
+        (
+            "今日はとても良い天気ですね.",
+            "とても良い天気ですね。散歩に行きましょう。",
+            LanguageEnum.JAPANESE,
+            "今日はとても良い天気ですね。散歩に行きましょう。",
+        ),
+    ],
+)
+def test_stitch_transcripts_drops_the_overlap(former: str, latter: str, language_type: LanguageEnum, expected: str) -> None:
+    assert stitch_transcripts(former=former, latter=latter, language_type=language_type) == expected
+
+
+@pytest.mark.parametrize(
+    "former, latter, language_type, expected",
+    [
+        ("Hello there.", "Completely different words.", LanguageEnum.ENGLISH, "Hello there. Completely different words."),
+        ("今日は晴れです。", "明日は雨です。", LanguageEnum.JAPANESE, "今日は晴れです。明日は雨です。"),
+        ("the brown fox sat down. Later on", "the brown fox jumped.", LanguageEnum.ENGLISH, "the brown fox sat down. Later on the brown fox jumped."),
+        ("", "only the latter", LanguageEnum.ENGLISH, "only the latter"),
+    ],
+)
+def test_stitch_transcripts_keeps_text_without_an_overlap(former: str, latter: str, language_type: LanguageEnum, expected: str) -> None:
+    assert stitch_transcripts(former=former, latter=latter, language_type=language_type) == expected